@@ -0,0 +1,61 @@
+"""
+Counts the runtime frames (`Environment`s) the interpreter allocates per Lox
+function call on the workloads in `programs.WORKLOADS`, and how many calls
+reused a pooled frame instead.
+
+    python benchmarks/allocations.py [workload ...]
+"""
+import contextlib
+import io
+import os
+import sys
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import src.environment
+import src.lox_callable
+from benchmarks.programs import WORKLOADS
+from src.lox import Lox
+
+
+class Counting():
+    """
+    Replaces `cls.method` with a wrapper that counts its calls.
+    """
+    def __init__(self, cls, method):
+        self.cls = cls
+        self.method = method
+        self.count = 0
+
+    def __enter__(self):
+        original = getattr(self.cls, self.method)
+
+        def counted(*args, **kwargs):
+            self.count += 1
+            return original(*args, **kwargs)
+
+        setattr(self.cls, self.method, counted)
+        self.original = original
+        return self
+
+    def __exit__(self, *exc_info):
+        setattr(self.cls, self.method, self.original)
+
+
+def main(names):
+    for name in names or WORKLOADS:
+        with Counting(src.environment.Environment, "__init__") as frames, \
+                Counting(src.lox_callable.LoxFunction, "__call__") as calls:
+            lox = Lox()
+            with contextlib.redirect_stdout(io.StringIO()):
+                lox.run(WORKLOADS[name])
+        per_call = f"{frames.count / calls.count:6.2f}" if calls.count else "     -"
+        reused = lox.interpreter.frames.reused
+        print(f"{name:10} {frames.count:8} frames {calls.count:8} calls {per_call} frames/call"
+              f" {reused:8} reused")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
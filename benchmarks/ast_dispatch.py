@@ -0,0 +1,128 @@
+"""
+Measures the memory held by a parsed program's AST and how fast a visitor can
+walk it, through `accept` and (where the AST supports it) a dispatch table.
+
+    python benchmarks/ast_dispatch.py [units]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import pylox_ast.expr as Expr
+import pylox_ast.stmt as Stmt
+
+from benchmarks.programs import generate_program
+from src.lox import Lox
+from src.parser import Parser
+from src.regex_scanner import RegexScanner
+
+
+class NodeCounter(Expr.ExprVisitor, Stmt.StmtVisitor):
+    """
+    Visits every node of a tree and counts them. Expressions go through `visit`
+    and statements through `visit_all`, like `evaluate` and `execute` in the
+    interpreter.
+    """
+    def __init__(self, use_table):
+        self.count = 0
+        if use_table:
+            self.expr_table = Expr.Expr.dispatch_table(self)
+            self.stmt_table = Stmt.Stmt.dispatch_table(self)
+            self.visit = self.visit_through_table
+            self.visit_all = self.visit_all_through_table
+        else:
+            self.visit = self.visit_through_accept
+            self.visit_all = self.visit_all_through_accept
+
+    def visit_through_accept(self, expr):
+        if expr is not None:
+            expr.accept(self)
+
+    def visit_all_through_accept(self, statements):
+        for stmt in statements:
+            stmt.accept(self)
+
+    def visit_through_table(self, expr):
+        if expr is not None:
+            self.expr_table[expr.dispatch_index](expr)
+
+    def visit_all_through_table(self, statements):
+        stmt_table = self.stmt_table
+        for stmt in statements:
+            stmt_table[stmt.dispatch_index](stmt)
+
+    def visit_assign(self, expr): self.count += 1; self.visit(expr.value)
+    def visit_binary(self, expr): self.count += 1; self.visit(expr.left); self.visit(expr.right)
+    def visit_call(self, expr):
+        self.count += 1
+        self.visit(expr.callee)
+        for argument in expr.arguments:
+            self.visit(argument)
+    def visit_get(self, expr): self.count += 1; self.visit(expr.object_)
+    def visit_grouping(self, expr): self.count += 1; self.visit(expr.expression)
+    def visit_invoke(self, expr):
+        self.count += 1
+        self.visit(expr.object_)
+        for argument in expr.arguments:
+            self.visit(argument)
+    def visit_literal(self, expr): self.count += 1
+    def visit_logical(self, expr): self.count += 1; self.visit(expr.left); self.visit(expr.right)
+    def visit_set(self, expr): self.count += 1; self.visit(expr.object_); self.visit(expr.value)
+    def visit_super(self, expr): self.count += 1
+    def visit_this(self, expr): self.count += 1
+    def visit_unary(self, expr): self.count += 1; self.visit(expr.right)
+    def visit_variable(self, expr): self.count += 1
+
+    def visit_block(self, stmt): self.count += 1; self.visit_all(stmt.statements)
+    def visit_class(self, stmt): self.count += 1; self.visit(stmt.superclass); self.visit_all(stmt.methods)
+    def visit_expression(self, stmt): self.count += 1; self.visit(stmt.expression)
+    def visit_function(self, stmt): self.count += 1; self.visit_all(stmt.body)
+    def visit_if(self, stmt):
+        self.count += 1
+        self.visit(stmt.condition)
+        self.visit_all([stmt.then_branch])
+        if stmt.else_branch is not None:
+            self.visit_all([stmt.else_branch])
+    def visit_print(self, stmt): self.count += 1; self.visit(stmt.expression)
+    def visit_return(self, stmt): self.count += 1; self.visit(stmt.value)
+    def visit_var(self, stmt): self.count += 1; self.visit(stmt.initializer)
+    def visit_while(self, stmt): self.count += 1; self.visit(stmt.condition); self.visit_all([stmt.body])
+
+
+def main(units):
+    source = generate_program(units)
+    lox = Lox()
+    tokens = RegexScanner(lox, source).scan_tokens()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    statements = Parser(lox, tokens).parse()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    counter = NodeCounter(use_table=False)
+    counter.visit_all(statements)
+    nodes = counter.count
+    print(f"{nodes} nodes, AST {size / 1e6:.1f} MB, {size / nodes:.1f} bytes/node")
+
+    modes = ["accept"]
+    if hasattr(Expr.Expr, "dispatch_table"):
+        modes.append("table")
+    for mode in modes:
+        best = None
+        for _ in range(5):
+            counter = NodeCounter(use_table=(mode == "table"))
+            start = time.perf_counter()
+            counter.visit_all(statements)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{mode:6} dispatch: {nodes / best / 1e6:.2f} M nodes/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
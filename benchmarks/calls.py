@@ -0,0 +1,83 @@
+"""
+Measures the cost of one call on each execution engine, for each kind of
+callee: natives, functions of zero to three parameters, methods and classes.
+Each case makes `UNROLL` calls per loop iteration, and the time of the same
+loop without the calls is subtracted.
+
+    python benchmarks/calls.py [iterations]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from src.lox import Lox
+
+SETUP = """
+fun f0() {}
+fun f1(a) {}
+fun f2(a, b) {}
+fun f3(a, b, c) {}
+class Methods { m0() {} m1(a) {} }
+class Empty {}
+class Point { init(x) { this.x = x; } }
+var object = Methods();
+"""
+
+LOOP = """
+var i = 0;
+while (i < {iterations}) {{
+  {calls}
+  i = i + 1;
+}}
+"""
+
+UNROLL = 10
+
+CASES = {
+    "native": "clock();",
+    "function/0": "f0();",
+    "function/1": "f1(i);",
+    "function/2": "f2(i, i);",
+    "function/3": "f3(i, i, i);",
+    "method/0": "object.m0();",
+    "method/1": "object.m1(i);",
+    "class": "Empty();",
+    "class/init": "Point(i);",
+}
+
+
+def run(call, engine, iterations, repeat=5):
+    """
+    Returns the best wall-clock time of `repeat` runs of the loop around `call`.
+    """
+    source = SETUP + LOOP.format(iterations=iterations, calls=" ".join([call] * UNROLL))
+    best = None
+    for _ in range(repeat):
+        lox = Lox(engine=engine)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            lox.run(source)
+        elapsed = time.perf_counter() - start
+        if lox.had_error or lox.had_runtime_error:
+            raise RuntimeError("benchmark failed")
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(iterations):
+    print(f"{'ns/call':12}" + "".join(f"{engine:>10}" for engine in Lox.engines))
+    loops = {engine: run("", engine, iterations) for engine in Lox.engines}
+    for name, call in CASES.items():
+        costs = [(run(call, engine, iterations) - loops[engine]) / (iterations * UNROLL) * 1e9
+                 for engine in Lox.engines]
+        print(f"{name:12}" + "".join(f"{cost:10.0f}" for cost in costs))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
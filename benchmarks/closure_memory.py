@@ -0,0 +1,65 @@
+"""
+Measures the memory kept alive by closures that each read one variable out
+of a function call with several other locals.
+
+    python benchmarks/closure_memory.py [count]
+"""
+import contextlib
+import gc
+import io
+import os
+import sys
+import tracemalloc
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from src.lox import Lox
+
+PROGRAM = """
+class Node {{
+  init(callback, next) {{
+    this.callback = callback;
+    this.next = next;
+  }}
+}}
+
+fun makeCallback(i) {{
+  var label = "callback " + "number";
+  var scratch = i * 2;
+  var total = 0;
+  for (var j = 0; j < 3; j = j + 1) {{
+    var step = j * scratch;
+    total = total + step;
+  }}
+  fun callback() {{ return i; }}
+  return callback;
+}}
+
+var callbacks = nil;
+for (var i = 0; i < {count}; i = i + 1) {{
+  callbacks = Node(makeCallback(i), callbacks);
+}}
+"""
+
+
+def main(count):
+    lox = Lox(cache=False)
+    source = PROGRAM.format(count=count)
+    # Compile first so only the memory retained at runtime is traced
+    statements = lox.compile(source)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        lox.interpreter.interpret(statements)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{count} closures retain {retained / 1e6:.2f} MB, {retained / count:.0f} bytes each")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
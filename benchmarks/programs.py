@@ -0,0 +1,147 @@
+"""
+Generators for large Lox programs used by the benchmarks.
+"""
+
+UNIT = """
+class Point{n} {{
+  init(x, y) {{
+    this.x = x;
+    this.y = y;
+  }}
+
+  add(other) {{
+    return Point{n}(this.x + other.x, this.y + other.y);
+  }}
+
+  describe() {{
+    return "Point{n}(" + this.label + ")";
+  }}
+}}
+
+fun fib{n}(k) {{
+  if (k <= 1) return k;
+  return fib{n}(k - 2) + fib{n}(k - 1);
+}}
+
+fun sum{n}(limit) {{
+  var total = 0;
+  for (var i = 0; i < limit; i = i + 1) {{
+    // Mix arithmetic with comparisons and logical operators
+    if (i / 2 >= 1 and !(i == 7) or total != 0.5) total = total + i * 1.5;
+  }}
+  return total;
+}}
+"""
+
+
+def generate_program(units):
+    """
+    Returns a Lox program made of `units` copies of a block of classes and
+    functions, each copy with its own names.
+    """
+    return "".join(UNIT.format(n=n) for n in range(units))
+
+
+# Small programs that each stress one part of the interpreter
+WORKLOADS = {
+    "fib": """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+print fib(20);
+""",
+
+    "loop": """
+var total = 0;
+for (var i = 0; i < 30000; i = i + 1) {
+  var twice = i * 2;
+  total = total + twice;
+}
+print total;
+""",
+
+    "closures": """
+fun makeCounter() {
+  var count = 0;
+  fun counter() {
+    count = count + 1;
+    return count;
+  }
+  return counter;
+}
+var counter = makeCounter();
+for (var i = 0; i < 30000; i = i + 1) counter();
+print counter();
+""",
+
+    "fields": """
+class Vector {
+  init(x, y) {
+    this.x = x;
+    this.y = y;
+  }
+}
+var v = Vector(0, 0);
+for (var i = 0; i < 30000; i = i + 1) {
+  v.x = v.x + v.y + 1;
+  v.y = v.x - v.y;
+}
+print v.x > 0;
+""",
+
+    "methods": """
+class Base {
+  value() { return 1; }
+}
+class Middle < Base {}
+class Leaf < Middle {
+  twice() { return this.value() + super.value(); }
+}
+var leaf = Leaf();
+var total = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  total = total + leaf.twice();
+}
+print total;
+""",
+
+    "instances": """
+class Point {
+  init(x, y) {
+    this.x = x;
+    this.y = y;
+  }
+  add(other) {
+    return Point(this.x + other.x, this.y + other.y);
+  }
+}
+var p = Point(0, 0);
+var step = Point(1, 2);
+for (var i = 0; i < 20000; i = i + 1) {
+  p = p.add(step);
+}
+print p.y;
+""",
+
+    "hierarchy": """
+class C0 {
+  root() { return 1; }
+}
+class C1 < C0 {}
+class C2 < C1 {}
+class C3 < C2 {}
+class C4 < C3 {}
+class C5 < C4 {}
+class C6 < C5 {}
+class C7 < C6 {
+  leaf() { return this.root() + super.root(); }
+}
+var object = C7();
+var total = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  total = total + object.leaf();
+}
+print total;
+""",
+}
@@ -0,0 +1,43 @@
+"""
+Measures the memory held per token by a scanned program.
+
+    python benchmarks/token_memory.py [units]
+"""
+import os
+import sys
+import tracemalloc
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from benchmarks.programs import generate_program
+from src.lox import Lox
+from src.regex_scanner import RegexScanner
+from src.token_buffer import TokenBuffer
+
+
+def measure(build, source):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tokens = build(source)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, len(tokens)
+
+
+def main(units):
+    source = generate_program(units)
+    print(f"{len(source) / 1e6:.1f} MB of source")
+
+    builds = {
+        "list[Token]": lambda source: RegexScanner(Lox(), source).scan_tokens(),
+        "TokenBuffer": lambda source: TokenBuffer(RegexScanner(Lox(), source).iter_tokens()),
+    }
+    for name, build in builds.items():
+        size, count = measure(build, source)
+        print(f"{name:12} {count} tokens {size / 1e6:8.1f} MB {size / count:6.1f} bytes/token")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,45 @@
+"""
+Times each execution engine on the small workloads in `programs.WORKLOADS`.
+
+    python benchmarks/workloads.py [workload ...]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from benchmarks.programs import WORKLOADS
+from src.lox import Lox
+
+
+def run(source, engine, repeat=3):
+    """
+    Returns the best wall-clock time of `repeat` runs of `source`.
+    """
+    best = None
+    for _ in range(repeat):
+        lox = Lox(engine=engine)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            lox.run(source)
+        elapsed = time.perf_counter() - start
+        if lox.had_error or lox.had_runtime_error:
+            raise RuntimeError("workload failed")
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(names):
+    print(f"{'':10}" + "".join(f"{engine:>12}" for engine in Lox.engines))
+    for name in names or WORKLOADS:
+        times = [run(WORKLOADS[name], engine) for engine in Lox.engines]
+        print(f"{name:10}" + "".join(f"{elapsed * 1000:9.1f} ms" for elapsed in times))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
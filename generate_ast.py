@@ -2,72 +2,111 @@ import sys
 
 TAB = "    "
 
+# Fields with a default aren't set by the parser. The resolver fills them in:
+# - `access` and `slot` say where a variable reference finds its variable.
+# - A declaration's `slot` is where it defines its variable, and `captured`
+#   whether that variable lives in a cell.
+# - `frame_size` is the number of slots a function's frame needs, or None for
+#   blocks and classes that share the frame around them.
+# - A function's `upvalues` describe the cells its closures capture, and
+#   `cells` the slots of parameters to box when it's called.
+# - `cache` is the inline cache of a property access site, which the
+#   interpreter fills in on first use.
+# - `tail` marks a call whose value a `return` returns as it is, so the
+#   call can reuse the returning function's place on the stack.
+# - `stepped` is filled in by the `StackInterpreter` the first time it meets
+#   a node: whether it runs the node step by step on its own stack.
 expr_types = {
-    "Assign"  : ["name", "value"],
-    "Binary"  : ["left", "operator", "right"],
-    "Call"    : ["callee", "paren", "arguments"],
-    "Get"     : ["object_", "name"],
-    "Grouping": ["expression"],
+    "Assign"  : ["name", "value", "access=None", "slot=None", "stepped=None"],
+    "Binary"  : ["left", "operator", "right", "stepped=None"],
+    "Call"    : ["callee", "paren", "arguments", "tail=False", "stepped=None"],
+    "Get"     : ["object_", "name", "cache=None", "stepped=None"],
+    "Grouping": ["expression", "stepped=None"],
+    "Invoke"  : ["object_", "name", "paren", "arguments", "cache=None", "tail=False",
+                 "stepped=None"],
     "Literal" : ["value"],
-    "Logical" : ["left", "operator", "right"],
-    "Set"     : ["object_", "name", "value"],
-    "Super"   : ["keyword", "method"],
-    "This"    : ["keyword"],
-    "Unary"   : ["operator", "right"],
-    "Variable": ["name"],
+    "Logical" : ["left", "operator", "right", "stepped=None"],
+    "Set"     : ["object_", "name", "value", "stepped=None"],
+    "Super"   : ["keyword", "method", "access=None", "slot=None", "this=None", "cache=None"],
+    "This"    : ["keyword", "access=None", "slot=None"],
+    "Unary"   : ["operator", "right", "stepped=None"],
+    "Variable": ["name", "access=None", "slot=None"],
 }
 
 stmt_types = {
-    "Block"      : ["statements"],
-    "Class"      : ["name", "superclass", "methods"],
-    "Expression" : ["expression"],
-    "Function"   : ["name", "params", "body"],
-    "If"         : ["condition", "then_branch", "else_branch"],
-    "Print"      : ["expression"],
-    "Return"     : ["keyword", "value"],
-    "Var"        : ["name", "initializer"],
-    "While"      : ["condition", "body"],
+    "Block"      : ["statements", "frame_size=None", "stepped=None"],
+    "Class"      : ["name", "superclass", "methods", "slot=None", "captured=False",
+                    "super_slot=None", "frame_size=None"],
+    "Expression" : ["expression", "stepped=None"],
+    "Function"   : ["name", "params", "body", "slot=None", "captured=False",
+                    "frame_size=None", "upvalues=()", "cells=()"],
+    "If"         : ["condition", "then_branch", "else_branch", "stepped=None"],
+    "Print"      : ["expression", "stepped=None"],
+    "Return"     : ["keyword", "value", "stepped=None"],
+    "Var"        : ["name", "initializer", "slot=None", "captured=False", "stepped=None"],
+    "While"      : ["condition", "body", "stepped=None"],
 }
 
 def define_ast(output_dir, base_name, types):
     filepath = f"{output_dir}/{base_name.lower()}.py"
     with open(filepath, "w") as f:
-        f.write("from abc import ABC, abstractmethod\n")
-        f.write("\n\n")
-        
         define_visitorclass(f, base_name, types)
         f.write("\n\n")
 
-        define_baseclass(f, base_name)
+        define_baseclass(f, base_name, types)
 
-        for cls_name, fields in types.items():
-            define_type(f, base_name, cls_name, fields)
+        for index, (cls_name, fields) in enumerate(types.items()):
+            define_type(f, base_name, cls_name, fields, index)
 
 
 def define_visitorclass(f, base_name, types):
     functions = [
-        f"{TAB}def visit_{field.lower()}(expr): raise NotImplementedError\n" \
+        f"{TAB}def visit_{field.lower()}(self, {base_name.lower()}): raise NotImplementedError\n" \
         for field in types.keys()
     ]
     f.write(f"class {base_name}Visitor():\n")
     f.writelines(functions)
 
 
-def define_baseclass(f, base_name):
+def define_baseclass(f, base_name, types):
+    """
+    Every node class gets `__slots__` and a `dispatch_index` into the base
+    class's `visit_methods`, so visitors can dispatch through a table of bound
+    methods instead of calling `accept`.
+    """
     f.writelines([
-        f"class {base_name}(ABC):\n",
-        f"{TAB}@abstractmethod\n",
-        f"{TAB}def accept(self):\n",
-        f"{TAB}{TAB}raise NotImplementedError\n\n\n"
+        f"class {base_name}():\n",
+        f"{TAB}__slots__ = ()\n",
+        f"{TAB}# Visitor method names, indexed by each node class's `dispatch_index`\n",
+        f"{TAB}visit_methods = (\n",
+        *[f"{TAB}{TAB}\"visit_{cls_name.lower()}\",\n" for cls_name in types.keys()],
+        f"{TAB})\n\n",
+        f"{TAB}def accept(self, visitor):\n",
+        f"{TAB}{TAB}raise NotImplementedError\n\n",
+        f"{TAB}@classmethod\n",
+        f"{TAB}def dispatch_table(cls, visitor):\n",
+        f"{TAB}{TAB}\"\"\"\n",
+        f"{TAB}{TAB}Returns `visitor`'s visit methods in dispatch order, so a node can be\n",
+        f"{TAB}{TAB}visited with `table[node.dispatch_index](node)`.\n",
+        f"{TAB}{TAB}\"\"\"\n",
+        f"{TAB}{TAB}return [getattr(visitor, name) for name in cls.visit_methods]\n\n\n",
     ])
 
 
-def define_type(f, base_name, cls_name, fields):
+def define_type(f, base_name, cls_name, fields, dispatch_index):
     f.write(f"class {cls_name}({base_name}):\n")
+    names = [field.split("=")[0] for field in fields]
+
+    slots = ", ".join(f'"{name}"' for name in names)
+    if len(names) == 1:
+        slots += ","
+    f.write(f"{TAB}__slots__ = ({slots})\n")
+    f.write(f"{TAB}dispatch_index = {dispatch_index}\n")
+    f.write("\n")
 
     # init
     f.write(f"{TAB}def __init__(self, {', '.join(fields)}):\n")
-    init_stmts = [f"{TAB}{TAB}self.{field} = {field}\n" for field in fields]
+    init_stmts = [f"{TAB}{TAB}self.{name} = {name}\n" for name in names]
     f.writelines(init_stmts)
     f.write("\n")
 
@@ -82,7 +121,7 @@ def define_type(f, base_name, cls_name, fields):
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
-        print("Usage: generate_ast <output directory")
+        print("Usage: generate_ast <output directory>")
         sys.exit(64)
 
     output_dir = sys.argv[1]
@@ -1,74 +1,141 @@
-from abc import ABC, abstractmethod
-
-
 class ExprVisitor():
-    def visit_assign(expr): raise NotImplementedError
-    def visit_binary(expr): raise NotImplementedError
-    def visit_call(expr): raise NotImplementedError
-    def visit_get(expr): raise NotImplementedError
-    def visit_grouping(expr): raise NotImplementedError
-    def visit_literal(expr): raise NotImplementedError
-    def visit_logical(expr): raise NotImplementedError
-    def visit_set(expr): raise NotImplementedError
-    def visit_super(expr): raise NotImplementedError
-    def visit_this(expr): raise NotImplementedError
-    def visit_unary(expr): raise NotImplementedError
-    def visit_variable(expr): raise NotImplementedError
-
-
-class Expr(ABC):
-    @abstractmethod
-    def accept(self):
+    def visit_assign(self, expr): raise NotImplementedError
+    def visit_binary(self, expr): raise NotImplementedError
+    def visit_call(self, expr): raise NotImplementedError
+    def visit_get(self, expr): raise NotImplementedError
+    def visit_grouping(self, expr): raise NotImplementedError
+    def visit_invoke(self, expr): raise NotImplementedError
+    def visit_literal(self, expr): raise NotImplementedError
+    def visit_logical(self, expr): raise NotImplementedError
+    def visit_set(self, expr): raise NotImplementedError
+    def visit_super(self, expr): raise NotImplementedError
+    def visit_this(self, expr): raise NotImplementedError
+    def visit_unary(self, expr): raise NotImplementedError
+    def visit_variable(self, expr): raise NotImplementedError
+
+
+class Expr():
+    __slots__ = ()
+    # Visitor method names, indexed by each node class's `dispatch_index`
+    visit_methods = (
+        "visit_assign",
+        "visit_binary",
+        "visit_call",
+        "visit_get",
+        "visit_grouping",
+        "visit_invoke",
+        "visit_literal",
+        "visit_logical",
+        "visit_set",
+        "visit_super",
+        "visit_this",
+        "visit_unary",
+        "visit_variable",
+    )
+
+    def accept(self, visitor):
         raise NotImplementedError
 
+    @classmethod
+    def dispatch_table(cls, visitor):
+        """
+        Returns `visitor`'s visit methods in dispatch order, so a node can be
+        visited with `table[node.dispatch_index](node)`.
+        """
+        return [getattr(visitor, name) for name in cls.visit_methods]
+
 
 class Assign(Expr):
-    def __init__(self, name, value):
+    __slots__ = ("name", "value", "access", "slot", "stepped")
+    dispatch_index = 0
+
+    def __init__(self, name, value, access=None, slot=None, stepped=None):
         self.name = name
         self.value = value
+        self.access = access
+        self.slot = slot
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_assign(self)
 
 
 class Binary(Expr):
-    def __init__(self, left, operator, right):
+    __slots__ = ("left", "operator", "right", "stepped")
+    dispatch_index = 1
+
+    def __init__(self, left, operator, right, stepped=None):
         self.left = left
         self.operator = operator
         self.right = right
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_binary(self)
 
 
 class Call(Expr):
-    def __init__(self, callee, paren, arguments):
+    __slots__ = ("callee", "paren", "arguments", "tail", "stepped")
+    dispatch_index = 2
+
+    def __init__(self, callee, paren, arguments, tail=False, stepped=None):
         self.callee = callee
         self.paren = paren
         self.arguments = arguments
+        self.tail = tail
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_call(self)
 
 
 class Get(Expr):
-    def __init__(self, object_, name):
+    __slots__ = ("object_", "name", "cache", "stepped")
+    dispatch_index = 3
+
+    def __init__(self, object_, name, cache=None, stepped=None):
         self.object_ = object_
         self.name = name
+        self.cache = cache
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_get(self)
 
 
 class Grouping(Expr):
-    def __init__(self, expression):
+    __slots__ = ("expression", "stepped")
+    dispatch_index = 4
+
+    def __init__(self, expression, stepped=None):
         self.expression = expression
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_grouping(self)
 
 
+class Invoke(Expr):
+    __slots__ = ("object_", "name", "paren", "arguments", "cache", "tail", "stepped")
+    dispatch_index = 5
+
+    def __init__(self, object_, name, paren, arguments, cache=None, tail=False, stepped=None):
+        self.object_ = object_
+        self.name = name
+        self.paren = paren
+        self.arguments = arguments
+        self.cache = cache
+        self.tail = tail
+        self.stepped = stepped
+
+    def accept(self, visitor):
+        return visitor.visit_invoke(self)
+
+
 class Literal(Expr):
+    __slots__ = ("value",)
+    dispatch_index = 6
+
     def __init__(self, value):
         self.value = value
 
@@ -77,54 +144,83 @@ class Literal(Expr):
 
 
 class Logical(Expr):
-    def __init__(self, left, operator, right):
+    __slots__ = ("left", "operator", "right", "stepped")
+    dispatch_index = 7
+
+    def __init__(self, left, operator, right, stepped=None):
         self.left = left
         self.operator = operator
         self.right = right
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_logical(self)
 
 
 class Set(Expr):
-    def __init__(self, object_, name, value):
+    __slots__ = ("object_", "name", "value", "stepped")
+    dispatch_index = 8
+
+    def __init__(self, object_, name, value, stepped=None):
         self.object_ = object_
         self.name = name
         self.value = value
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_set(self)
 
 
 class Super(Expr):
-    def __init__(self, keyword, method):
+    __slots__ = ("keyword", "method", "access", "slot", "this", "cache")
+    dispatch_index = 9
+
+    def __init__(self, keyword, method, access=None, slot=None, this=None, cache=None):
         self.keyword = keyword
         self.method = method
+        self.access = access
+        self.slot = slot
+        self.this = this
+        self.cache = cache
 
     def accept(self, visitor):
         return visitor.visit_super(self)
 
 
 class This(Expr):
-    def __init__(self, keyword):
+    __slots__ = ("keyword", "access", "slot")
+    dispatch_index = 10
+
+    def __init__(self, keyword, access=None, slot=None):
         self.keyword = keyword
+        self.access = access
+        self.slot = slot
 
     def accept(self, visitor):
         return visitor.visit_this(self)
 
 
 class Unary(Expr):
-    def __init__(self, operator, right):
+    __slots__ = ("operator", "right", "stepped")
+    dispatch_index = 11
+
+    def __init__(self, operator, right, stepped=None):
         self.operator = operator
         self.right = right
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_unary(self)
 
 
 class Variable(Expr):
-    def __init__(self, name):
+    __slots__ = ("name", "access", "slot")
+    dispatch_index = 12
+
+    def __init__(self, name, access=None, slot=None):
         self.name = name
+        self.access = access
+        self.slot = slot
 
     def accept(self, visitor):
         return visitor.visit_variable(self)
@@ -1,100 +1,164 @@
-from abc import ABC, abstractmethod
-
-
 class StmtVisitor():
-    def visit_block(expr): raise NotImplementedError
-    def visit_class(expr): raise NotImplementedError
-    def visit_expression(expr): raise NotImplementedError
-    def visit_function(expr): raise NotImplementedError
-    def visit_if(expr): raise NotImplementedError
-    def visit_print(expr): raise NotImplementedError
-    def visit_return(expr): raise NotImplementedError
-    def visit_var(expr): raise NotImplementedError
-    def visit_while(expr): raise NotImplementedError
-
-
-class Stmt(ABC):
-    @abstractmethod
-    def accept(self):
+    def visit_block(self, stmt): raise NotImplementedError
+    def visit_class(self, stmt): raise NotImplementedError
+    def visit_expression(self, stmt): raise NotImplementedError
+    def visit_function(self, stmt): raise NotImplementedError
+    def visit_if(self, stmt): raise NotImplementedError
+    def visit_print(self, stmt): raise NotImplementedError
+    def visit_return(self, stmt): raise NotImplementedError
+    def visit_var(self, stmt): raise NotImplementedError
+    def visit_while(self, stmt): raise NotImplementedError
+
+
+class Stmt():
+    __slots__ = ()
+    # Visitor method names, indexed by each node class's `dispatch_index`
+    visit_methods = (
+        "visit_block",
+        "visit_class",
+        "visit_expression",
+        "visit_function",
+        "visit_if",
+        "visit_print",
+        "visit_return",
+        "visit_var",
+        "visit_while",
+    )
+
+    def accept(self, visitor):
         raise NotImplementedError
 
+    @classmethod
+    def dispatch_table(cls, visitor):
+        """
+        Returns `visitor`'s visit methods in dispatch order, so a node can be
+        visited with `table[node.dispatch_index](node)`.
+        """
+        return [getattr(visitor, name) for name in cls.visit_methods]
+
 
 class Block(Stmt):
-    def __init__(self, statements):
+    __slots__ = ("statements", "frame_size", "stepped")
+    dispatch_index = 0
+
+    def __init__(self, statements, frame_size=None, stepped=None):
         self.statements = statements
+        self.frame_size = frame_size
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_block(self)
 
 
 class Class(Stmt):
-    def __init__(self, name, superclass, methods):
+    __slots__ = ("name", "superclass", "methods", "slot", "captured", "super_slot", "frame_size")
+    dispatch_index = 1
+
+    def __init__(self, name, superclass, methods, slot=None, captured=False, super_slot=None, frame_size=None):
         self.name = name
         self.superclass = superclass
         self.methods = methods
+        self.slot = slot
+        self.captured = captured
+        self.super_slot = super_slot
+        self.frame_size = frame_size
 
     def accept(self, visitor):
         return visitor.visit_class(self)
 
 
 class Expression(Stmt):
-    def __init__(self, expression):
+    __slots__ = ("expression", "stepped")
+    dispatch_index = 2
+
+    def __init__(self, expression, stepped=None):
         self.expression = expression
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_expression(self)
 
 
 class Function(Stmt):
-    def __init__(self, name, params, body):
+    __slots__ = ("name", "params", "body", "slot", "captured", "frame_size", "upvalues", "cells")
+    dispatch_index = 3
+
+    def __init__(self, name, params, body, slot=None, captured=False, frame_size=None, upvalues=(), cells=()):
         self.name = name
         self.params = params
         self.body = body
+        self.slot = slot
+        self.captured = captured
+        self.frame_size = frame_size
+        self.upvalues = upvalues
+        self.cells = cells
 
     def accept(self, visitor):
         return visitor.visit_function(self)
 
 
 class If(Stmt):
-    def __init__(self, condition, then_branch, else_branch):
+    __slots__ = ("condition", "then_branch", "else_branch", "stepped")
+    dispatch_index = 4
+
+    def __init__(self, condition, then_branch, else_branch, stepped=None):
         self.condition = condition
         self.then_branch = then_branch
         self.else_branch = else_branch
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_if(self)
 
 
 class Print(Stmt):
-    def __init__(self, expression):
+    __slots__ = ("expression", "stepped")
+    dispatch_index = 5
+
+    def __init__(self, expression, stepped=None):
         self.expression = expression
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_print(self)
 
 
 class Return(Stmt):
-    def __init__(self, keyword, value):
+    __slots__ = ("keyword", "value", "stepped")
+    dispatch_index = 6
+
+    def __init__(self, keyword, value, stepped=None):
         self.keyword = keyword
         self.value = value
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_return(self)
 
 
 class Var(Stmt):
-    def __init__(self, name, initializer):
+    __slots__ = ("name", "initializer", "slot", "captured", "stepped")
+    dispatch_index = 7
+
+    def __init__(self, name, initializer, slot=None, captured=False, stepped=None):
         self.name = name
         self.initializer = initializer
+        self.slot = slot
+        self.captured = captured
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_var(self)
 
 
 class While(Stmt):
-    def __init__(self, condition, body):
+    __slots__ = ("condition", "body", "stepped")
+    dispatch_index = 8
+
+    def __init__(self, condition, body, stepped=None):
         self.condition = condition
         self.body = body
+        self.stepped = stepped
 
     def accept(self, visitor):
         return visitor.visit_while(self)
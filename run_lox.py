@@ -1,13 +1,53 @@
+import argparse
 import sys
 
 from src.lox import Lox
 
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="pylox")
+    parser.add_argument("script", nargs="?", help="script to run; starts a REPL if omitted")
+    parser.add_argument("--scanner", choices=Lox.scanners, default="regex")
+    parser.add_argument("--parser", choices=Lox.parsers, default="pratt")
+    parser.add_argument("--engine", choices=Lox.engines, default="ast")
+    parser.add_argument("--lazy", action="store_true",
+                        help="defer parsing function bodies until their first call")
+    parser.add_argument("--strict", action="store_true",
+                        help="with --lazy, still report errors in every function body")
+    parser.add_argument("--hot-threshold", type=int, default=1000, metavar="N",
+                        help="compile functions after N calls plus loop iterations; 0 never does")
+    parser.add_argument("--trace-tiers", action="store_true",
+                        help="report functions as they're compiled to stderr")
+    parser.add_argument("--max-stack", type=int, default=1 << 22, metavar="N",
+                        help="with --engine stack, entries its stack holds before overflowing")
+    parser.add_argument("--disassemble", action="store_true",
+                        help="print the script's bytecode instead of running it")
+    parser.add_argument("--emit-python", metavar="OUT",
+                        help="write the script translated to a Python module instead of running it")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="don't read or write the compiled-program cache")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    lox = Lox()
-    if len(sys.argv) > 2:
-        print("Usage: pylox [script]")
-    elif len(sys.argv) == 2:
-        lox.run_file(sys.argv[1])
+    args = parse_args(sys.argv[1:])
+    lox = Lox(scanner=args.scanner, parser=args.parser, lazy=args.lazy, strict=args.strict,
+              cache=args.cache, engine=args.engine, hot_threshold=args.hot_threshold or None,
+              trace_tiers=args.trace_tiers, max_stack=args.max_stack)
+    if args.script and args.disassemble:
+        with open(args.script, "r") as f:
+            listing = lox.disassemble(f.read())
+        if listing is None:
+            sys.exit(65)
+        print(listing)
+    elif args.script and args.emit_python:
+        with open(args.script, "r") as f:
+            source = lox.translate(f.read())
+        if source is None:
+            sys.exit(65)
+        with open(args.emit_python, "w") as f:
+            f.write(source)
+    elif args.script:
+        lox.run_file(args.script)
     else:
         lox.run_prompt()
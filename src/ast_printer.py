@@ -7,8 +7,11 @@ from src.token_type import TokenType as TT
 
 
 class AstPrinter(ExprVisitor):
+    def __init__(self):
+        self.table = Expr.dispatch_table(self)
+
     def print(self, expr):
-        print(expr.accept(self))
+        print(self.table[expr.dispatch_index](expr))
 
     def visit_binary(self, bin_expr):
         return self.parenthesize(bin_expr.operator.lexeme, bin_expr.left, bin_expr.right)
@@ -27,7 +30,7 @@ class AstPrinter(ExprVisitor):
 
         for expr in exprs:
             result += " "
-            result += expr.accept(self)
+            result += self.table[expr.dispatch_index](expr)
 
         result += ")"
         return result
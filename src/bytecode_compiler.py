@@ -0,0 +1,383 @@
+from pylox_ast.expr import ExprVisitor
+from pylox_ast.stmt import StmtVisitor
+from src.chunk import Chunk, OpCode, disassemble
+from src.environment import CELL, LOCAL, UPVALUE
+from src.parser import DeferredBody
+from src.symbol_table import INIT
+from src.token_type import TokenType as TT
+
+
+class FunctionProto():
+    """
+    A compiled function, like clox's ObjFunction: its bytecode and what the
+    VM needs to call it. Closures over it are `VMClosure`s.
+    """
+    def __init__(self, name, declaration=None, is_initializer=False):
+        self.name = name
+        # The `Function` it was compiled from, None for the top-level script
+        self.declaration = declaration
+        self.arity = len(declaration.params) if declaration else 0
+        self.is_initializer = is_initializer
+        # `(is_local, index)` for each cell closures over it capture
+        self.upvalues = declaration.upvalues if declaration else ()
+        # Filled in when the body is compiled, which is deferred until the
+        # first call for a body the parser deferred
+        self.chunk = None
+        # The chunk's code as a list, which the VM indexes about three times
+        # faster than the array
+        self.code = None
+        self.frame_size = 0
+
+    def __str__(self):
+        return f"<fn {self.name}>" if self.declaration else "<script>"
+
+
+class BytecodeCompiler(ExprVisitor, StmtVisitor):
+    """
+    Compiles resolved statements into bytecode for the `VM`.
+
+    The resolver has already decided where every variable lives, so this is
+    a single pass emitting instructions into the `Chunk` of the function
+    being compiled. Nested function bodies get chunks of their own, held in
+    their `FunctionProto` in the constant pool.
+    """
+    # Operator instructions, by token type
+    BINARY = {
+        TT.GREATER: OpCode.GREATER,
+        TT.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+        TT.LESS: OpCode.LESS,
+        TT.LESS_EQUAL: OpCode.LESS_EQUAL,
+        TT.MINUS: OpCode.SUBTRACT,
+        TT.PLUS: OpCode.ADD,
+        TT.SLASH: OpCode.DIVIDE,
+        TT.STAR: OpCode.MULTIPLY,
+    }
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.function = None
+        self.chunk = None
+        self.line = 0
+
+    def compile_script(self, statements):
+        """
+        Compiles top-level code into the function the VM starts running.
+        """
+        script = FunctionProto("script")
+        self.begin_function(script)
+        for statement in statements:
+            self.compile(statement)
+        self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+        script.code = script.chunk.code.tolist()
+        return script
+
+    def compile_body(self, function):
+        """
+        Compiles the body of `function`, parsing it first if it was deferred.
+        """
+        declaration = function.declaration
+        if isinstance(declaration.body, DeferredBody):
+            self.runtime.compile_deferred(declaration)
+
+        enclosing = (self.function, self.chunk, self.line)
+        self.begin_function(function)
+        self.line = declaration.name.line
+        function.frame_size = declaration.frame_size
+        # Parameters and "this" that closures capture are boxed on entry
+        for slot in declaration.cells:
+            self.emit(OpCode.BOX, slot)
+        for statement in declaration.body:
+            self.compile(statement)
+        self.emit_return()
+        function.code = function.chunk.code.tolist()
+        self.function, self.chunk, self.line = enclosing
+
+    def begin_function(self, function):
+        self.function = function
+        self.chunk = function.chunk = Chunk()
+
+    def compile(self, node):
+        node.accept(self)
+
+    def emit(self, op, *operands):
+        self.chunk.write(op, self.line)
+        for operand in operands:
+            self.chunk.write(operand, self.line)
+
+    def emit_jump(self, op):
+        """
+        Emits a jump to a target that isn't known yet and returns the offset
+        of its operand, for `patch_jump`.
+        """
+        self.emit(op, 0)
+        return len(self.chunk.code) - 1
+
+    def patch_jump(self, operand):
+        self.chunk.code[operand] = len(self.chunk.code)
+
+    def emit_return(self):
+        if self.function.is_initializer:
+            # An initializer always returns "this", in slot 0
+            self.emit_receiver()
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    def emit_receiver(self):
+        if 0 in self.function.declaration.cells:
+            self.emit(OpCode.GET_CELL, 0)
+        else:
+            self.emit(OpCode.GET_LOCAL, 0)
+
+    def constant(self, value):
+        return self.chunk.add_constant(value)
+
+    def emit_load(self, name, expr):
+        access = expr.access
+        if access is LOCAL:
+            self.emit(OpCode.GET_LOCAL, expr.slot)
+        elif access is CELL:
+            self.emit(OpCode.GET_CELL, expr.slot)
+        elif access is UPVALUE:
+            self.emit(OpCode.GET_UPVALUE, expr.slot)
+        else:
+            self.emit(OpCode.GET_GLOBAL, name.symbol)
+
+    def emit_define(self, declaration):
+        """
+        Defines the variable declared by `declaration` from the value on top
+        of the stack, like `Interpreter.define`.
+        """
+        if declaration.slot is None:
+            self.emit(OpCode.DEFINE_GLOBAL, declaration.name.symbol)
+        elif declaration.captured:
+            self.emit(OpCode.DEFINE_CELL, declaration.slot)
+        else:
+            self.emit(OpCode.DEFINE_LOCAL, declaration.slot)
+
+    def emit_initialize(self, declaration):
+        """
+        Sets a variable that `emit_define` has already declared from the value
+        on top of the stack, keeping its cell.
+        """
+        if declaration.captured:
+            self.emit(OpCode.SET_CELL, declaration.slot)
+            self.emit(OpCode.POP)
+        else:
+            self.emit_define(declaration)
+
+    def emit_closure(self, declaration, is_initializer=False):
+        function = FunctionProto(declaration.name.lexeme, declaration, is_initializer)
+        if not isinstance(declaration.body, DeferredBody):
+            self.compile_body(function)
+        self.emit(OpCode.CLOSURE, self.constant(function))
+
+    def reserve(self, frame_size):
+        # Top-level blocks and classes that need a frame use the script's
+        if frame_size is not None:
+            self.function.frame_size = max(self.function.frame_size, frame_size)
+
+    # Statements
+
+    def visit_block(self, stmt):
+        self.reserve(stmt.frame_size)
+        for statement in stmt.statements:
+            self.compile(statement)
+
+    def visit_class(self, stmt):
+        self.line = stmt.name.line
+        if stmt.superclass:
+            self.compile(stmt.superclass)
+            self.line = stmt.superclass.name.line
+
+        self.emit(OpCode.CLASS, self.constant(stmt.name), 1 if stmt.superclass else 0)
+
+        # The class variable is declared before the methods close over it
+        self.emit(OpCode.NIL)
+        self.emit_define(stmt)
+
+        if stmt.superclass:
+            self.reserve(stmt.frame_size)
+            self.emit(OpCode.SUPER_CELL, stmt.super_slot)
+
+        for method in stmt.methods:
+            self.line = method.name.line
+            is_initializer = method.name.symbol == INIT
+            self.emit_closure(method, is_initializer)
+            self.emit(OpCode.METHOD, self.constant(method.name))
+
+        self.emit_initialize(stmt)
+
+    def visit_expression(self, stmt):
+        self.compile(stmt.expression)
+        self.emit(OpCode.POP)
+
+    def visit_function(self, stmt):
+        self.line = stmt.name.line
+        if stmt.captured:
+            # Declared before the closure is created, so that a recursive
+            # local function can capture itself
+            self.emit(OpCode.NIL)
+            self.emit_define(stmt)
+        self.emit_closure(stmt)
+        self.emit_initialize(stmt)
+
+    def visit_if(self, stmt):
+        self.compile(stmt.condition)
+        else_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            self.patch_jump(else_jump)
+            return
+
+        end_jump = self.emit_jump(OpCode.JUMP)
+        self.patch_jump(else_jump)
+        self.compile(stmt.else_branch)
+        self.patch_jump(end_jump)
+
+    def visit_print(self, stmt):
+        self.compile(stmt.expression)
+        self.emit(OpCode.PRINT)
+
+    def visit_return(self, stmt):
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self.emit_return()
+        else:
+            self.compile(stmt.value)
+            self.emit(OpCode.RETURN)
+
+    def visit_var(self, stmt):
+        if stmt.initializer is None:
+            self.emit(OpCode.NIL)
+        else:
+            self.compile(stmt.initializer)
+        self.line = stmt.name.line
+        self.emit_define(stmt)
+
+    def visit_while(self, stmt):
+        start = len(self.chunk.code)
+        self.compile(stmt.condition)
+        exit_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile(stmt.body)
+        self.emit(OpCode.JUMP, start)
+        self.patch_jump(exit_jump)
+
+    # Expressions
+
+    def visit_assign(self, expr):
+        self.compile(expr.value)
+        self.line = expr.name.line
+        access = expr.access
+        if access is LOCAL:
+            self.emit(OpCode.SET_LOCAL, expr.slot)
+        elif access is CELL:
+            self.emit(OpCode.SET_CELL, expr.slot)
+        elif access is UPVALUE:
+            self.emit(OpCode.SET_UPVALUE, expr.slot)
+        else:
+            self.emit(OpCode.SET_GLOBAL, expr.name.symbol)
+
+    def visit_binary(self, expr):
+        self.compile(expr.left)
+        self.compile(expr.right)
+        operator = expr.operator
+        self.line = operator.line
+        match operator.type:
+            case TT.EQUAL_EQUAL:
+                self.emit(OpCode.EQUAL)
+            case TT.BANG_EQUAL:
+                self.emit(OpCode.EQUAL)
+                self.emit(OpCode.NOT)
+            case _:
+                self.emit(self.BINARY[operator.type], self.constant(operator))
+
+    def visit_call(self, expr):
+        self.compile(expr.callee)
+        for argument in expr.arguments:
+            self.compile(argument)
+        self.line = expr.paren.line
+        self.emit(OpCode.CALL, len(expr.arguments))
+
+    def visit_get(self, expr):
+        self.compile(expr.object_)
+        self.line = expr.name.line
+        self.emit(OpCode.GET_PROPERTY, self.constant(expr.name))
+
+    def visit_grouping(self, expr):
+        self.compile(expr.expression)
+
+    def visit_invoke(self, expr):
+        self.compile(expr.object_)
+        self.line = expr.name.line
+        self.emit(OpCode.GET_METHOD, self.constant(expr.name))
+        for argument in expr.arguments:
+            self.compile(argument)
+        self.line = expr.paren.line
+        self.emit(OpCode.INVOKE, len(expr.arguments))
+
+    def visit_literal(self, expr):
+        match expr.value:
+            case None:
+                self.emit(OpCode.NIL)
+            case True:
+                self.emit(OpCode.TRUE)
+            case False:
+                self.emit(OpCode.FALSE)
+            case value:
+                self.emit(OpCode.CONSTANT, self.constant(value))
+
+    def visit_logical(self, expr):
+        self.compile(expr.left)
+        if expr.operator.type == TT.OR:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_TRUE)
+        else:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compile(expr.right)
+        self.patch_jump(end_jump)
+
+    def visit_set(self, expr):
+        self.compile(expr.object_)
+        name = self.constant(expr.name)
+        self.line = expr.name.line
+        # The object is checked before the value is evaluated
+        self.emit(OpCode.CHECK_INSTANCE, name)
+        self.compile(expr.value)
+        self.line = expr.name.line
+        self.emit(OpCode.SET_PROPERTY, name)
+
+    def visit_super(self, expr):
+        self.line = expr.keyword.line
+        self.emit_load(expr.keyword, expr.this)
+        self.emit_load(expr.keyword, expr)
+        self.emit(OpCode.GET_SUPER, self.constant(expr.method))
+
+    def visit_this(self, expr):
+        self.line = expr.keyword.line
+        self.emit_load(expr.keyword, expr)
+
+    def visit_unary(self, expr):
+        self.compile(expr.right)
+        self.line = expr.operator.line
+        if expr.operator.type == TT.MINUS:
+            self.emit(OpCode.NEGATE, self.constant(expr.operator))
+        else:
+            self.emit(OpCode.NOT)
+
+    def visit_variable(self, expr):
+        self.line = expr.name.line
+        self.emit_load(expr.name, expr)
+
+
+def disassemble_program(function):
+    """
+    Returns the listing of a compiled function and every function compiled
+    inside it.
+    """
+    listings = [disassemble(function.chunk, str(function))]
+    for constant in function.chunk.constants:
+        if isinstance(constant, FunctionProto) and constant.chunk is not None:
+            listings.append(disassemble_program(constant))
+    return "\n\n".join(listings)
@@ -0,0 +1,175 @@
+from array import array
+from bisect import bisect_right
+from enum import IntEnum, auto
+
+from src.symbol_table import symbols
+
+
+class OpCode(IntEnum):
+    """
+    Instructions of the bytecode `VM`. Each is one word in a `Chunk`'s code,
+    followed by the number of operand words given in `OPERANDS`.
+    """
+    CONSTANT = 0
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+    # Variables, by frame slot, upvalue index or symbol id
+    GET_LOCAL = auto()
+    SET_LOCAL = auto()
+    DEFINE_LOCAL = auto()
+    GET_CELL = auto()
+    SET_CELL = auto()
+    DEFINE_CELL = auto()
+    BOX = auto()
+    GET_UPVALUE = auto()
+    SET_UPVALUE = auto()
+    GET_GLOBAL = auto()
+    SET_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+    # Properties, by the constant holding the name token
+    GET_PROPERTY = auto()
+    CHECK_INSTANCE = auto()
+    SET_PROPERTY = auto()
+    GET_SUPER = auto()
+    # Replaces an instance with the method to invoke on it and the instance,
+    # or with a field's value and None
+    GET_METHOD = auto()
+    # Operators, reporting errors against the constant holding the operator
+    EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    NOT = auto()
+    NEGATE = auto()
+    PRINT = auto()
+    # Jumps, to an absolute offset in the chunk
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()
+    JUMP_IF_TRUE = auto()
+    POP_JUMP_IF_FALSE = auto()
+    CALL = auto()
+    # Calls what GET_METHOD left under the arguments
+    INVOKE = auto()
+    CLOSURE = auto()
+    RETURN = auto()
+    CLASS = auto()
+    SUPER_CELL = auto()
+    METHOD = auto()
+
+
+# Operand words each instruction takes
+OPERANDS = {op: 0 for op in OpCode}
+OPERANDS.update({
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1, OpCode.SET_LOCAL: 1, OpCode.DEFINE_LOCAL: 1,
+    OpCode.GET_CELL: 1, OpCode.SET_CELL: 1, OpCode.DEFINE_CELL: 1, OpCode.BOX: 1,
+    OpCode.GET_UPVALUE: 1, OpCode.SET_UPVALUE: 1,
+    OpCode.GET_GLOBAL: 1, OpCode.SET_GLOBAL: 1, OpCode.DEFINE_GLOBAL: 1,
+    OpCode.GET_PROPERTY: 1, OpCode.CHECK_INSTANCE: 1, OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1, OpCode.GET_METHOD: 1,
+    OpCode.GREATER: 1, OpCode.GREATER_EQUAL: 1, OpCode.LESS: 1, OpCode.LESS_EQUAL: 1,
+    OpCode.ADD: 1, OpCode.SUBTRACT: 1, OpCode.MULTIPLY: 1, OpCode.DIVIDE: 1,
+    OpCode.NEGATE: 1,
+    OpCode.JUMP: 1, OpCode.JUMP_IF_FALSE: 1, OpCode.JUMP_IF_TRUE: 1,
+    OpCode.POP_JUMP_IF_FALSE: 1,
+    OpCode.CALL: 1, OpCode.INVOKE: 1, OpCode.CLOSURE: 1,
+    OpCode.CLASS: 2, OpCode.SUPER_CELL: 1, OpCode.METHOD: 1,
+})
+
+
+class Chunk():
+    """
+    The bytecode of one function: instructions and their operands as words
+    in a flat array, a constant pool, and a line table mapping instructions
+    back to source lines for error messages.
+    """
+    def __init__(self):
+        self.code = array("I")
+        self.constants = []
+        # (type, value) -> index of the number and string constants, which
+        # are the ones worth sharing
+        self.constant_index = {}
+        # Run-length encoded: each source line starts at the offset stored
+        # at the same index, and lasts until the next one
+        self.line_starts = []
+        self.lines = []
+
+    def write(self, word, line):
+        if not self.lines or self.lines[-1] != line:
+            self.line_starts.append(len(self.code))
+            self.lines.append(line)
+        self.code.append(word)
+
+    def add_constant(self, value):
+        """
+        Adds `value` to the constant pool and returns its index. Numbers and
+        strings reuse an existing entry for an equal value; anything else,
+        like the tokens and functions the compiler adds, gets its own entry.
+        """
+        if type(value) in (float, str):
+            key = (type(value), value)
+            index = self.constant_index.get(key)
+            if index is None:
+                index = self.constant_index[key] = len(self.constants)
+                self.constants.append(value)
+            return index
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def line_at(self, offset):
+        return self.lines[bisect_right(self.line_starts, offset) - 1]
+
+
+def disassemble(chunk, name):
+    """
+    Returns a listing of `chunk`, one instruction per line, in the format of
+    clox's disassembler.
+    """
+    lines = [f"== {name} =="]
+    offset = 0
+    while offset < len(chunk.code):
+        op = OpCode(chunk.code[offset])
+        operands = list(chunk.code[offset + 1:offset + 1 + OPERANDS[op]])
+
+        line = chunk.line_at(offset)
+        if offset > 0 and line == chunk.line_at(offset - 1):
+            source_line = "   |"
+        else:
+            source_line = f"{line:4}"
+
+        text = f"{offset:04} {source_line} {op.name:<17}"
+        if operands:
+            text += " " + " ".join(str(operand) for operand in operands)
+        if op in CONSTANT_OPERAND:
+            text += f" '{describe(chunk.constants[operands[0]])}'"
+        elif op in SYMBOL_OPERAND:
+            text += f" '{symbols.name(operands[0])}'"
+        lines.append(text.rstrip())
+        offset += 1 + len(operands)
+    return "\n".join(lines)
+
+
+# Instructions whose first operand indexes the constant pool
+CONSTANT_OPERAND = {
+    OpCode.CONSTANT, OpCode.GET_PROPERTY, OpCode.CHECK_INSTANCE, OpCode.SET_PROPERTY,
+    OpCode.GET_SUPER, OpCode.GET_METHOD, OpCode.CLOSURE, OpCode.CLASS, OpCode.METHOD,
+    OpCode.GREATER, OpCode.GREATER_EQUAL, OpCode.LESS, OpCode.LESS_EQUAL,
+    OpCode.ADD, OpCode.SUBTRACT, OpCode.MULTIPLY, OpCode.DIVIDE, OpCode.NEGATE,
+}
+
+# Instructions whose operand is a symbol id
+SYMBOL_OPERAND = {OpCode.GET_GLOBAL, OpCode.SET_GLOBAL, OpCode.DEFINE_GLOBAL}
+
+
+def describe(constant):
+    lexeme = getattr(constant, "lexeme", None)
+    if lexeme is not None:
+        return lexeme
+    return str(constant)
@@ -0,0 +1,721 @@
+from pylox_ast.expr import ExprVisitor
+import pylox_ast.stmt as Stmt
+from pylox_ast.stmt import StmtVisitor
+from src.environment import (CELL, LOCAL, UNDEFINED, UPVALUE, Cell, FramePool,
+                             GlobalEnvironment)
+from src.completion import NIL, TailCall
+from src.exceptions import RuntimeException
+from src.interpreter import Interpreter
+from src.lox_callable import ClockCallable, LoxFunction, checked_call
+from src.lox_class import LoxClass, LoxInstance, PropertyCache
+from src.parser import DeferredBody
+from src.symbol_table import INIT, symbols
+from src.token_type import TokenType as TT
+
+
+class CompiledFunction(LoxFunction):
+    """
+    A Lox function whose body the `ClosureCompiler` has turned into a Python
+    closure. The body is compiled on the first call, once per declaration.
+    """
+    def __init__(self, declaration, upvalues, is_initializer, body=None, receiver=None,
+                 free_frames=None):
+        super().__init__(declaration, upvalues, is_initializer, receiver, free_frames)
+        self.body = body
+
+    def bind(self, instance):
+        return CompiledFunction(self.declaration, self.upvalues, self.is_initializer, self.body,
+                                instance, self.free_frames)
+
+    def __call__(self, interpreter, arguments, receiver=None):
+        # Tail calls to other compiled functions loop here, as in `LoxFunction`
+        function = self
+        while True:
+            if receiver is None:
+                receiver = function.receiver
+            body = function.body
+            if body is None:
+                body = function.body = interpreter.function_body(function.declaration)
+
+            free_frames = function.free_frames
+            if free_frames:
+                environment = free_frames.pop()
+                interpreter.frames.reused += 1
+            else:
+                environment = interpreter.frames.allocate(function.declaration.frame_size,
+                                                          function.upvalues)
+
+            values = environment.values
+            if receiver is None:
+                values[:len(arguments)] = arguments
+            else:
+                values[0] = receiver
+                values[1:len(arguments) + 1] = arguments
+
+            try:
+                completion = body(environment)
+            finally:
+                values[:] = [None] * len(values)
+                free_frames.append(environment)
+
+            if type(completion) is not TailCall:
+                if function.is_initializer:
+                    return receiver
+                return None if completion is NIL else completion
+            function, arguments, receiver = (completion.function, completion.arguments,
+                                             completion.receiver)
+
+            if type(function) is not CompiledFunction:
+                return function(interpreter, arguments, receiver)
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    """
+    An execution engine that compiles each resolved statement and expression
+    once into a Python closure, then runs the closures.
+
+    The tree-walking `Interpreter` re-decides on every evaluation what the
+    resolver and parser already fixed: which operator a `Binary` applies,
+    where a variable lives, whether a block has a frame. Here those choices
+    are made at compile time by picking a closure specialized for them, so
+    running a node is a single call. Every closure takes the current frame
+    as its argument instead of reading it from the engine.
+
+    Runtime values, frames, classes and instances are shared with the
+    `Interpreter`, so both engines behave the same.
+    """
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.globals = GlobalEnvironment()
+        self.globals.define(symbols.intern("clock"), ClockCallable())
+        self.frames = FramePool()
+        # Compiled bodies by `Function` declaration, shared by every closure
+        # created from it
+        self.bodies = {}
+        # The engine compiled code passes to the functions it calls; the
+        # interpreter's, when `Tiering` compiles hot functions for it
+        self.interpreter = self
+
+    def interpret(self, statements):
+        self.globals.reserve()
+        try:
+            program = self.compile_block(statements)
+            # Top-level code only refers to globals, which don't live in a frame
+            program(self.globals)
+        except RuntimeException as error:
+            self.runtime.runtime_error(error)
+
+    def compile(self, node):
+        return node.accept(self)
+
+    def compile_block(self, statements):
+        """
+        Compiles `statements` into one closure that runs them in order and
+        returns their completion.
+        """
+        compiled = tuple(self.compile(statement) for statement in statements)
+        if len(compiled) == 1 and not isinstance(statements[0], Stmt.Expression):
+            return compiled[0]
+
+        returns = tuple(self.can_return(statement) for statement in statements)
+        if not any(returns):
+            def block(frame):
+                for statement in compiled:
+                    statement(frame)
+            return block
+
+        steps = tuple(zip(compiled, returns))
+        def returning_block(frame):
+            for statement, can_return in steps:
+                if can_return:
+                    completion = statement(frame)
+                    if completion is not None:
+                        return completion
+                else:
+                    statement(frame)
+            return None
+        return returning_block
+
+    @classmethod
+    def can_return(cls, stmt):
+        """
+        Whether `stmt` can run a `return` of the function it's in. The closures
+        of all other statements complete with None, except those of expression
+        statements, which return the expression's value for nobody to look at.
+        """
+        if isinstance(stmt, Stmt.Return):
+            return True
+        if isinstance(stmt, Stmt.Block):
+            return any(cls.can_return(statement) for statement in stmt.statements)
+        if isinstance(stmt, Stmt.If):
+            return cls.can_return(stmt.then_branch) or (
+                stmt.else_branch is not None and cls.can_return(stmt.else_branch))
+        if isinstance(stmt, Stmt.While):
+            return cls.can_return(stmt.body)
+        return False
+
+    def function_body(self, declaration):
+        """
+        Returns the compiled body of `declaration`, compiling it, and parsing
+        it first if it was deferred, on the first call.
+        """
+        body = self.bodies.get(declaration)
+        if body is None:
+            if isinstance(declaration.body, DeferredBody):
+                self.runtime.compile_deferred(declaration)
+            body = self.compile_block(declaration.body)
+            if declaration.cells:
+                body = self.box_cells(declaration.cells, body)
+            self.bodies[declaration] = body
+        return body
+
+    @staticmethod
+    def box_cells(cells, body):
+        """
+        Wraps `body` to box the parameters and "this" that closures capture
+        on entry.
+        """
+        def boxed(frame):
+            values = frame.values
+            for slot in cells:
+                values[slot] = Cell(values[slot])
+            return body(frame)
+        return boxed
+
+    def make_function(self, declaration, frame, is_initializer):
+        """
+        Creates a closure over `declaration` in `frame`, capturing the cells
+        the resolver listed as its upvalues.
+        """
+        if declaration.upvalues:
+            values = frame.values
+            upvalues = frame.upvalues
+            captured = [values[index] if is_local else upvalues[index]
+                        for is_local, index in declaration.upvalues]
+        else:
+            captured = ()
+
+        return CompiledFunction(declaration, captured, is_initializer,
+                                self.bodies.get(declaration))
+
+    def store(self, declaration):
+        """
+        Returns a closure `(frame, value)` that defines the variable declared
+        by `declaration`, like `Interpreter.define`.
+        """
+        slot = declaration.slot
+        if slot is None:
+            define = self.globals.define
+            symbol = declaration.name.symbol
+            return lambda frame, value: define(symbol, value)
+        if declaration.captured:
+            def store_cell(frame, value):
+                frame.values[slot] = Cell(value)
+            return store_cell
+
+        def store_local(frame, value):
+            frame.values[slot] = value
+        return store_local
+
+    def initializer(self, declaration):
+        """
+        Returns a closure `(frame, value)` that sets a variable `store`
+        already declared, keeping its cell, like `Interpreter.initialize`.
+        """
+        if declaration.captured:
+            slot = declaration.slot
+            def initialize_cell(frame, value):
+                frame.values[slot].value = value
+            return initialize_cell
+        return self.store(declaration)
+
+    def load(self, name, expr):
+        """
+        Compiles a read of the variable `expr` resolved to.
+        """
+        access = expr.access
+        slot = expr.slot
+        if access is LOCAL:
+            return lambda frame: frame.values[slot]
+        if access is CELL:
+            return lambda frame: frame.values[slot].value
+        if access is UPVALUE:
+            return lambda frame: frame.upvalues[slot].value
+
+        values = self.globals.values
+        symbol = name.symbol
+        undefined = self.globals.undefined
+        def load_global(frame):
+            value = values[symbol]
+            if value is UNDEFINED:
+                raise undefined(name)
+            return value
+        return load_global
+
+    @staticmethod
+    def property_cache(expr):
+        """
+        Returns the inline cache of a `Get` or `Super`, shared with the
+        interpreter when both run the node.
+        """
+        if expr.cache is None:
+            expr.cache = PropertyCache()
+        return expr.cache
+
+    # Statements
+
+    def visit_block(self, stmt):
+        body = self.compile_block(stmt.statements)
+        if stmt.frame_size is None:
+            # The resolver merged the block's locals into the current frame
+            return body
+
+        size = stmt.frame_size
+        allocate = self.frames.allocate
+        def block(frame):
+            return body(allocate(size))
+        return block
+
+    def visit_class(self, stmt):
+        superclass_fn = self.compile(stmt.superclass) if stmt.superclass else None
+        superclass_name = stmt.superclass.name if stmt.superclass else None
+        define = self.store(stmt)
+        initialize = self.initializer(stmt)
+        name = stmt.name.lexeme
+        super_slot = stmt.super_slot
+        frame_size = stmt.frame_size
+        allocate = self.frames.allocate
+        methods = [(method, method.name.symbol, method.name.symbol == INIT)
+                   for method in stmt.methods]
+        make_function = self.make_function
+
+        def klass(frame):
+            superclass = None
+            if superclass_fn is not None:
+                superclass = superclass_fn(frame)
+                if not isinstance(superclass, LoxClass):
+                    raise RuntimeException(superclass_name, "Superclass must be a class")
+
+            define(frame, None)
+
+            # Methods capture the superclass as "super" from a cell, in a
+            # frame of the class's own at the top level
+            environment = frame
+            if superclass_fn is not None:
+                if frame_size is not None:
+                    environment = allocate(frame_size)
+                environment.values[super_slot] = Cell(superclass)
+
+            functions = {symbol: make_function(method, environment, is_init)
+                         for method, symbol, is_init in methods}
+            initialize(frame, LoxClass(name, superclass, functions))
+        return klass
+
+    def visit_expression(self, stmt):
+        return self.compile(stmt.expression)
+
+    def visit_function(self, stmt):
+        if not isinstance(stmt.body, DeferredBody):
+            self.function_body(stmt)
+        define = self.store(stmt)
+        initialize = self.initializer(stmt)
+        make_function = self.make_function
+
+        def function(frame):
+            # Declared before the closure is created, so that a recursive
+            # local function can capture itself
+            define(frame, None)
+            initialize(frame, make_function(stmt, frame, False))
+        return function
+
+    def visit_if(self, stmt):
+        condition = self.compile(stmt.condition)
+        if self.can_return(stmt):
+            return self.returning_if(condition, stmt)
+
+        then_branch = self.compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            def if_then(frame):
+                value = condition(frame)
+                if value is not None and value is not False:
+                    then_branch(frame)
+            return if_then
+
+        else_branch = self.compile(stmt.else_branch)
+        def if_then_else(frame):
+            value = condition(frame)
+            if value is not None and value is not False:
+                then_branch(frame)
+            else:
+                else_branch(frame)
+        return if_then_else
+
+    def returning_if(self, condition, stmt):
+        """
+        Compiles an `if` with a `return` in it, which completes with the
+        completion of the branch it runs.
+        """
+        then_branch = self.compile_block([stmt.then_branch])
+        if stmt.else_branch is None:
+            def if_then(frame):
+                value = condition(frame)
+                if value is not None and value is not False:
+                    return then_branch(frame)
+                return None
+            return if_then
+
+        else_branch = self.compile_block([stmt.else_branch])
+        def if_then_else(frame):
+            value = condition(frame)
+            if value is not None and value is not False:
+                return then_branch(frame)
+            return else_branch(frame)
+        return if_then_else
+
+    def visit_print(self, stmt):
+        expression = self.compile(stmt.expression)
+        stringify = Interpreter.stringify
+        def print_(frame):
+            print(stringify(expression(frame)))
+        return print_
+
+    def visit_return(self, stmt):
+        if stmt.value is None:
+            return lambda frame: NIL
+
+        value_fn = self.compile(stmt.value)
+        def return_(frame):
+            value = value_fn(frame)
+            return NIL if value is None else value
+        return return_
+
+    def visit_var(self, stmt):
+        define = self.store(stmt)
+        if stmt.initializer is None:
+            return lambda frame: define(frame, None)
+
+        initializer = self.compile(stmt.initializer)
+        def var(frame):
+            define(frame, initializer(frame))
+        return var
+
+    def visit_while(self, stmt):
+        condition = self.compile(stmt.condition)
+        body = self.compile(stmt.body)
+        if self.can_return(stmt.body):
+            def returning_while(frame):
+                while True:
+                    value = condition(frame)
+                    if value is None or value is False:
+                        return None
+                    completion = body(frame)
+                    if completion is not None:
+                        return completion
+            return returning_while
+
+        def while_(frame):
+            while True:
+                value = condition(frame)
+                if value is None or value is False:
+                    break
+                body(frame)
+        return while_
+
+    # Expressions
+
+    def visit_assign(self, expr):
+        value_fn = self.compile(expr.value)
+        access = expr.access
+        slot = expr.slot
+        if access is LOCAL:
+            def assign_local(frame):
+                value = frame.values[slot] = value_fn(frame)
+                return value
+            return assign_local
+        if access is CELL:
+            def assign_cell(frame):
+                value = frame.values[slot].value = value_fn(frame)
+                return value
+            return assign_cell
+        if access is UPVALUE:
+            def assign_upvalue(frame):
+                value = frame.upvalues[slot].value = value_fn(frame)
+                return value
+            return assign_upvalue
+
+        values = self.globals.values
+        name = expr.name
+        symbol = name.symbol
+        undefined = self.globals.undefined
+        def assign_global(frame):
+            value = value_fn(frame)
+            if values[symbol] is UNDEFINED:
+                raise undefined(name)
+            values[symbol] = value
+            return value
+        return assign_global
+
+    def visit_binary(self, expr):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        operator = expr.operator
+        operands_error = "Operands must be numbers."
+
+        match operator.type:
+            case TT.GREATER:
+                def greater(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is not float or type(b) is not float:
+                        raise RuntimeException(operator, operands_error)
+                    return a > b
+                return greater
+            case TT.GREATER_EQUAL:
+                def greater_equal(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is not float or type(b) is not float:
+                        raise RuntimeException(operator, operands_error)
+                    return a >= b
+                return greater_equal
+            case TT.LESS:
+                def less(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is not float or type(b) is not float:
+                        raise RuntimeException(operator, operands_error)
+                    return a < b
+                return less
+            case TT.LESS_EQUAL:
+                def less_equal(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is not float or type(b) is not float:
+                        raise RuntimeException(operator, operands_error)
+                    return a <= b
+                return less_equal
+            case TT.BANG_EQUAL:
+                is_equal = Interpreter.is_equal
+                return lambda frame: not is_equal(left(frame), right(frame))
+            case TT.EQUAL_EQUAL:
+                is_equal = Interpreter.is_equal
+                return lambda frame: is_equal(left(frame), right(frame))
+            case TT.MINUS:
+                def subtract(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is not float or type(b) is not float:
+                        raise RuntimeException(operator, operands_error)
+                    return a - b
+                return subtract
+            case TT.SLASH:
+                def divide(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is not float or type(b) is not float:
+                        raise RuntimeException(operator, operands_error)
+                    if b == 0.0:
+                        raise RuntimeException(operator, "Cannot divide by zero.")
+                    return a / b
+                return divide
+            case TT.STAR:
+                def multiply(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is not float or type(b) is not float:
+                        raise RuntimeException(operator, operands_error)
+                    return a * b
+                return multiply
+            case TT.PLUS:
+                def add(frame):
+                    a = left(frame)
+                    b = right(frame)
+                    if type(a) is type(b) and (type(a) is float or type(a) is str):
+                        return a + b
+                    raise RuntimeException(operator, "Operands must be two numbers or two string")
+                return add
+
+    def compile_arguments(self, arguments):
+        """
+        Returns a function building the argument list of a call. Up to three
+        arguments are listed out, since a comprehension costs more than the
+        call it's making.
+        """
+        fns = tuple(self.compile(argument) for argument in arguments)
+        if len(fns) == 0:
+            return lambda frame: []
+        if len(fns) == 1:
+            a, = fns
+            return lambda frame: [a(frame)]
+        if len(fns) == 2:
+            a, b = fns
+            return lambda frame: [a(frame), b(frame)]
+        if len(fns) == 3:
+            a, b, c = fns
+            return lambda frame: [a(frame), b(frame), c(frame)]
+        return lambda frame: [fn(frame) for fn in fns]
+
+    def visit_call(self, expr):
+        callee_fn = self.compile(expr.callee)
+        arguments_fn = self.compile_arguments(expr.arguments)
+        count = len(expr.arguments)
+        paren = expr.paren
+        tail = expr.tail
+        interpreter = self.interpreter
+
+        def call(frame):
+            callee = callee_fn(frame)
+            arguments = arguments_fn(frame)
+
+            # Functions and classes whose cached arity matches skip the checks
+            kind = type(callee)
+            if kind is CompiledFunction or kind is LoxFunction:
+                if callee.param_count == count:
+                    if tail:
+                        return TailCall(callee, arguments)
+                    return callee(interpreter, arguments)
+            elif kind is LoxClass:
+                if callee.init_arity == count:
+                    return callee(interpreter, arguments)
+            return checked_call(interpreter, callee, arguments, paren)
+        return call
+
+    def visit_get(self, expr):
+        object_fn = self.compile(expr.object_)
+        name = expr.name
+        symbol = name.symbol
+        cache = self.property_cache(expr)
+        methods = cache.methods
+        def get(frame):
+            lox_object = object_fn(frame)
+            if not isinstance(lox_object, LoxInstance):
+                raise RuntimeException(name, "Only instances have properties.")
+            fields = lox_object.fields
+            if symbol in fields:
+                return fields[symbol]
+            method = methods.get(lox_object.klass)
+            if method is None:
+                method = cache.find_method(lox_object.klass, symbol)
+                if method is None:
+                    return lox_object.get(name)
+            else:
+                cache.hits += 1
+            return method.bind(lox_object)
+        return get
+
+    def visit_grouping(self, expr):
+        return self.compile(expr.expression)
+
+    def visit_invoke(self, expr):
+        object_fn = self.compile(expr.object_)
+        arguments_fn = self.compile_arguments(expr.arguments)
+        count = len(expr.arguments)
+        tail = expr.tail
+        name = expr.name
+        symbol = name.symbol
+        paren = expr.paren
+        cache = self.property_cache(expr)
+        methods = cache.methods
+        interpreter = self.interpreter
+
+        def invoke(frame):
+            lox_object = object_fn(frame)
+            if not isinstance(lox_object, LoxInstance):
+                raise RuntimeException(name, "Only instances have properties.")
+            fields = lox_object.fields
+            if symbol in fields:
+                return checked_call(interpreter, fields[symbol], arguments_fn(frame), paren)
+
+            method = methods.get(lox_object.klass)
+            if method is None:
+                method = cache.find_method(lox_object.klass, symbol)
+                if method is None:
+                    return lox_object.get(name)
+            else:
+                cache.hits += 1
+
+            arguments = arguments_fn(frame)
+            if count != method.param_count:
+                raise RuntimeException(paren,
+                        f"Expected {method.param_count} arguments but got {count}.")
+            if tail and isinstance(method, LoxFunction):
+                return TailCall(method, arguments, lox_object)
+            return method(interpreter, arguments, lox_object)
+        return invoke
+
+    def visit_literal(self, expr):
+        value = expr.value
+        return lambda frame: value
+
+    def visit_logical(self, expr):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        if expr.operator.type == TT.OR:
+            def or_(frame):
+                value = left(frame)
+                if value is not None and value is not False:
+                    return value
+                return right(frame)
+            return or_
+
+        def and_(frame):
+            value = left(frame)
+            if value is None or value is False:
+                return value
+            return right(frame)
+        return and_
+
+    def visit_set(self, expr):
+        object_fn = self.compile(expr.object_)
+        value_fn = self.compile(expr.value)
+        name = expr.name
+        def set_(frame):
+            lox_object = object_fn(frame)
+            if not isinstance(lox_object, LoxInstance):
+                raise RuntimeException(name, "Only instances have fields.")
+            value = value_fn(frame)
+            lox_object.set(name, value)
+            return value
+        return set_
+
+    def visit_super(self, expr):
+        superclass_fn = self.load(expr.keyword, expr)
+        this_fn = self.load(expr.keyword, expr.this)
+        method_name = expr.method
+        symbol = method_name.symbol
+        cache = self.property_cache(expr)
+        methods = cache.methods
+        def super_(frame):
+            superclass = superclass_fn(frame)
+            method = methods.get(superclass)
+            if method is None:
+                method = cache.find_method(superclass, symbol)
+                if method is None:
+                    raise RuntimeException(method_name,
+                                           f"Undefined property '{method_name.lexeme}'.")
+            else:
+                cache.hits += 1
+            return method.bind(this_fn(frame))
+        return super_
+
+    def visit_this(self, expr):
+        return self.load(expr.keyword, expr)
+
+    def visit_unary(self, expr):
+        right = self.compile(expr.right)
+        operator = expr.operator
+        if operator.type == TT.MINUS:
+            def negate(frame):
+                value = right(frame)
+                if type(value) is not float:
+                    raise RuntimeException(operator, "Operand must be a number.")
+                return -value
+            return negate
+
+        def not_(frame):
+            value = right(frame)
+            return value is None or value is False
+        return not_
+
+    def visit_variable(self, expr):
+        return self.load(expr.name, expr)
@@ -0,0 +1,27 @@
+"""
+How a `return` reaches the function call it returns from, in the engines that
+run statements one by one: the `Interpreter` and the `ClosureCompiler`.
+
+Running a statement produces a completion. It's None when the statement ran to
+its end, and otherwise what a `return` inside it returned: the value itself,
+`NIL` for nil, or a `TailCall`. Blocks, ifs and loops hand a completion that
+isn't None straight back to whatever ran them, up to the function call, so
+returning takes no exception.
+"""
+
+# What a `return` of nil completes with, since None means no `return` ran
+NIL = object()
+
+
+class TailCall():
+    """
+    The completion of a `return` whose value is a call to a Lox function. The
+    call running the returning function makes the call in its place, in a
+    loop, so tail calls don't grow the Python stack.
+    """
+    __slots__ = ("function", "arguments", "receiver")
+
+    def __init__(self, function, arguments, receiver=None):
+        self.function = function
+        self.arguments = arguments
+        self.receiver = receiver
@@ -1,53 +1,115 @@
-from src.exceptions import RuntimeException, Return
-from src.lox_token import Token
+from enum import Enum, auto
+
+from src.exceptions import RuntimeException
+from src.symbol_table import symbols
+
+
+class Access(Enum):
+    """
+    How a resolved variable reference reaches its variable.
+    """
+    # Directly in a slot of the current frame
+    LOCAL = auto()
+    # In a `Cell` held in a slot of the current frame
+    CELL = auto()
+    # In a `Cell` captured by the running closure
+    UPVALUE = auto()
+
+
+# Reading an Enum member off its class is slow enough to matter on the hot
+# path, so the interpreter compares against these module-level aliases
+LOCAL, CELL, UPVALUE = Access.LOCAL, Access.CELL, Access.UPVALUE
+
+
+class Cell():
+    """
+    Holds a local that closures capture, so it outlives its frame and every
+    closure sees the same variable.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return f"<cell {self.value}>"
 
 
 class Environment():
-    def __init__(self, enclosing=None):
-        self.values = {}
-        self.enclosing = enclosing
+    """
+    The frame of one function call, or of top-level code that declares
+    locals. The resolver gives every local a slot, and blocks share the frame
+    of the function around them, so a frame is a fixed-size list indexed by
+    slot. Variables captured from enclosing functions are reached through the
+    running closure's `upvalues` rather than a chain of parent frames.
+    """
+    __slots__ = ("values", "upvalues")
+
+    def __init__(self, size=0, upvalues=()):
+        self.values = [None] * size
+        self.upvalues = upvalues
 
     def __str__(self):
-        return f"{self.values} |> {self.enclosing}"
+        return f"{self.values} upvalues={list(map(str, self.upvalues))}"
 
-    def define(self, name, value):
-        self.values[name] = value
+    def define(self, slot, value):
+        self.values[slot] = value
 
-    def get_at(self, distance, name):
-        if isinstance(name, Token):
-            return self.ancestor(distance).values[name.lexeme]
-        return self.ancestor(distance).values[name]
 
-    def assign_at(self, distance, name, value):
-        self.ancestor(distance).values[name.lexeme] = value
+class FramePool():
+    """
+    Keeps track of the frames the interpreter allocates and the ones it
+    recycles instead.
+
+    Closures hold on to the cells of the variables they capture, never to a
+    frame, so a frame is garbage as soon as its call is over. Every
+    `LoxFunction` therefore keeps a free list of the frames its finished calls
+    left behind, all of the right size, and only allocates when that list is
+    empty, which happens once per level of recursion.
+    """
+    def __init__(self):
+        self.allocated = 0
+        self.reused = 0
+
+    def allocate(self, size, upvalues=()):
+        self.allocated += 1
+        return Environment(size, upvalues)
 
-    def ancestor(self, distance):
-        """
-        Walks a fixed number of hops up the parent chain and
-        returns the environment there.
-        """
-        env = self
-        for _ in range(distance):
-            env = env.enclosing
-        return env
 
-    def get(self, name):
-        if name.lexeme in self.values.keys():
-            return self.values[name.lexeme]
+# Marks a global whose declaration hasn't run yet. nil is a valid value, so
+# None can't be used.
+UNDEFINED = object()
 
-        # If variable isn't found in this environment, we try the enclosing one
-        if self.enclosing:
-            return self.enclosing.get(name)
 
-        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+class GlobalEnvironment():
+    """
+    The outermost environment. Globals aren't resolved to frame slots, since
+    they can be declared after the code that refers to them. Instead the table
+    is a list indexed by symbol id, which every identifier token carries from
+    the scanner, so a global is one index away and an undefined one holds
+    `UNDEFINED` until its declaration runs.
+    """
+    def __init__(self):
+        self.values = []
 
-    def assign(self, name, value):
-        if name.lexeme in self.values.keys():
-            self.define(name.lexeme, value)
-            return
+    def __str__(self):
+        return str({symbols.name(symbol): value for symbol, value in enumerate(self.values)
+                    if value is not UNDEFINED})
+
+    def reserve(self):
+        """
+        Grows the table to cover every symbol interned so far. It must be
+        called after compiling code and before running it.
+        """
+        missing = len(symbols) - len(self.values)
+        if missing > 0:
+            self.values.extend([UNDEFINED] * missing)
 
-        if self.enclosing:
-            self.enclosing.assign(name, value)
-            return
+    def define(self, symbol, value):
+        if symbol >= len(self.values):
+            self.reserve()
+        self.values[symbol] = value
 
-        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+    @staticmethod
+    def undefined(name):
+        return RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
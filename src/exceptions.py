@@ -3,8 +3,3 @@ class RuntimeException(Exception):
         self.token = token
         self.message = message
 
-
-class Return(RuntimeException):
-    def __init__(self, value):
-        super().__init__(None, None)
-        self.value = value
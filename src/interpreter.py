@@ -3,24 +3,32 @@ import sys
 
 from pylox_ast.expr import ExprVisitor
 from pylox_ast.stmt import StmtVisitor
-from src.environment import Environment
-from src.exceptions import RuntimeException, Return
-from src.lox_callable import LoxCallable, ClockCallable, LoxFunction
-from src.lox_class import LoxClass, LoxInstance
+from src.environment import (CELL, LOCAL, UNDEFINED, UPVALUE, Cell, FramePool,
+                             GlobalEnvironment)
+from src.completion import NIL, TailCall
+from src.exceptions import RuntimeException
+from src.lox_callable import ClockCallable, LoxFunction, checked_call
+from src.lox_class import LoxClass, LoxInstance, PropertyCache
 from src.lox_token import Token
+from src.symbol_table import INIT, symbols
+from src.tiering import CallProfile, Tiering
 from src.token_type import TokenType as TT
 
 
 class Interpreter(ExprVisitor, StmtVisitor):
-    _globals = Environment()
-    _globals.define("clock", ClockCallable())
-
     def __init__(self, runtime):
         self.runtime = runtime
-        self.environment = self._globals
-        self.locals = {}
+        self.globals = GlobalEnvironment()
+        self.globals.define(symbols.intern("clock"), ClockCallable())
+        self.environment = self.globals
+        self.frames = FramePool()
+        self.tiering = Tiering(self, runtime.hot_threshold, runtime.trace_tiers)
+        # The profile of the function being tree-walked, which loops count
+        # their back-edges in; top-level code has one that's never promoted
+        self.profile = CallProfile()
 
     def interpret(self, statements):
+        self.globals.reserve()
         try:
             for statement in statements:
                 self.execute(statement)
@@ -67,15 +75,20 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return value
 
     def visit_super(self, expr):
-        distance = self.locals[expr]
-        superclass = self.environment.get_at(distance, "super")
-
-        _object = self.environment.get_at(distance - 1, "this")
-
-        method = superclass.find_method(expr.method.lexeme)
-        
-        if method == None:
-            raise RuntimeException(expr.method, f"Undefined property '{expr.method.lexeme}'.")
+        superclass = self.lookup_variable(expr.keyword, expr)
+        _object = self.lookup_variable(expr.keyword, expr.this)
+
+        cache = expr.cache
+        if cache is None:
+            cache = expr.cache = PropertyCache()
+        method = cache.methods.get(superclass)
+        if method is None:
+            method = cache.find_method(superclass, expr.method.symbol)
+            if method is None:
+                raise RuntimeException(expr.method,
+                                       f"Undefined property '{expr.method.lexeme}'.")
+        else:
+            cache.hits += 1
 
         return method.bind(_object)
 
@@ -147,50 +160,174 @@ class Interpreter(ExprVisitor, StmtVisitor):
                         raise RuntimeException(expr.operator, msg)
 
     def visit_call(self, expr):
+        """
+        Functions and classes are called without the `LoxCallable` check and
+        the `arity` call when the argument count matches what they cached;
+        anything else goes through `checked_call`, which reports the error.
+        """
         callee = self.evaluate(expr.callee)
-        arguments = [self.evaluate(arg) for arg in expr.arguments]
-
-        if not isinstance(callee, LoxCallable):
-            raise RuntimeException(expr.paren, "Can only call functions and classes.")
-
-        if len(arguments) != callee.arity():
-            raise RuntimeException(expr.paren,
-                    f"Expected {callee.arity()} arguments but got {len(arguments)}.")
-
-        return callee(self, arguments)
+        arguments = self.evaluate_arguments(expr.arguments)
+        count = len(arguments)
+
+        kind = type(callee)
+        if kind is LoxFunction:
+            if callee.param_count == count:
+                if expr.tail:
+                    return TailCall(callee, arguments)
+                return callee(self, arguments)
+        elif kind is LoxClass:
+            if callee.init_arity == count:
+                return callee(self, arguments)
+        return checked_call(self, callee, arguments, expr.paren)
 
     def visit_get(self, expr):
+        """
+        Fields shadow methods, so they're looked up first. A method is found
+        through the site's `PropertyCache`, keyed by the instance's class.
+        """
+        lox_object = self.evaluate(expr.object_)
+        if not isinstance(lox_object, LoxInstance):
+            raise RuntimeException(expr.name, "Only instances have properties.")
+
+        symbol = expr.name.symbol
+        fields = lox_object.fields
+        if symbol in fields:
+            return fields[symbol]
+
+        cache = expr.cache
+        if cache is None:
+            cache = expr.cache = PropertyCache()
+        method = cache.methods.get(lox_object.klass)
+        if method is None:
+            method = cache.find_method(lox_object.klass, symbol)
+            if method is None:
+                # Reports the undefined property
+                return lox_object.get(expr.name)
+        else:
+            cache.hits += 1
+        return method.bind(lox_object)
+
+    def visit_invoke(self, expr):
+        """
+        Calls a method as `visit_call` would call the result of `visit_get`,
+        but passes the instance as the receiver instead of binding the method
+        to it first. A callable held in a field is called as it is.
+        """
         lox_object = self.evaluate(expr.object_)
-        if isinstance(lox_object, LoxInstance):
-            return lox_object.get(expr.name)
+        if not isinstance(lox_object, LoxInstance):
+            raise RuntimeException(expr.name, "Only instances have properties.")
+
+        symbol = expr.name.symbol
+        fields = lox_object.fields
+        if symbol in fields:
+            callee = fields[symbol]
+            return checked_call(self, callee, self.evaluate_arguments(expr.arguments), expr.paren)
+
+        cache = expr.cache
+        if cache is None:
+            cache = expr.cache = PropertyCache()
+        method = cache.methods.get(lox_object.klass)
+        if method is None:
+            method = cache.find_method(lox_object.klass, symbol)
+            if method is None:
+                # Reports the undefined property
+                return lox_object.get(expr.name)
+        else:
+            cache.hits += 1
 
-        raise RuntimeException(expr.name, "Only instances have properties.")
+        arguments = self.evaluate_arguments(expr.arguments)
+        if len(arguments) != method.param_count:
+            raise RuntimeException(expr.paren,
+                    f"Expected {method.param_count} arguments but got {len(arguments)}.")
+        if expr.tail and type(method) is LoxFunction:
+            return TailCall(method, arguments, lox_object)
+        return method(self, arguments, lox_object)
 
     def evaluate(self, expr):
         return expr.accept(self)
 
+    def evaluate_arguments(self, arguments):
+        # Short argument lists, the common case, are built without a loop
+        count = len(arguments)
+        if count == 0:
+            return []
+        if count == 1:
+            return [arguments[0].accept(self)]
+        if count == 2:
+            return [arguments[0].accept(self), arguments[1].accept(self)]
+        if count == 3:
+            return [arguments[0].accept(self), arguments[1].accept(self),
+                    arguments[2].accept(self)]
+        return [argument.accept(self) for argument in arguments]
+
     def execute(self, stmt):
-        stmt.accept(self)
+        """
+        Runs `stmt`, returning its completion, see `src.completion`.
+        """
+        return stmt.accept(self)
+
+    def define(self, declaration, value):
+        """
+        Defines the variable declared by `declaration` in the current frame, or
+        as a global if the resolver didn't give it a slot. Captured variables
+        get a fresh cell each time their declaration runs.
+        """
+        if declaration.slot is None:
+            self.globals.define(declaration.name.symbol, value)
+        elif declaration.captured:
+            self.environment.define(declaration.slot, Cell(value))
+        else:
+            self.environment.define(declaration.slot, value)
+
+    def initialize(self, declaration, value):
+        """
+        Sets a variable that `define` has already declared, keeping its cell
+        so closures created in between see the value.
+        """
+        if declaration.captured:
+            self.environment.values[declaration.slot].value = value
+        else:
+            self.define(declaration, value)
 
-    def resolve(self, expr, depth):
-        self.locals[expr] = depth
+    def capture(self, function):
+        """
+        Collects the cells a closure over `function` created in the current
+        frame captures.
+        """
+        if not function.upvalues:
+            return ()
+        values = self.environment.values
+        upvalues = self.environment.upvalues
+        return [values[index] if is_local else upvalues[index]
+                for is_local, index in function.upvalues]
 
     def execute_block(self, statements, new_env):
         """
         To execute code within a given scope, this method updates the interpreter's
         `environment` field, visits all the statements, then restores the previous value.
+        A `return` stops the block early, and its completion is returned.
         """
         prev_env = self.environment
         try:
             self.environment = new_env
             for statement in statements:
-                self.execute(statement)
+                completion = statement.accept(self)
+                if completion is not None:
+                    return completion
+            return None
         finally:
             self.environment = prev_env
 
     def visit_block(self, stmt):
-        self.execute_block(stmt.statements, Environment(enclosing=self.environment))
-        return None
+        if stmt.frame_size is None:
+            # The resolver merged the block's locals into the current frame
+            for statement in stmt.statements:
+                completion = statement.accept(self)
+                if completion is not None:
+                    return completion
+            return None
+        # Only top-level blocks have a frame of their own
+        return self.execute_block(stmt.statements, self.frames.allocate(stmt.frame_size))
 
     def visit_class(self, stmt):
         superclass = None
@@ -199,27 +336,26 @@ class Interpreter(ExprVisitor, StmtVisitor):
             if not isinstance(superclass, LoxClass):
                 raise RuntimeException(stmt.superclass.name, "Superclass must be a class")
 
-        self.environment.define(stmt.name.lexeme, None)
+        self.define(stmt, None)
 
-        # When we evaluate a sublclass definition, we create a new environment. Inside, we
-        # store a references to the superclass. Then we create the LoxFunctions for each method.
-        # Those will capture the current environment - the one where we just bound "super" - as
-        # closure, holding on to the reference to the superclass
+        # When we evaluate a subclass definition, we store the superclass in a cell
+        # that the methods capture as "super". At the top level there's no frame
+        # to put the cell in, so the class gets one of its own.
+        environment = self.environment
         if stmt.superclass:
-            self.environment = Environment(enclosing=self.environment)
-            self.environment.define("super", superclass)
+            if stmt.frame_size is not None:
+                self.environment = self.frames.allocate(stmt.frame_size)
+            self.environment.define(stmt.super_slot, Cell(superclass))
 
         methods = {}
         for method in stmt.methods:
-            function = LoxFunction(method, self.environment, method.name.lexeme=="init")
-            methods[method.name.lexeme] = function
+            function = LoxFunction(method, self.capture(method), method.name.symbol == INIT)
+            methods[method.name.symbol] = function
 
-        # Now that we're done creating the methods we can pop back to the initial environment
-        if superclass:
-            self.environment = self.environment.enclosing
+        self.environment = environment
 
         klass = LoxClass(stmt.name.lexeme, superclass, methods)
-        self.environment.assign(stmt.name, klass)
+        self.initialize(stmt, klass)
         return None
 
     def visit_expression(self, stmt):
@@ -227,15 +363,17 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return None
 
     def visit_function(self, stmt):
-        function = LoxFunction(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, function)
+        # The function is declared before its closure is created, so that a
+        # recursive local function can capture itself
+        self.define(stmt, None)
+        self.initialize(stmt, LoxFunction(stmt, self.capture(stmt), False))
         return None
 
     def visit_if(self, stmt):
         if self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.then_branch)
+            return self.execute(stmt.then_branch)
         elif stmt.else_branch:
-            self.execute(stmt.else_branch)
+            return self.execute(stmt.else_branch)
         return None
 
     def visit_print(self, stmt):
@@ -244,41 +382,67 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return None
 
     def visit_return(self, stmt):
-        value = None
         if stmt.value:
             value = self.evaluate(stmt.value)
-        raise Return(value)
+            if value is not None:
+                return value
+        return NIL
 
     def visit_var(self, stmt):
         value = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
-        self.environment.define(stmt.name.lexeme, value)
+        self.define(stmt, value)
         return None
 
     def visit_while(self, stmt):
+        profile = self.profile
         while self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            completion = self.execute(stmt.body)
+            if completion is not None:
+                return completion
+            profile.back_edges += 1
         return None
 
+    def function_body(self, declaration):
+        """
+        Returns the compiled body of a function created by promoted code,
+        which is compiled too.
+        """
+        return self.tiering.compiler.function_body(declaration)
+
     def visit_variable(self, expr):
         return self.lookup_variable(expr.name, expr)
 
     def lookup_variable(self, name, expr):
-        distance = self.locals.get(expr, None)
-        if distance is not None:
-            return self.environment.get_at(distance, name.lexeme)
+        access = expr.access
+        if access is LOCAL:
+            return self.environment.values[expr.slot]
+        elif access is None:
+            value = self.globals.values[name.symbol]
+            if value is UNDEFINED:
+                raise self.globals.undefined(name)
+            return value
+        elif access is CELL:
+            return self.environment.values[expr.slot].value
         else:
-            return self._globals.get(name)
+            return self.environment.upvalues[expr.slot].value
 
     def visit_assign(self, expr):
         value = self.evaluate(expr.value)
 
-        distance = self.locals.get(expr, None)
-        if distance:
-            self.environment.assign_at(distance, expr.name, value)
+        access = expr.access
+        if access is LOCAL:
+            self.environment.values[expr.slot] = value
+        elif access is CELL:
+            self.environment.values[expr.slot].value = value
+        elif access is UPVALUE:
+            self.environment.upvalues[expr.slot].value = value
         else:
-            self._globals.assign(expr.name, value)
+            values = self.globals.values
+            if values[expr.name.symbol] is UNDEFINED:
+                raise self.globals.undefined(expr.name)
+            values[expr.name.symbol] = value
 
         return value
     
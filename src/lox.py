@@ -1,30 +1,91 @@
+import mmap
 import os
 import sys
 
 from src.ast_printer import AstPrinter
+from src.bytecode_compiler import BytecodeCompiler, disassemble_program
+from src.closure_compiler import ClosureCompiler
+from src.exceptions import RuntimeException
 from src.interpreter import Interpreter
 from src.lox_token import Token
 from src.parser import Parser
+from src.pratt_parser import PrattParser
+from src.python_translator import PythonEngine, PythonTranslator
+from src.program_cache import ProgramCache
+from src.regex_scanner import RegexScanner
 from src.resolver import Resolver
 from src.scanner import Scanner
+from src.stack_interpreter import StackInterpreter
 from src.token_type import TokenType
+from src.vm import VM
 
 class Lox():
-    def __init__(self):
+    # Scanner engines selectable by name. Both produce identical token streams;
+    # "regex" matches whole lexemes at once, "char" walks the source one
+    # character at a time.
+    scanners = {"char": Scanner, "regex": RegexScanner}
+    # Parsers selectable by name. Both build identical trees; "pratt" parses
+    # expressions by precedence climbing, "recursive" with one method per level.
+    parsers = {"recursive": Parser, "pratt": PrattParser}
+    # Execution engines selectable by name. All run the same resolved tree
+    # with the same runtime objects; "ast" walks it node by node, "closure"
+    # compiles it into specialized Python closures first, "vm" compiles it
+    # to bytecode for a stack machine, "python" translates it to Python
+    # source that CPython compiles and runs, and "stack" walks it like "ast"
+    # but keeps Lox calls on a stack of its own instead of Python's.
+    engines = {"ast": Interpreter, "closure": ClosureCompiler, "vm": VM,
+               "python": PythonEngine, "stack": StackInterpreter}
+
+    def __init__(self, scanner="regex", parser="pratt", lazy=False, strict=False, cache=True,
+                 engine="ast", hot_threshold=1000, trace_tiers=False, max_stack=1 << 22):
+        self.scanner = self.scanners[scanner]
+        self.parser = self.parsers[parser]
+        # Lazy mode defers parsing and resolving top-level function and method
+        # bodies until their first call. Strict mode still compiles every
+        # deferred body before running, so syntax errors in unused functions
+        # are reported.
+        self.lazy = lazy
+        self.strict = strict
+        # Whether `run_file` keeps compiled programs in an on-disk cache
+        self.cache = cache
+        # The "ast" engine compiles a function once its calls plus loop
+        # iterations reach `hot_threshold`, see `Tiering`; None never does.
+        # `trace_tiers` prints each promotion to stderr.
+        self.hot_threshold = hot_threshold
+        self.trace_tiers = trace_tiers
+        # How many pending tasks and values the "stack" engine may hold, a
+        # few dozen bytes each, before a call fails with "Stack overflow."
+        self.max_stack = max_stack
         self.had_error = False
         self.had_runtime_error = False
-        self.interpreter = Interpreter(self)
+        self.interpreter = self.engines[engine](self)
 
     def run_file(self, path):
-        with open(path, "r") as f:
-            lines = f.readlines()
-            program = ''.join(lines)
-            self.run(program)
+        with open(path, "rb") as f:
+            source = self.map_source(f)
+            cache = ProgramCache.for_script(path) if self.cache else None
+            try:
+                self.run(source, cache)
+            finally:
+                if isinstance(source, mmap.mmap):
+                    source.close()
 
-            if self.had_error:
-                sys.exit(65)
-            if self.had_runtime_error:
-                sys.exit(70)
+        if self.had_error:
+            sys.exit(65)
+        if self.had_runtime_error:
+            sys.exit(70)
+
+    @staticmethod
+    def map_source(f):
+        """
+        Memory-maps an open script so the scanner can read it without a
+        separate in-memory copy of the whole program.
+        """
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            return b""
 
     def run_prompt(self):
         while True:
@@ -37,23 +98,113 @@ class Lox():
             except EOFError:
                 break
 
-    def run(self, program):
-        scanner = Scanner(self, program)
-        tokens = scanner.scan_tokens()
+    def run(self, program, cache=None):
+        statements = self.compile(program, cache)
+        if statements is None: return
+
+        self.interpreter.interpret(statements)
+
+    def compile(self, program, cache=None):
+        """
+        Scans, parses and resolves `program`, or loads it from `cache` if it was
+        compiled before. Returns the statements, or None if there were errors.
+        """
+        if cache:
+            key = cache.key(program, f"lazy={self.lazy},strict={self.strict}")
+            statements = cache.load(key)
+            if statements is not None:
+                return statements
 
-        parser = Parser(self, tokens)
-        statements = parser.parse()
+        # `program` is a str or a UTF-8 buffer. Tokens are produced lazily as the
+        # parser asks for them instead of being collected up front.
+        scanner = self.scanner(self, program)
+        tokens = scanner.iter_tokens()
 
-        # Stop if there was a syntax error
-        if self.had_error: return
+        parser = self.parser(self, tokens, lazy=self.lazy)
+        try:
+            statements = parser.parse()
 
-        resolver = Resolver(self.interpreter, self)
-        resolver.resolve(statements)
+            # Stop if there was a syntax error
+            if self.had_error: return None
+
+            resolver = Resolver(self.interpreter, self)
+            resolver.resolve(statements)
+        except RecursionError:
+            # Operator chains are handled in loops, but other nesting, like
+            # parentheses, is still parsed and resolved recursively
+            previous = parser.previous()
+            self.error(previous.line if previous else 1, "Program is nested too deeply.")
+            return None
 
         # Stop if there was a resolution error
-        if self.had_error: return
-        
-        self.interpreter.interpret(statements)
+        if self.had_error: return None
+
+        if self.strict:
+            for function in parser.deferred:
+                self.compile_function(function)
+            if self.had_error: return None
+
+        # The resolver records its results on the nodes, so the statements
+        # are all there is to cache
+        if cache:
+            cache.store(key, statements)
+        return statements
+
+    def disassemble(self, program):
+        """
+        Returns the listing of the bytecode the VM runs for `program`, or None
+        if it has errors. Deferred function bodies aren't compiled, so they
+        aren't listed.
+        """
+        statements = self.compile(program)
+        if statements is None: return None
+        return disassemble_program(BytecodeCompiler(self).compile_script(statements))
+
+    def translate(self, program):
+        """
+        Returns `program` translated to the source of a Python module that
+        runs it on its own, or None if it has errors. Deferred function bodies
+        are translated too.
+        """
+        statements = self.compile(program)
+        if statements is None: return None
+        source = PythonTranslator(self, eager=True).translate(statements)
+        if self.had_error: return None
+        return source
+
+    def compile_function(self, function):
+        """
+        Parses and resolves the deferred body of `function` in place. Returns
+        False if it had errors, in which case the body stays deferred.
+        """
+        deferred = function.body
+        had_error, self.had_error = self.had_error, False
+
+        parser = self.parser(self, deferred.tokens)
+        try:
+            body = parser.block_statement()
+            if not self.had_error:
+                function.body = body
+                Resolver(self.interpreter, self).resolve_deferred(function, deferred)
+        except RecursionError:
+            self.error(parser.previous().line, "Program is nested too deeply.")
+        if self.had_error:
+            function.body = deferred
+
+        compiled = not self.had_error
+        self.had_error = self.had_error or had_error
+        return compiled
+
+    def compile_deferred(self, function):
+        """
+        Compiles a deferred function on its first call, turning errors in its
+        body into a runtime error at the call.
+        """
+        if not self.compile_function(function):
+            raise RuntimeException(function.name,
+                    f"Could not compile function '{function.name.lexeme}'.")
+        # The body may name globals no code has mentioned yet
+        self.interpreter.globals.reserve()
 
     def error(self, line, message):
         self.report(line, "", message)
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
 import time
 
-from src.environment import Environment
-from src.exceptions import Return
+from src.environment import Cell
+from src.completion import NIL, TailCall
+from src.exceptions import RuntimeException
+from src.parser import DeferredBody
+from src.tiering import CallProfile
 
 
 class LoxCallable(ABC):
@@ -15,6 +18,21 @@ class LoxCallable(ABC):
         raise NotImplementedError
 
 
+def checked_call(interpreter, callee, arguments, paren):
+    """
+    Calls whatever a callee expression evaluated to, after checking that it
+    can be called with `arguments`, reporting errors against `paren`.
+    """
+    if not isinstance(callee, LoxCallable):
+        raise RuntimeException(paren, "Can only call functions and classes.")
+
+    if len(arguments) != callee.arity():
+        raise RuntimeException(paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+
+    return callee(interpreter, arguments)
+
+
 class ClockCallable(LoxCallable):
     def arity(self):
         return 0
@@ -26,35 +44,98 @@ class ClockCallable(LoxCallable):
 
 
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration, closure, is_initializer):
+    def __init__(self, declaration, upvalues, is_initializer, receiver=None, free_frames=None,
+                 profile=None):
         self.declaration = declaration
-        self.closure = closure
+        # Read by engines' call fast paths instead of calling `arity`
+        self.param_count = len(declaration.params)
+        # The cells of the variables the function captures, see `Resolver`
+        self.upvalues = upvalues
         self.is_initializer = is_initializer
+        # The instance a method is bound to, passed as "this"
+        self.receiver = receiver
+        # Frames of finished calls, ready for reuse, see `FramePool`. Bound
+        # methods share the list of the function they're bound from.
+        self.free_frames = [] if free_frames is None else free_frames
+        # Call counts for tiering, shared with bound copies like the free list
+        self.profile = CallProfile() if profile is None else profile
 
     def bind(self, instance):
-        environment = Environment(enclosing=self.closure)
-        environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.is_initializer)
+        return LoxFunction(self.declaration, self.upvalues, self.is_initializer, instance,
+                           self.free_frames, self.profile)
 
     def arity(self):
-        return len(self.declaration.params)
+        return self.param_count
 
-    def __call__(self, interpreter, arguments):
-        environment = Environment(enclosing=self.closure)
-        for param, arg in zip(self.declaration.params, arguments):
-            environment.define(param.lexeme, arg)
+    def __call__(self, interpreter, arguments, receiver=None):
+        """
+        Calls the function. A method call that never bound the method passes
+        the instance as `receiver`. A body that completes with a `TailCall`
+        has its function run next, in a loop here, instead of on top of this
+        call.
+        """
+        function = self
+        while True:
+            if receiver is None:
+                receiver = function.receiver
+            declaration = function.declaration
+            if isinstance(declaration.body, DeferredBody):
+                interpreter.runtime.compile_deferred(declaration)
+
+            profile = function.profile
+            profile.calls += 1
+            body = profile.body
+            if body is None:
+                threshold = interpreter.tiering.threshold
+                if threshold is not None and profile.calls + profile.back_edges >= threshold:
+                    body = interpreter.tiering.promote(function)
+
+            free_frames = function.free_frames
+            if free_frames:
+                environment = free_frames.pop()
+                interpreter.frames.reused += 1
+            else:
+                environment = interpreter.frames.allocate(declaration.frame_size,
+                                                          function.upvalues)
+
+            # The receiver, if any, and the parameters take the first slots of
+            # the function's frame
+            values = environment.values
+            if receiver is None:
+                values[:len(arguments)] = arguments
+            else:
+                values[0] = receiver
+                values[1:len(arguments) + 1] = arguments
 
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except Return as ret:
-            if self.is_initializer:
-                return self.closure.get_at(0, "this")
-            return ret.value
+            try:
+                if body:
+                    completion = body(environment)
+                else:
+                    if declaration.cells:
+                        for slot in declaration.cells:
+                            values[slot] = Cell(values[slot])
+                    # Loops in the body count towards this function's profile
+                    caller_profile = interpreter.profile
+                    interpreter.profile = profile
+                    try:
+                        completion = interpreter.execute_block(declaration.body, environment)
+                    finally:
+                        interpreter.profile = caller_profile
+            finally:
+                # Drop the call's values so the idle frame doesn't keep them alive
+                values[:] = [None] * len(values)
+                free_frames.append(environment)
 
-        if self.is_initializer:
-            return self.closure.get_at(0, "this")
+            if type(completion) is not TailCall:
+                if function.is_initializer:
+                    return receiver
+                return None if completion is NIL else completion
+            function, arguments, receiver = (completion.function, completion.arguments,
+                                             completion.receiver)
 
-        return None
+            # Compiled functions run their own loop
+            if type(function) is not LoxFunction:
+                return function(interpreter, arguments, receiver)
 
     def __str__(self):
         return f"<fn {self.declaration.name.lexeme}>"
@@ -1,12 +1,32 @@
 from src.exceptions import RuntimeException
 from src.lox_callable import LoxCallable
+from src.symbol_table import INIT
 
 
 class LoxClass(LoxCallable):
     def __init__(self, name, superclass, methods):
         self.name = name
         self.superclass = superclass
+        # Keyed by symbol id
         self.methods = methods
+        # Every method of the class, inherited ones included, flattened when
+        # the class is defined so that finding one costs the same however
+        # deep the class is
+        self.method_table = dict(superclass.method_table) if superclass else {}
+        self.method_table.update(methods)
+        self.cache_initializer()
+
+    def define_method(self, symbol, method):
+        """
+        Adds a method to a class that's still being defined.
+        """
+        self.methods[symbol] = method
+        self.method_table[symbol] = method
+        self.cache_initializer()
+
+    def cache_initializer(self):
+        self.initializer = self.method_table.get(INIT)
+        self.init_arity = 0 if self.initializer is None else self.initializer.arity()
 
     def __str__(self):
         return self.name
@@ -14,47 +34,69 @@ class LoxClass(LoxCallable):
     def __call__(self, interpreter, arguments):
         instance = LoxInstance(self)
 
-        # Look for an "init" method. If we find one, immediately bind
-        # and invoke it just like a normal method call
-        initializer = self.find_method("init")
-        if initializer:
-            initializer.bind(instance)(interpreter, arguments)
+        # If there's an "init" method, immediately invoke it on the instance,
+        # without binding it first
+        initializer = self.initializer
+        if initializer is not None:
+            initializer(interpreter, arguments, instance)
 
         return instance
 
     def arity(self):
-        initializer = self.find_method("init")
-        if initializer is None:
-            return 0
-        return initializer.arity()
+        return self.init_arity
 
-    def find_method(self, name):
-        if name in self.methods:
-            return self.methods[name]
-
-        if self.superclass:
-            return self.superclass.find_method(name)
-
-        return None
+    def find_method(self, symbol):
+        return self.method_table.get(symbol)
 
 
 class LoxInstance():
     def __init__(self, klass):
         self.klass = klass
+        # Keyed by symbol id
         self.fields = {}
 
     def __str__(self):
         return f"{self.klass.name} instance"
 
     def get(self, name):
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
+        if name.symbol in self.fields:
+            return self.fields[name.symbol]
 
-        method = self.klass.find_method(name.lexeme)
+        method = self.klass.find_method(name.symbol)
         if method is not None:
             return method.bind(self)
 
         raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
 
     def set(self, name, value):
-        self.fields[name.lexeme] = value
+        self.fields[name.symbol] = value
+
+
+class PropertyCache():
+    """
+    The inline cache of one property access site: the method each class seen
+    there resolves the name to, so that a repeated access is one dictionary
+    lookup guarded by the instance's class.
+
+    A class's methods never change once it's created, so entries stay valid
+    for good. The cache holds up to `LIMIT` classes; a site that sees more is
+    megamorphic and stops caching, looking every method up afresh.
+    """
+    __slots__ = ("methods", "hits", "misses")
+    LIMIT = 4
+
+    def __init__(self):
+        # The method, or None if there isn't one, by class
+        self.methods = {}
+        self.hits = 0
+        self.misses = 0
+
+    def find_method(self, klass, symbol):
+        """
+        Looks up a method after the cache missed, caching it if there's room.
+        """
+        self.misses += 1
+        method = klass.find_method(symbol)
+        if len(self.methods) < self.LIMIT:
+            self.methods[klass] = method
+        return method
@@ -1,11 +1,30 @@
+from src.symbol_table import symbols
 from src.token_type import TokenType
 
 class Token():
-    def __init__(self, _type, lexeme, literal, line):
+    # Tokens are created for every lexeme and many stay alive in the AST, so they
+    # carry no per-instance __dict__
+    __slots__ = ("type", "lexeme", "literal", "line", "symbol")
+
+    def __init__(self, _type, lexeme, literal, line, symbol=None):
         self.type = _type
         self.lexeme = lexeme
         self.literal = literal
         self.line = line
+        # Symbol table id of identifiers and keywords, None for other tokens
+        self.symbol = symbol
 
     def __str__(self):
         return f"{self.type} {self.lexeme} {self.literal}"
+
+    def __reduce__(self):
+        # Symbol ids are specific to this process, so unpickling re-interns the lexeme
+        return (unpickle_token, (self.type, self.lexeme, self.literal, self.line,
+                                 self.symbol is not None))
+
+
+def unpickle_token(_type, lexeme, literal, line, has_symbol):
+    if not has_symbol:
+        return Token(_type, lexeme, literal, line)
+    symbol = symbols.intern(lexeme)
+    return Token(_type, symbols.name(symbol), literal, line, symbol)
@@ -14,6 +14,7 @@ import pylox_ast.expr as Expr
 import pylox_ast.stmt as Stmt
 
 from src.lox_token import Token
+from src.token_buffer import TokenBuffer
 from src.token_type import TokenType as TT
 
 
@@ -21,6 +22,20 @@ class ParserException(Exception):
     pass
 
 
+class DeferredBody():
+    """
+    Stands in for the body of a function whose parsing was deferred. It holds
+    the body's tokens in a compact `TokenBuffer`, from the first token after
+    "{" up to and including the matching "}", followed by EOF. The resolver
+    fills in the function and class context the body has to be resolved in
+    once it's parsed.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.function_type = None
+        self.class_type = None
+
+
 class Parser():
     """
     EXPRESSION GRAMMAR
@@ -56,10 +71,18 @@ class Parser():
     primary        → NUMBER | STRING | "true" | "false" | "nil" | "this"
                    | "(" expression ")" | | "super" "." IDENTIFIER | IDENTIFIER
     """
-    def __init__(self, runtime, tokens):
+    def __init__(self, runtime, tokens, lazy=False):
         self.runtime = runtime
-        self.tokens = tokens
-        self.current = 0
+        # In lazy mode, bodies of top-level functions and methods are only
+        # brace-matched and their parsing is deferred until their first call
+        self.lazy = lazy
+        self.deferred = []
+        self.block_depth = 0
+        # Tokens are pulled on demand and only the current and previous ones are
+        # kept, so `tokens` can be a list or a lazy generator from the scanner
+        self.tokens = iter(tokens)
+        self.current_token = next(self.tokens)
+        self.previous_token = None
 
     def parse(self):
         """
@@ -249,15 +272,57 @@ class Parser():
         # Consume '{' before calling `block_statement()`. That's bc `block_statement()` assumes
         # the brace token has already been matched.
         self.consume(TT.LEFT_BRACE, "Expect '{' before " + kind + " body")
+
+        # Nested functions are always parsed with their enclosing body since
+        # they're resolved against its scopes
+        if self.lazy and self.block_depth == 0:
+            function = Stmt.Function(name, parameters, self.skip_body())
+            self.deferred.append(function)
+            return function
+
         body = self.block_statement()
         return Stmt.Function(name, parameters, body)
 
+    def skip_body(self):
+        """
+        Consumes tokens up to the "}" matching an already consumed "{" without
+        parsing them, and returns them as a `DeferredBody`.
+        """
+        # Pulls straight from the token stream rather than going through
+        # `advance()`, since this loop is all that lazy mode does per token
+        tokens = []
+        depth = 1
+        token = self.current_token
+        while token.type is not TT.EOF:
+            tokens.append(token)
+            if token.type is TT.LEFT_BRACE:
+                depth += 1
+            elif token.type is TT.RIGHT_BRACE:
+                depth -= 1
+                if depth == 0:
+                    self.previous_token = token
+                    self.current_token = next(self.tokens)
+                    tokens.append(Token(TT.EOF, "", None, token.line))
+                    # Bodies can wait a long time for their first call, if
+                    # it ever comes, so their tokens are kept packed
+                    return DeferredBody(TokenBuffer(tokens))
+            self.previous_token = token
+            token = next(self.tokens)
+
+        self.current_token = token
+        self.error(token, "Expect '}' after block.")
+
     def block_statement(self):
         """
+        block -> "{" declaration* "}"
         """
         statements = []
-        while ((not self.check(TT.RIGHT_BRACE)) and (not self.at_end())):
-            statements.append(self.declaration())
+        self.block_depth += 1
+        try:
+            while ((not self.check(TT.RIGHT_BRACE)) and (not self.at_end())):
+                statements.append(self.declaration())
+        finally:
+            self.block_depth -= 1
         self.consume(TT.RIGHT_BRACE, "Expect '}' after block.")
         return statements
 
@@ -390,6 +455,9 @@ class Parser():
                 arguments.append(self.expression())
 
         paren = self.consume(TT.RIGHT_PAREN, "Expect ')' after arguments.")
+        if type(callee) is Expr.Get:
+            # A method call, which engines can make without binding the method
+            return Expr.Invoke(callee.object_, callee.name, paren, arguments)
         return Expr.Call(callee, paren, arguments)
 
     def primary(self):
@@ -470,14 +538,15 @@ class Parser():
         Consumes the current token and returns it.
         """
         if not self.at_end():
-            self.current += 1
-        return self.previous()
+            self.previous_token = self.current_token
+            self.current_token = next(self.tokens)
+        return self.previous_token
 
     def at_end(self):
         return self.peek().type == TT.EOF
 
     def peek(self):
-        return self.tokens[self.current]
+        return self.current_token
 
     def previous(self):
-        return self.tokens[self.current - 1]
+        return self.previous_token
@@ -0,0 +1,124 @@
+import pylox_ast.expr as Expr
+
+from src.parser import Parser
+from src.token_type import TokenType as TT
+
+
+class PrattParser(Parser):
+    """
+    Parser whose expressions are parsed by precedence climbing over a table of
+    binding powers, instead of one method per grammar level. It produces the
+    same `Expr` trees and error messages as `Parser`.
+
+    The recursive-descent parser goes through eleven nested calls, each with its
+    own `match_types` scan, for every operand. Here an operand costs one call to
+    `parse_precedence` plus a dict lookup per operator, and each level of
+    parentheses adds two Python frames rather than eleven.
+    """
+    # Binding powers of the infix operators. Higher binds tighter.
+    ASSIGNMENT, OR, AND, EQUALITY, COMPARISON, TERM, FACTOR = range(1, 8)
+    binding_powers = {
+        TT.EQUAL: ASSIGNMENT,
+        TT.OR: OR,
+        TT.AND: AND,
+        TT.BANG_EQUAL: EQUALITY, TT.EQUAL_EQUAL: EQUALITY,
+        TT.GREATER: COMPARISON, TT.GREATER_EQUAL: COMPARISON,
+        TT.LESS: COMPARISON, TT.LESS_EQUAL: COMPARISON,
+        TT.MINUS: TERM, TT.PLUS: TERM,
+        TT.SLASH: FACTOR, TT.STAR: FACTOR,
+    }
+
+    literals = {TT.FALSE: False, TT.TRUE: True, TT.NIL: None}
+
+    def expression(self):
+        return self.parse_precedence(self.ASSIGNMENT)
+
+    def parse_precedence(self, min_power):
+        """
+        Parses an expression whose infix operators all bind at least as tightly
+        as `min_power`. Operators other than "=" are left-associative, so their
+        right operand only takes operators that bind strictly tighter.
+
+        Prefix operators and call/property suffixes are handled inline rather
+        than in their own methods to keep the Python stack shallow.
+        """
+        # unary -> ( "!" | "-" ) unary | call
+        operators = []
+        while self.current_token.type is TT.BANG or self.current_token.type is TT.MINUS:
+            operators.append(self.advance())
+
+        # call -> primary ( "(" arguments? ")" | "." IDENTIFIER )*
+        expr = self.primary()
+        while True:
+            token_type = self.current_token.type
+            if token_type is TT.LEFT_PAREN:
+                self.advance()
+                expr = self.finish_call(expr)
+            elif token_type is TT.DOT:
+                self.advance()
+                name = self.consume(TT.IDENTIFIER, "Expect property name after '.'.")
+                expr = Expr.Get(expr, name)
+            else:
+                break
+
+        for operator in reversed(operators):
+            expr = Expr.Unary(operator, expr)
+
+        binding_powers = self.binding_powers
+        while True:
+            power = binding_powers.get(self.current_token.type)
+            if power is None or power < min_power:
+                return expr
+
+            operator = self.advance()
+            if power == self.ASSIGNMENT:
+                return self.finish_assignment(expr, operator)
+
+            right = self.parse_precedence(power + 1)
+            if power <= self.AND:
+                expr = Expr.Logical(expr, operator, right)
+            else:
+                expr = Expr.Binary(expr, operator, right)
+
+    def finish_assignment(self, target, equals):
+        value = self.parse_precedence(self.ASSIGNMENT)
+
+        if isinstance(target, Expr.Variable):
+            return Expr.Assign(target.name, value)
+        elif isinstance(target, Expr.Get):
+            return Expr.Set(target.object_, target.name, value)
+        self.error(equals, "Invalid assignment target.")
+
+    def primary(self):
+        token = self.current_token
+        token_type = token.type
+
+        if token_type is TT.IDENTIFIER:
+            self.advance()
+            return Expr.Variable(token)
+
+        if token_type is TT.NUMBER or token_type is TT.STRING:
+            self.advance()
+            return Expr.Literal(token.literal)
+
+        if token_type in self.literals:
+            self.advance()
+            return Expr.Literal(self.literals[token_type])
+
+        if token_type is TT.THIS:
+            self.advance()
+            return Expr.This(token)
+
+        if token_type is TT.SUPER:
+            self.advance()
+            self.consume(TT.DOT, "Expect '.' after 'super'.")
+            method = self.consume(TT.IDENTIFIER, "Expect superclass method name.")
+            return Expr.Super(token, method)
+
+        if token_type is TT.LEFT_PAREN:
+            self.advance()
+            expr = self.parse_precedence(self.ASSIGNMENT)
+            self.consume(TT.RIGHT_PAREN, "Expect ')' after expression.")
+            return Expr.Grouping(expr)
+
+        self.error(token, "Expect expression.")
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+
+class ProgramCache():
+    """
+    On-disk cache of parsed and resolved programs, in the spirit of __pycache__.
+
+    Entries are keyed by a hash of the source together with the cache format
+    version, the Python version and the compile options, so an edited script,
+    an upgraded interpreter or different options simply miss. Each entry also
+    records its key and is written atomically; anything that fails to load is
+    deleted and treated as a miss. Hits refresh an entry's mtime and the
+    least recently used entries are evicted once the directory exceeds
+    `max_size` bytes.
+    """
+    # Bump whenever the AST or resolution format changes
+    VERSION = 11
+    SUFFIX = ".loxc"
+
+    def __init__(self, directory, max_size=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+
+    @classmethod
+    def for_script(cls, path, **kwargs):
+        """
+        Returns the cache kept in `__loxcache__` next to the script at `path`.
+        """
+        directory = os.path.join(os.path.dirname(os.path.abspath(path)), "__loxcache__")
+        return cls(directory, **kwargs)
+
+    def key(self, source, options):
+        digest = hashlib.sha256()
+        header = f"{self.VERSION}|{sys.version_info[0]}.{sys.version_info[1]}|{options}|"
+        digest.update(header.encode("utf-8"))
+        digest.update(source.encode("utf-8") if isinstance(source, str) else source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def load(self, key):
+        """
+        Returns the cached, resolved statements for `key`, or None.
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                cached_key, program = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self.discard(path)
+            return None
+
+        if cached_key != key:
+            self.discard(path)
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return program
+
+    def store(self, key, program):
+        """
+        Stores `program` under `key`. Failing to write the cache never affects
+        the run, so errors are ignored.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump((key, program), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self.path(key))
+            except BaseException:
+                self.discard(temp_path)
+                raise
+        except (OSError, pickle.PicklingError, RecursionError):
+            return
+
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in
+        `max_size`.
+        """
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(self.SUFFIX):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self.discard(path)
+            total -= size
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,112 @@
+"""
+Support code for the Python modules `PythonTranslator` generates.
+
+Generated modules import everything they use from here under names that
+start with an underscore, so they can't clash with translated Lox names.
+"""
+from functools import partial
+
+from src.environment import UNDEFINED, Cell, GlobalEnvironment
+from src.exceptions import RuntimeException
+from src.interpreter import Interpreter
+from src.lox_callable import LoxCallable, ClockCallable, checked_call
+from src.lox_class import LoxClass, LoxInstance
+from src.lox_token import Token
+from src.symbol_table import symbols
+
+__all__ = [
+    "UNDEFINED", "Cell", "LoxClass", "LoxInstance", "PyFunction", "RuntimeException",
+    "call", "error", "intern", "name", "run_standalone", "stringify", "undefined",
+]
+
+intern = symbols.intern
+stringify = Interpreter.stringify
+
+
+def name(lexeme, line):
+    """
+    Recreates a token for a name or operator, to report errors against.
+    """
+    symbol = symbols.intern(lexeme)
+    return Token(None, symbols.name(symbol), None, line, symbol)
+
+
+def error(token, message):
+    return RuntimeException(token, message)
+
+
+def undefined(token):
+    return GlobalEnvironment.undefined(token)
+
+
+def call(engine, callee, arguments, paren):
+    """
+    Calls anything callable from Lox, checking it like `Interpreter.visit_call`.
+    Generated code calls a `PyFunction` directly when the arity matches.
+    """
+    return checked_call(engine, callee, list(arguments), paren)
+
+
+class PyFunction(LoxCallable):
+    """
+    A Lox function translated to a Python function. `call` takes exactly the
+    Lox arguments: it's the Python function itself, or a partial binding the
+    receiver of a method. A deferred body is translated on the first call.
+    """
+    def __init__(self, name, arity, fn, upvalues=(), is_initializer=False, receiver=None,
+                 deferred=None):
+        self.name = name
+        self.params = arity
+        # The Python function, made by the body's factory from `upvalues`
+        self.fn = fn
+        self.upvalues = upvalues
+        self.is_initializer = is_initializer
+        self.receiver = receiver
+        # `(engine, declaration, is_method)` of a body that hasn't been
+        # translated yet
+        self.deferred = deferred
+        if fn is None:
+            self.call = self.translate_and_call
+        elif receiver is None:
+            self.call = fn
+        else:
+            self.call = partial(fn, receiver)
+
+    def translate_and_call(self, *arguments):
+        engine, declaration, is_method = self.deferred
+        factory = engine.factory(declaration, is_method, self.is_initializer)
+        self.fn = factory(*self.upvalues)
+        self.call = self.fn if self.receiver is None else partial(self.fn, self.receiver)
+        return self.call(*arguments)
+
+    def bind(self, instance):
+        return PyFunction(self.name, self.params, self.fn, self.upvalues, self.is_initializer,
+                          instance, self.deferred)
+
+    def arity(self):
+        return self.params
+
+    def __call__(self, interpreter, arguments, receiver=None):
+        if receiver is None:
+            return self.call(*arguments)
+        if self.fn is None:
+            return self.bind(receiver).call(*arguments)
+        return self.fn(receiver, *arguments)
+
+    def __str__(self):
+        return f"<fn {self.name}>"
+
+
+def run_standalone(module):
+    """
+    Runs a translated module on its own, with a fresh set of globals, the way
+    `python module.py` does for an emitted artifact.
+    """
+    table = GlobalEnvironment()
+    table.define(symbols.intern("clock"), ClockCallable())
+    table.reserve()
+    try:
+        module._run(None, table.values)
+    except RuntimeException as e:
+        print(f"{e.message}\n[line {e.token.line}]")
+        raise SystemExit(70)
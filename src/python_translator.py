@@ -0,0 +1,679 @@
+from pylox_ast.expr import (Binary, Call, ExprVisitor, Get, Grouping, Literal, Logical, Super,
+                            This, Unary, Variable)
+from pylox_ast.stmt import StmtVisitor
+from src.environment import CELL, LOCAL, UPVALUE, GlobalEnvironment
+from src.exceptions import RuntimeException
+from src.lox_callable import ClockCallable
+from src.parser import DeferredBody
+from src.symbol_table import INIT, symbols
+from src.token_type import TokenType as TT
+
+
+PRELUDE = '''\
+# Translated from Lox by PythonTranslator. Run it with the repository root on
+# the module search path.
+from src.python_runtime import (UNDEFINED as _U, Cell as _Cell, LoxClass as _LoxClass,
+    LoxInstance as _LoxInstance, PyFunction as _PyFunction, call as _call, error as _error,
+    intern as _intern, name as _name, run_standalone as _run_standalone,
+    stringify as _stringify, undefined as _undefined)
+'''
+
+EPILOGUE = '''
+def _run(engine, global_values):
+    global _engine, _g
+    _engine = engine
+    _g = global_values
+    _main()
+
+
+if __name__ == "__main__":
+    import sys
+    _run_standalone(sys.modules[__name__])
+'''
+
+# Python operators, by Lox token type
+OPERATORS = {
+    TT.GREATER: ">", TT.GREATER_EQUAL: ">=", TT.LESS: "<", TT.LESS_EQUAL: "<=",
+    TT.MINUS: "-", TT.SLASH: "/", TT.STAR: "*", TT.PLUS: "+",
+    TT.EQUAL_EQUAL: "==", TT.BANG_EQUAL: "!=",
+}
+COMPARISONS = {TT.GREATER, TT.GREATER_EQUAL, TT.LESS, TT.LESS_EQUAL}
+
+
+class Value():
+    """
+    A translated expression: Python code for its value, which statements
+    emitted before it have computed.
+    """
+    # What's statically known about the value's type
+    NUMBER = "number"
+    BOOL = "bool"
+
+    def __init__(self, code, atomic, kind=None):
+        self.code = code
+        # A constant or temporary. It can be used more than once, and later
+        # code can't change it, unlike a Lox variable or a compound expression.
+        self.atomic = atomic
+        self.kind = kind
+
+
+class FunctionContext():
+    """
+    The Python function being written: its lines, temporaries and the Lox
+    variable living in each frame slot.
+    """
+    def __init__(self, declaration, is_initializer):
+        self.declaration = declaration
+        self.is_initializer = is_initializer
+        self.lines = []
+        self.indent = 2 if declaration else 1
+        self.temps = 0
+        # The name of the variable currently in each slot, for readable
+        # Python names; a slot holds one variable at a time
+        self.names = {}
+
+
+def is_pure(expr):
+    """
+    Whether evaluating `expr` can't change a variable, so a variable read
+    before it doesn't have to be copied first.
+    """
+    match expr:
+        case Literal() | Variable() | This() | Super():
+            return True
+        case Grouping():
+            return is_pure(expr.expression)
+        case Unary():
+            return is_pure(expr.right)
+        case Binary() | Logical():
+            return is_pure(expr.left) and is_pure(expr.right)
+        case Get():
+            return is_pure(expr.object_)
+        case _:
+            return False
+
+
+class PythonTranslator(ExprVisitor, StmtVisitor):
+    """
+    Translates a resolved program into the source of a Python module, which
+    then runs in CPython's own eval loop.
+
+    Every Lox function becomes a Python function, created by a module-level
+    factory that takes the cells it captures, so each closure gets its own.
+    Locals become Python locals, and captured locals hold `Cell`s as in the
+    other engines. Lox expressions are flattened into statements over
+    temporaries, which keeps Lox's evaluation order and lets each type check
+    and runtime error be spelled out next to the operation that needs it.
+    Checks of values known to be numbers are left out.
+    """
+    def __init__(self, runtime, eager=False):
+        self.runtime = runtime
+        # Translate deferred bodies now instead of on the first call, for
+        # output that has to stand on its own
+        self.eager = eager
+        self.factories = []
+        self.constants = {}
+        self.symbols = {}
+        # Declarations of deferred bodies, indexed by the generated code
+        self.deferred = []
+        self.context = None
+
+    def translate(self, statements):
+        """
+        Returns the source of a module whose `_main` runs `statements`.
+        """
+        self.context = FunctionContext(None, False)
+        for statement in statements:
+            self.translate_statement(statement)
+        main = ["def _main():"] + (self.context.lines or ["    pass"])
+        return self.module(main)
+
+    def translate_factory(self, declaration, is_method, is_initializer):
+        """
+        Returns the source of a module defining the factory of a function
+        whose body was deferred, and the factory's name.
+        """
+        name = self.factory(declaration, is_method, is_initializer, deferred=True)
+        return self.module([]), name
+
+    def module(self, main):
+        lines = [PRELUDE]
+        lines += [f"{name} = _intern({lexeme!r})" for lexeme, name in self.symbols.items()]
+        lines += [f"{name} = _name({lexeme!r}, {line})"
+                  for (lexeme, line), name in self.constants.items()]
+        for factory in self.factories:
+            lines += ["", ""] + factory
+        if main:
+            lines += ["", ""] + main
+        lines.append(EPILOGUE)
+        return "\n".join(lines)
+
+    # Writing code
+
+    def emit(self, line):
+        self.context.lines.append("    " * self.context.indent + line)
+
+    def temp(self):
+        self.context.temps += 1
+        return f"t{self.context.temps}"
+
+    @staticmethod
+    def readable(lexeme):
+        """
+        Returns a suffix naming `lexeme` in generated identifiers. Lox allows
+        identifiers Python doesn't, and Python folds some non-ASCII ones
+        together, so names are told apart by their numbers and only ASCII
+        lexemes are kept to make the output easier to read.
+        """
+        return f"_{lexeme}" if lexeme.isascii() else ""
+
+    def symbol(self, lexeme):
+        name = self.symbols.get(lexeme)
+        if name is None:
+            name = self.symbols[lexeme] = f"_s{len(self.symbols)}{self.readable(lexeme)}"
+        return name
+
+    def token(self, token):
+        """
+        Returns the name of a module constant holding `token`, to report
+        runtime errors against.
+        """
+        key = (token.lexeme, token.line)
+        name = self.constants.get(key)
+        if name is None:
+            name = self.constants[key] = f"_k{len(self.constants)}"
+        return name
+
+    def local(self, slot):
+        return f"v{slot}{self.readable(self.context.names[slot])}"
+
+    def cell(self, slot):
+        return f"c{slot}{self.readable(self.context.names[slot])}"
+
+    def atom(self, value):
+        """
+        Makes `value` cheap to use more than once in code that runs right
+        away, storing it in a temporary unless it's one already or a local.
+        """
+        if value.code.isidentifier():
+            return value
+        return self.snapshot(value)
+
+    def snapshot(self, value):
+        """
+        Stores `value` in a temporary unless it's already atomic.
+        """
+        if value.atomic:
+            return value
+        temp = self.temp()
+        self.emit(f"{temp} = {value.code}")
+        return Value(temp, True, value.kind)
+
+    def evaluate(self, exprs):
+        """
+        Translates `exprs` in order. A value that a later expression could
+        change is copied to a temporary first.
+        """
+        values = []
+        for index, expr in enumerate(exprs):
+            value = self.translate_expression(expr)
+            if not all(is_pure(later) for later in exprs[index + 1:]):
+                value = self.snapshot(value)
+            values.append(value)
+        return values
+
+    def truthy(self, value):
+        if value.kind is Value.BOOL:
+            return value.code
+        if value.code == "None":
+            return "False"
+        if value.atomic and not value.code.isidentifier():
+            # Any other constant is a number or a string, which is true. An
+            # `is` test on it would make CPython warn about the literal.
+            return "True"
+        return f"({value.code} is not None and {value.code} is not False)"
+
+    def translate_statement(self, stmt):
+        stmt.accept(self)
+
+    def translate_expression(self, expr):
+        return expr.accept(self)
+
+    def nested(self, translate):
+        """
+        Runs `translate`, which emits code, one level deeper, and returns the
+        lines it emitted instead of keeping them.
+        """
+        lines = self.context.lines
+        self.context.lines = []
+        self.context.indent += 1
+        try:
+            translate()
+            return self.context.lines
+        finally:
+            self.context.indent -= 1
+            self.context.lines = lines
+
+    def block(self, translate):
+        """
+        Emits the indented body of a compound statement.
+        """
+        lines = self.nested(translate)
+        self.context.lines.extend(lines or ["    " * (self.context.indent + 1) + "pass"])
+
+    # Variables
+
+    def declare(self, slot, lexeme):
+        self.context.names[slot] = lexeme
+
+    def load(self, name, expr):
+        access = expr.access
+        if access is LOCAL:
+            return Value(self.local(expr.slot), False)
+        if access is CELL:
+            return Value(f"{self.cell(expr.slot)}.value", False)
+        if access is UPVALUE:
+            return Value(f"u{expr.slot}.value", False)
+
+        temp = self.temp()
+        self.emit(f"{temp} = _g[{self.symbol(name.lexeme)}]")
+        self.emit(f"if {temp} is _U: raise _undefined({self.token(name)})")
+        return Value(temp, True)
+
+    def define(self, declaration, code):
+        """
+        Emits the definition of the variable declared by `declaration`, like
+        `Interpreter.define`.
+        """
+        if declaration.slot is None:
+            self.emit(f"_g[{self.symbol(declaration.name.lexeme)}] = {code}")
+            return
+        self.declare(declaration.slot, declaration.name.lexeme)
+        if declaration.captured:
+            self.emit(f"{self.cell(declaration.slot)} = _Cell({code})")
+        else:
+            self.emit(f"{self.local(declaration.slot)} = {code}")
+
+    def initialize(self, declaration, code):
+        if declaration.captured:
+            self.emit(f"{self.cell(declaration.slot)}.value = {code}")
+        else:
+            self.define(declaration, code)
+
+    # Functions
+
+    def factory(self, declaration, is_method, is_initializer, deferred=False):
+        """
+        Writes the factory of `declaration`'s Python function and returns its
+        name. The factory takes the function's upvalues.
+        """
+        suffix = self.readable(declaration.name.lexeme)
+        name = f"_fn{len(self.factories)}{suffix}"
+        enclosing = self.context
+        self.context = context = FunctionContext(declaration, is_initializer)
+
+        params = []
+        slots = list(range(len(declaration.params) + (1 if is_method else 0)))
+        lexemes = (["this"] if is_method else []) + [param.lexeme for param in declaration.params]
+        for slot, param in zip(slots, lexemes):
+            self.declare(slot, param)
+            if slot in declaration.cells:
+                params.append(f"p{slot}")
+                self.emit(f"{self.cell(slot)} = _Cell(p{slot})")
+            else:
+                params.append(self.local(slot))
+
+        for statement in declaration.body:
+            self.translate_statement(statement)
+        if is_initializer:
+            self.emit(f"return {self.receiver().code}")
+
+        upvalues = [f"u{index}" for index in range(len(declaration.upvalues))]
+        if deferred:
+            # A deferred method is handed the "super" cell before its body is
+            # resolved, and may turn out not to use it
+            upvalues.append("*_")
+        upvalues = ", ".join(upvalues)
+        self.factories.append(
+            [f"def {name}({upvalues}):",
+             f"    def lox{suffix}({', '.join(params)}):"]
+            + (context.lines or ["        pass"])
+            + [f"    return lox{suffix}"])
+        self.context = enclosing
+        return name
+
+    def receiver(self):
+        if 0 in self.context.declaration.cells:
+            return Value(f"{self.cell(0)}.value", False)
+        return Value(self.local(0), False)
+
+    def function(self, declaration, is_method=False, is_initializer=False):
+        """
+        Returns code that creates a closure over `declaration` here.
+        """
+        cells = [self.cell(index) if is_local else f"u{index}"
+                 for is_local, index in declaration.upvalues]
+        arguments = f"{declaration.name.lexeme!r}, {len(declaration.params)}"
+
+        if isinstance(declaration.body, DeferredBody) and self.eager:
+            self.runtime.compile_function(declaration)
+        if isinstance(declaration.body, DeferredBody):
+            self.deferred.append(declaration)
+            upvalues = "(" + "".join(f"{cell}, " for cell in cells) + ")"
+            deferred = f"(_engine, _d[{len(self.deferred) - 1}], {is_method})"
+            return (f"_PyFunction({arguments}, None, {upvalues}, {is_initializer}, None, "
+                    f"{deferred})")
+
+        factory = self.factory(declaration, is_method, is_initializer)
+        return f"_PyFunction({arguments}, {factory}({', '.join(cells)}), (), {is_initializer})"
+
+    # Statements
+
+    def visit_block(self, stmt):
+        for statement in stmt.statements:
+            self.translate_statement(statement)
+
+    def visit_class(self, stmt):
+        superclass = "None"
+        if stmt.superclass:
+            value = self.atom(self.translate_expression(stmt.superclass))
+            superclass = value.code
+            self.emit(f"if not isinstance({superclass}, _LoxClass): "
+                      f"raise _error({self.token(stmt.superclass.name)}, "
+                      f"'Superclass must be a class')")
+
+        self.define(stmt, "None")
+
+        if stmt.superclass:
+            # Methods capture the superclass as "super" from a cell
+            self.declare(stmt.super_slot, "super")
+            self.emit(f"{self.cell(stmt.super_slot)} = _Cell({superclass})")
+
+        methods = self.temp()
+        self.emit(f"{methods} = {{}}")
+        for method in stmt.methods:
+            is_initializer = method.name.symbol == INIT
+            function = self.function(method, True, is_initializer)
+            self.emit(f"{methods}[{self.symbol(method.name.lexeme)}] = {function}")
+
+        self.initialize(stmt, f"_LoxClass({stmt.name.lexeme!r}, {superclass}, {methods})")
+
+    def visit_expression(self, stmt):
+        # Whatever is left of the value has no effect
+        self.translate_expression(stmt.expression)
+
+    def visit_function(self, stmt):
+        if stmt.captured:
+            # Declared before the closure is created, so that a recursive
+            # local function can capture itself
+            self.define(stmt, "None")
+        elif stmt.slot is not None:
+            self.declare(stmt.slot, stmt.name.lexeme)
+        self.initialize(stmt, self.function(stmt))
+
+    def visit_if(self, stmt):
+        condition = self.translate_expression(stmt.condition)
+        self.emit(f"if {self.truthy(condition)}:")
+        self.block(lambda: self.translate_statement(stmt.then_branch))
+        if stmt.else_branch is not None:
+            self.emit("else:")
+            self.block(lambda: self.translate_statement(stmt.else_branch))
+
+    def visit_print(self, stmt):
+        value = self.translate_expression(stmt.expression)
+        self.emit(f"print(_stringify({value.code}))")
+
+    def visit_return(self, stmt):
+        if self.context.is_initializer:
+            self.emit(f"return {self.receiver().code}")
+        elif stmt.value is None:
+            self.emit("return None")
+        else:
+            self.emit(f"return {self.translate_expression(stmt.value).code}")
+
+    def visit_var(self, stmt):
+        value = "None"
+        if stmt.initializer is not None:
+            value = self.translate_expression(stmt.initializer).code
+        self.define(stmt, value)
+
+    def visit_while(self, stmt):
+        condition = None
+        def translate_condition():
+            nonlocal condition
+            condition = self.translate_expression(stmt.condition)
+        lines = self.nested(translate_condition)
+
+        if not lines:
+            self.emit(f"while {self.truthy(condition)}:")
+            self.block(lambda: self.translate_statement(stmt.body))
+            return
+
+        # The condition needs statements of its own, run before each test
+        def translate_body():
+            self.context.lines.extend(lines)
+            self.emit(f"if not {self.truthy(condition)}: break")
+            self.translate_statement(stmt.body)
+        self.emit("while True:")
+        self.block(translate_body)
+
+    # Expressions
+
+    def visit_assign(self, expr):
+        value = self.translate_expression(expr.value)
+        access = expr.access
+        if access is LOCAL:
+            target = self.local(expr.slot)
+        elif access is CELL:
+            target = f"{self.cell(expr.slot)}.value"
+        elif access is UPVALUE:
+            target = f"u{expr.slot}.value"
+        else:
+            symbol = self.symbol(expr.name.lexeme)
+            target = f"_g[{symbol}]"
+            value = self.atom(value)
+            self.emit(f"if {target} is _U: raise _undefined({self.token(expr.name)})")
+        self.emit(f"{target} = {value.code}")
+        return Value(target, False, value.kind) if not value.atomic else value
+
+    def visit_binary(self, expr):
+        left, right = self.evaluate([expr.left, expr.right])
+        operator = expr.operator
+        op = OPERATORS[operator.type]
+
+        if operator.type in (TT.EQUAL_EQUAL, TT.BANG_EQUAL):
+            return Value(f"({left.code} {op} {right.code})", False, Value.BOOL)
+
+        if left.kind is not Value.NUMBER:
+            left = self.atom(left)
+        if right.kind is not Value.NUMBER:
+            right = self.atom(right)
+        a, b = left.code, right.code
+        token = self.token(operator)
+
+        if operator.type == TT.PLUS:
+            if left.kind is Value.NUMBER and right.kind is Value.NUMBER:
+                return Value(f"({a} + {b})", False, Value.NUMBER)
+            message = "'Operands must be two numbers or two string'"
+            if left.kind is Value.NUMBER or right.kind is Value.NUMBER:
+                other = b if left.kind is Value.NUMBER else a
+                self.emit(f"if type({other}) is not float: raise _error({token}, {message})")
+                return Value(f"({a} + {b})", False, Value.NUMBER)
+            self.emit(f"if not (type({a}) is type({b}) and (type({a}) is float or "
+                      f"type({a}) is str)): raise _error({token}, {message})")
+            return Value(f"({a} + {b})", False)
+
+        checks = [f"type({value.code}) is not float" for value in (left, right)
+                  if value.kind is not Value.NUMBER]
+        if checks:
+            self.emit(f"if {' or '.join(checks)}: "
+                      f"raise _error({token}, 'Operands must be numbers.')")
+        if operator.type == TT.SLASH:
+            right = self.atom(right)
+            b = right.code
+            self.emit(f"if {b} == 0.0: raise _error({token}, 'Cannot divide by zero.')")
+
+        kind = Value.BOOL if operator.type in COMPARISONS else Value.NUMBER
+        return Value(f"({a} {op} {b})", False, kind)
+
+    def visit_call(self, expr):
+        callee, *arguments = self.evaluate([expr.callee] + expr.arguments)
+        callee = self.atom(callee)
+        arguments = [argument.code for argument in arguments]
+        result = self.temp()
+
+        self.emit(f"if type({callee.code}) is _PyFunction and "
+                  f"{callee.code}.params == {len(arguments)}:")
+        self.emit(f"    {result} = {callee.code}.call({', '.join(arguments)})")
+        self.emit("else:")
+        packed = "(" + "".join(f"{argument}, " for argument in arguments) + ")"
+        self.emit(f"    {result} = _call(_engine, {callee.code}, {packed}, "
+                  f"{self.token(expr.paren)})")
+        return Value(result, True)
+
+    def visit_get(self, expr):
+        instance = self.atom(self.translate_expression(expr.object_)).code
+        name = self.token(expr.name)
+        result = self.temp()
+        self.emit(f"if type({instance}) is not _LoxInstance: "
+                  f"raise _error({name}, 'Only instances have properties.')")
+        self.emit(f"{result} = {instance}.fields.get({self.symbol(expr.name.lexeme)}, _U)")
+        self.emit(f"if {result} is _U: {result} = {instance}.get({name})")
+        return Value(result, True)
+
+    def visit_grouping(self, expr):
+        return self.translate_expression(expr.expression)
+
+    def visit_invoke(self, expr):
+        instance = self.translate_expression(expr.object_)
+        # The arguments are evaluated after the lookup, and may change the object
+        if all(is_pure(argument) for argument in expr.arguments):
+            instance = self.atom(instance).code
+        else:
+            instance = self.snapshot(instance).code
+        name = self.token(expr.name)
+        symbol = self.symbol(expr.name.lexeme)
+        callee, receiver = self.temp(), self.temp()
+        self.emit(f"if type({instance}) is not _LoxInstance: "
+                  f"raise _error({name}, 'Only instances have properties.')")
+        self.emit(f"{callee} = {instance}.fields.get({symbol}, _U)")
+        self.emit(f"if {callee} is _U:")
+        self.emit(f"    {callee} = {instance}.klass.method_table.get({symbol})")
+        self.emit(f"    if {callee} is None: {instance}.get({name})")
+        self.emit(f"    {receiver} = {instance}")
+        self.emit("else:")
+        self.emit(f"    {receiver} = None")
+
+        arguments = [value.code for value in self.evaluate(expr.arguments)]
+        result = self.temp()
+        # A translated method is called with the instance as its first argument
+        self.emit(f"if {receiver} is not None and {callee}.fn is not None and "
+                  f"{callee}.params == {len(arguments)}:")
+        self.emit(f"    {result} = {callee}.fn({', '.join([receiver] + arguments)})")
+        self.emit("else:")
+        self.emit(f"    if {receiver} is not None: {callee} = {callee}.bind({receiver})")
+        packed = "(" + "".join(f"{argument}, " for argument in arguments) + ")"
+        self.emit(f"    {result} = _call(_engine, {callee}, {packed}, {self.token(expr.paren)})")
+        return Value(result, True)
+
+    def visit_literal(self, expr):
+        match expr.value:
+            case float():
+                return Value(repr(expr.value), True, Value.NUMBER)
+            case bool():
+                return Value(repr(expr.value), True, Value.BOOL)
+            case _:
+                return Value(repr(expr.value), True)
+
+    def visit_logical(self, expr):
+        left = self.translate_expression(expr.left)
+        result = self.temp()
+        self.emit(f"{result} = {left.code}")
+        test = self.truthy(Value(result, True, left.kind))
+        if expr.operator.type == TT.OR:
+            test = f"not {test}"
+        self.emit(f"if {test}:")
+        def translate_right():
+            right = self.translate_expression(expr.right)
+            self.emit(f"{result} = {right.code}")
+        self.block(translate_right)
+        return Value(result, True)
+
+    def visit_set(self, expr):
+        instance = self.translate_expression(expr.object_)
+        # The value is evaluated after the check, and may change the object
+        instance = self.atom(instance) if is_pure(expr.value) else self.snapshot(instance)
+        name = self.token(expr.name)
+        self.emit(f"if type({instance.code}) is not _LoxInstance: "
+                  f"raise _error({name}, 'Only instances have fields.')")
+        value = self.atom(self.translate_expression(expr.value))
+        self.emit(f"{instance.code}.fields[{self.symbol(expr.name.lexeme)}] = {value.code}")
+        return value
+
+    def visit_super(self, expr):
+        superclass = self.atom(self.load(expr.keyword, expr))
+        this = self.atom(self.load(expr.keyword, expr.this))
+        result = self.temp()
+        self.emit(f"{result} = {superclass.code}.find_method({self.symbol(expr.method.lexeme)})")
+        self.emit(f"if {result} is None: raise _error({self.token(expr.method)}, "
+                  f"{'Undefined property ' + repr(expr.method.lexeme) + '.'!r})")
+        self.emit(f"{result} = {result}.bind({this.code})")
+        return Value(result, True)
+
+    def visit_this(self, expr):
+        return self.load(expr.keyword, expr)
+
+    def visit_unary(self, expr):
+        right = self.atom(self.translate_expression(expr.right))
+        if expr.operator.type == TT.MINUS:
+            if right.kind is not Value.NUMBER:
+                self.emit(f"if type({right.code}) is not float: "
+                          f"raise _error({self.token(expr.operator)}, 'Operand must be a number.')")
+            return Value(f"(-{right.code})", False, Value.NUMBER)
+
+        return Value(f"(not {self.truthy(right)})", False, Value.BOOL)
+
+    def visit_variable(self, expr):
+        return self.load(expr.name, expr)
+
+
+class PythonEngine():
+    """
+    Runs programs by translating them to Python with `PythonTranslator` and
+    executing the resulting module. Deferred bodies are translated on their
+    first call, each into a small module of its own.
+    """
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.globals = GlobalEnvironment()
+        self.globals.define(symbols.intern("clock"), ClockCallable())
+        # Factories of deferred bodies, by declaration
+        self.factories = {}
+
+    def interpret(self, statements):
+        self.globals.reserve()
+        try:
+            translator = PythonTranslator(self.runtime)
+            namespace = self.load(translator.translate(statements), translator)
+            namespace["_main"]()
+        except RuntimeException as error:
+            self.runtime.runtime_error(error)
+
+    def load(self, source, translator):
+        namespace = {"__name__": "__lox__"}
+        exec(compile(source, "<lox>", "exec"), namespace)
+        namespace.update(_engine=self, _g=self.globals.values, _d=translator.deferred)
+        return namespace
+
+    def factory(self, declaration, is_method, is_initializer):
+        """
+        Returns the factory of a deferred body, translating it on first use.
+        """
+        factory = self.factories.get(declaration)
+        if factory is None:
+            if isinstance(declaration.body, DeferredBody):
+                self.runtime.compile_deferred(declaration)
+            translator = PythonTranslator(self.runtime)
+            source, name = translator.translate_factory(declaration, is_method, is_initializer)
+            factory = self.factories[declaration] = self.load(source, translator)[name]
+        return factory
@@ -0,0 +1,196 @@
+import re
+
+from src.lox_token import Token
+from src.scanner import Scanner
+from src.symbol_table import symbols
+from src.token_type import TokenType as TT
+
+
+class RegexScanner():
+    """
+    Scanner engine that matches whole lexemes at once with a single compiled
+    master pattern instead of pulling the source through `advance()` one
+    character at a time.
+
+    It produces the same tokens, line numbers and error messages as `Scanner`.
+    The fast path only understands ASCII. Whenever a lexeme touches a non-ASCII
+    character, the surrounding run of word characters is handed to `Scanner`,
+    so Unicode identifiers and digits follow the exact same `isalpha()` /
+    `isnumeric()` rules.
+    """
+    # Leading blanks are folded into every match so most tokens cost a single
+    # regex step. The groups are ordered by how often they occur in practice.
+    pattern = re.compile(r"""[ \t\r]*(?:
+          (?P<IDENTIFIER>[A-Za-z][A-Za-z0-9]*)
+        | (?P<OPERATOR>[!=<>]=?|[(){},.\-+;*]|/(?!/))
+        | (?P<NEWLINE>\n+)
+        | (?P<NUMBER>[0-9]+(?:\.[0-9]+)?)
+        | (?P<STRING>"[^"]*")
+        | (?P<COMMENT>//[^\n]*)
+        | (?P<UNTERMINATED>"[^"]*)
+        | (?P<OTHER>.)
+        | \Z
+    )""", re.VERBOSE | re.DOTALL)
+    IDENTIFIER, OPERATOR, NEWLINE, NUMBER, STRING, COMMENT, UNTERMINATED, OTHER = range(1, 9)
+
+    # Maximal run of characters that may belong to an identifier or number
+    unicode_run = re.compile(r"[A-Za-z0-9.\u0080-\U0010FFFF]*")
+
+    # Maps each operator to its type and a shared lexeme string
+    operators = {text: (token_type, text) for text, token_type in {
+        "(": TT.LEFT_PAREN, ")": TT.RIGHT_PAREN, "{": TT.LEFT_BRACE, "}": TT.RIGHT_BRACE,
+        ",": TT.COMMA, ".": TT.DOT, "-": TT.MINUS, "+": TT.PLUS, ";": TT.SEMICOLON,
+        "/": TT.SLASH, "*": TT.STAR, "!": TT.BANG, "!=": TT.BANG_EQUAL, "=": TT.EQUAL,
+        "==": TT.EQUAL_EQUAL, ">": TT.GREATER, ">=": TT.GREATER_EQUAL, "<": TT.LESS,
+        "<=": TT.LESS_EQUAL
+    }.items()}
+
+    # Buffers are decoded and scanned in chunks of roughly this many bytes
+    chunk_size = 1 << 20
+
+    def __init__(self, runtime, source):
+        self.runtime = runtime
+        # Either a str, or a bytes-like buffer of UTF-8 (e.g. a memory-mapped file)
+        self.source = source
+        self.tokens = []
+        self.line = 1
+        # Offset of a string literal cut off by the end of a chunk
+        self.cut_off = None
+
+    def scan_tokens(self):
+        self.tokens = list(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self):
+        """
+        Yields tokens lazily as they are scanned, ending with EOF.
+        """
+        if isinstance(self.source, str):
+            yield from self.scan_text(self.source, final=True)
+        else:
+            yield from self.scan_buffer(self.source)
+
+        yield Token(TT.EOF, "", None, self.line)
+
+    def scan_buffer(self, buffer):
+        """
+        Scans a UTF-8 buffer a chunk at a time so only one decoded chunk is held
+        in memory. Chunks end just after a newline, which no token other than a
+        string literal can span, and never splits a multi-byte character.
+        """
+        size = len(buffer)
+        start = 0
+        min_end = 0
+        while start < size:
+            end = buffer.find(b"\n", max(start + self.chunk_size, min_end))
+            end = size if end == -1 else end + 1
+            text = str(buffer[start:end], "utf-8")
+
+            resume = yield from self.scan_text(text, final=(end == size))
+            if resume is None:
+                start = end
+                continue
+
+            # A string literal runs past the end of this chunk. Restart at its
+            # opening quote with a chunk that reaches past the closing one.
+            start += len(text[:resume].encode("utf-8"))
+            close = buffer.find(b'"', start + 1)
+            min_end = size if close == -1 else close
+
+    def scan_text(self, source, final):
+        """
+        Scans `source`, restarting the master pattern after each lexeme that needs
+        the Unicode slow path. If `final` is false and a string literal reaches the
+        end of `source`, stops and returns the offset of its opening quote without
+        consuming it.
+        """
+        self.cut_off = None
+        pos = 0
+        while pos is not None:
+            pos = yield from self.scan_from(source, pos, final)
+        return self.cut_off
+
+    def scan_from(self, source, pos, final):
+        """
+        Scans from `pos` until the end of `source`, or until a lexeme needs the
+        Unicode slow path. Returns the offset to resume from, or None once the
+        whole source has been consumed or a string was cut off (see `cut_off`).
+        """
+        keywords = Scanner.keywords
+        operators = self.operators
+        symbol_ids = symbols.ids
+        symbol_names = symbols.names
+        check_unicode = not source.isascii()
+        line = self.line
+
+        for m in self.pattern.finditer(source, pos):
+            kind = m.lastindex
+            if kind == self.IDENTIFIER:
+                if check_unicode and self.touches_unicode(source, m.end()):
+                    self.line = line
+                    return (yield from self.scan_unicode_run(source, m.start(kind)))
+                text = m.group(kind)
+                symbol = symbol_ids.get(text)
+                if symbol is None:
+                    symbol = symbols.intern(text)
+                text = symbol_names[symbol]
+                yield Token(keywords.get(text, TT.IDENTIFIER), text, None, line, symbol)
+            elif kind == self.OPERATOR:
+                token_type, text = operators[m.group(kind)]
+                yield Token(token_type, text, None, line)
+            elif kind == self.NEWLINE:
+                line += m.end() - m.start(kind)
+            elif kind == self.NUMBER:
+                if check_unicode and self.touches_unicode(source, m.end()):
+                    self.line = line
+                    return (yield from self.scan_unicode_run(source, m.start(kind)))
+                text = m.group(kind)
+                yield Token(TT.NUMBER, text, float(text), line)
+            elif kind == self.STRING:
+                text = m.group(kind)
+                line += text.count("\n")
+                yield Token(TT.STRING, text, text[1:-1], line)
+            elif kind == self.UNTERMINATED:
+                if not final:
+                    self.line = line
+                    self.cut_off = m.start(kind)
+                    return None
+                line += m.group(kind).count("\n")
+                self.runtime.error(line, "Unterminated string.")
+            elif kind == self.OTHER:
+                c = m.group(kind)
+                if c > "\x7f":
+                    self.line = line
+                    return (yield from self.scan_unicode_run(source, m.start(kind)))
+                self.runtime.error(line, f"Unexpected character: {c}.")
+
+        self.line = line
+        return None
+
+    @staticmethod
+    def touches_unicode(source, end):
+        """
+        True if the ASCII lexeme ending at `end` could continue past it under the
+        character scanner's Unicode rules (e.g. `café`, or `1.` followed by a
+        non-ASCII digit).
+        """
+        if end >= len(source):
+            return False
+        c = source[end]
+        if c > "\x7f":
+            return True
+        return c == "." and end + 1 < len(source) and source[end + 1] > "\x7f"
+
+    def scan_unicode_run(self, source, pos):
+        """
+        Scans the run of word characters starting at `pos` with the character
+        scanner and returns the offset just past it. The run never contains
+        whitespace, quotes or operators other than ".", so it always begins
+        and ends on a token boundary.
+        """
+        end = self.unicode_run.match(source, pos).end()
+        scanner = Scanner(self.runtime, source[pos:end])
+        scanner.line = self.line
+        # Drop the sub-scanner's EOF token
+        yield from scanner.scan_tokens()[:-1]
+        return end
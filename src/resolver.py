@@ -1,7 +1,10 @@
 from enum import Enum, auto
 
-from pylox_ast.expr import ExprVisitor
-from pylox_ast.stmt import StmtVisitor
+from pylox_ast.expr import Binary, Call, ExprVisitor, Invoke, Logical, This
+from pylox_ast.stmt import Function, StmtVisitor
+from src.environment import Access
+from src.parser import DeferredBody
+from src.symbol_table import INIT, SUPER, THIS
 
 
 class FunctionType(Enum):
@@ -17,12 +20,69 @@ class ClassType(Enum):
     SUBCLASS = auto()
 
 
+class Local():
+    """
+    A variable declared in a local scope.
+    """
+    def __init__(self, slot, declaration):
+        self.slot = slot
+        # The statement that defines the variable at runtime, if any
+        self.declaration = declaration
+        self.defined = False
+        # Whether a function nested inside the variable's own function uses it
+        self.captured = False
+        # Expressions in the variable's own frame that read or assign it
+        self.references = []
+
+
+class Frame():
+    """
+    The runtime frame of a function call, or of top-level code that needs
+    locals. Every scope nested in it, other than functions, shares it.
+    """
+    def __init__(self, enclosing):
+        # The frame the function is declared in
+        self.enclosing = enclosing
+        # Slots are handed out like a stack: a scope's locals are freed when
+        # it ends, so sibling blocks reuse the same slots
+        self.top = 0
+        self.size = 0
+        # `(is_local, index)` for each variable the function captures, in the
+        # order it first refers to them, and the index given to each `Local`
+        self.upvalues = []
+        self.upvalue_indexes = {}
+
+
+class Scope():
+    """
+    A block, function or class scope being resolved.
+    """
+    def __init__(self, enclosing, node=None):
+        self.enclosing = enclosing
+        # The `Block`, `Function` or `Class` the scope belongs to
+        self.node = node
+        self.locals = {}
+        # Functions and top-level scopes get a frame of their own
+        self.owns_frame = isinstance(node, Function) or enclosing is None
+        if self.owns_frame:
+            self.frame = Frame(enclosing.frame if enclosing else None)
+        else:
+            self.frame = enclosing.frame
+        self.start = self.frame.top
+
+
 class Resolver(ExprVisitor, StmtVisitor):
+    """
+    Resolves every local variable to a slot in a flat, per-call frame. Blocks
+    share the frame of the function around them, and a variable a closure
+    captures lives in a `Cell` that the closure holds on to directly, like
+    upvalues in clox. A closure therefore keeps alive only the variables it
+    uses, not the frames they were declared in.
+    """
     def __init__(self, interpreter, runtime):
         self.interpreter = interpreter
         self.runtime = runtime
-        # Each element in the stack is a dict representing a single block scope.
-        # Keys are variable names, values are bools.
+        # Stack of the `Scope`s enclosing the code being resolved
         self.scopes = []
         self.current_function = FunctionType.NONE
         self.current_class = ClassType.NONE
@@ -36,11 +96,28 @@ class Resolver(ExprVisitor, StmtVisitor):
                 x.accept(self)
 
     def resolve_function(self, function, ftype):
+        if isinstance(function.body, DeferredBody):
+            # Deferred bodies belong to top-level declarations, so the function
+            # and class context is all that's needed to resolve them later
+            function.body.function_type = ftype
+            function.body.class_type = self.current_class
+            # The closure is created before the body is resolved. The only
+            # variable a top-level method can capture is "super", so it's
+            # captured up front, as the upvalue `resolve_deferred` will give it
+            if self.current_class is ClassType.SUBCLASS:
+                local = self.scopes[-1].locals[SUPER]
+                local.captured = True
+                function.upvalues = ((True, local.slot),)
+            return
+
         # Keep track of whether we're inside a function declaration
         cached_ftype = self.current_function
         self.current_function = ftype
 
-        self.begin_scope()
+        self.begin_scope(function)
+        if ftype is FunctionType.METHOD or ftype is FunctionType.INITIALIZER:
+            # A method's receiver is always in slot 0 of its frame
+            self.declare_binding(THIS)
         for param in function.params:
             self.declare(param)
             self.define(param)
@@ -49,33 +126,134 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.end_scope()
         self.current_function = cached_ftype
 
-    def begin_scope(self):
-        self.scopes.append({})
+    def resolve_deferred(self, function, deferred):
+        """
+        Resolves a deferred function whose body has just been parsed, recreating
+        the scope a top-level method's "super" is declared in.
+        """
+        self.current_class = deferred.class_type
+        if deferred.class_type is ClassType.SUBCLASS:
+            self.begin_scope()
+            self.declare_binding(SUPER)
+
+        self.resolve_function(function, deferred.function_type)
 
-    def end_scope(self):
-        self.scopes.pop()
+        if deferred.class_type is ClassType.SUBCLASS:
+            self.end_scope()
+
+    def begin_scope(self, node=None):
+        enclosing = self.scopes[-1] if self.scopes else None
+        self.scopes.append(Scope(enclosing, node))
 
-    def declare(self, name):
+    def end_scope(self):
+        """
+        Pops the innermost scope. All references to its locals have been seen
+        by now, so it's known which ones closures capture.
+        """
+        scope = self.scopes.pop()
+        frame = scope.frame
+
+        for local in scope.locals.values():
+            access = Access.CELL if local.captured else Access.LOCAL
+            for expr in local.references:
+                expr.access = access
+            if local.declaration is not None:
+                local.declaration.captured = local.captured
+
+        if scope.owns_frame:
+            if isinstance(scope.node, Function):
+                function = scope.node
+                function.frame_size = frame.size
+                function.upvalues = tuple(frame.upvalues)
+                # Parameters and "this" that closures capture are boxed on entry
+                function.cells = tuple(local.slot for local in scope.locals.values()
+                                       if local.captured and local.declaration is None)
+            elif scope.node is not None:
+                scope.node.frame_size = frame.size
+        else:
+            # Free the scope's slots
+            frame.top = scope.start
+            if scope.node is not None:
+                scope.node.frame_size = None
+
+    def declare(self, name, declaration=None):
+        """
+        Adds `name` to the innermost scope, in the next free slot of its frame.
+        `declaration` is the statement that defines the variable at runtime,
+        and gets told the slot.
+        """
         if self.scopes:
-            if name.lexeme in self.scopes[-1]:
+            scope = self.scopes[-1]
+            local = scope.locals.get(name.symbol)
+            if local is not None:
                 self.runtime.error(name, "Already a variable with this name in this scope.")
-            self.scopes[-1][name.lexeme] = False
+                local.defined = False
+            else:
+                local = self.add_local(scope, name.symbol, declaration)
+            if declaration is not None:
+                declaration.slot = local.slot
 
     def define(self, name):
         if self.scopes:
-            self.scopes[-1][name.lexeme] = True
+            self.scopes[-1].locals[name.symbol].defined = True
 
-    def resolve_local(self, expr, name):
-        for i, scope in enumerate(reversed(self.scopes)):
-            if name.lexeme in scope:
-                self.interpreter.resolve(expr, i)
-                return
+    def declare_binding(self, symbol):
+        """
+        Declares "this" or "super" in the innermost scope.
+        """
+        local = self.add_local(self.scopes[-1], symbol, None)
+        local.defined = True
+        return local
+
+    @staticmethod
+    def add_local(scope, symbol, declaration):
+        frame = scope.frame
+        local = Local(frame.top, declaration)
+        scope.locals[symbol] = local
+        frame.top += 1
+        frame.size = max(frame.size, frame.top)
+        return local
+
+    def resolve_local(self, expr, symbol):
+        for scope in reversed(self.scopes):
+            local = scope.locals.get(symbol)
+            if local is not None:
+                break
+        else:
+            # Not found, so it must be a global
+            return
+
+        frame = self.scopes[-1].frame
+        if frame is scope.frame:
+            expr.slot = local.slot
+            local.references.append(expr)
+        else:
+            local.captured = True
+            expr.access = Access.UPVALUE
+            expr.slot = self.resolve_upvalue(frame, local, scope.frame)
+
+    def resolve_upvalue(self, frame, local, owner):
+        """
+        Returns the index of `local`, declared in the frame `owner`, among the
+        upvalues of `frame`. The functions in between capture it too, so each
+        closure can copy the cell from the one it's created in.
+        """
+        index = frame.upvalue_indexes.get(local)
+        if index is None:
+            if frame.enclosing is owner:
+                upvalue = (True, local.slot)
+            else:
+                upvalue = (False, self.resolve_upvalue(frame.enclosing, local, owner))
+            index = len(frame.upvalues)
+            frame.upvalues.append(upvalue)
+            frame.upvalue_indexes[local] = index
+        return index
 
     def visit_block(self, block):
         """
         A block statement introduces a new scope for the statements it contains
         """
-        self.begin_scope()
+        self.begin_scope(block)
         self.resolve(block.statements)
         self.end_scope()
 
@@ -83,31 +261,26 @@ class Resolver(ExprVisitor, StmtVisitor):
         cached_ctype = self.current_class
         self.current_class = ClassType.CLASS
 
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         self.define(stmt.name)
 
         if stmt.superclass:
-            if stmt.name.lexeme == stmt.superclass.name.lexeme:
+            if stmt.name.symbol == stmt.superclass.name.symbol:
                 self.runtime.error(stmt.superclass.name, "A class can't inherit from itself.")
 
             self.current_class = ClassType.SUBCLASS
             self.resolve(stmt.superclass)
 
         if stmt.superclass:
-            self.begin_scope()
-            self.scopes[-1]["super"] = True
-
-        self.begin_scope()
-        self.scopes[-1]["this"] = True
+            self.begin_scope(stmt)
+            stmt.super_slot = self.declare_binding(SUPER).slot
 
         for method in stmt.methods:
             declaration = FunctionType.METHOD
-            if method.name.lexeme == "init":
+            if method.name.symbol == INIT:
                 declaration = FunctionType.INITIALIZER
             self.resolve_function(method, declaration)
 
-        self.end_scope()
-
         if stmt.superclass:
             self.end_scope()
 
@@ -117,7 +290,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolve(stmt.expression)
 
     def visit_function(self, stmt):
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         self.define(stmt.name)
 
         self.resolve_function(stmt, FunctionType.FUNCTION)
@@ -137,10 +310,12 @@ class Resolver(ExprVisitor, StmtVisitor):
         if stmt.value is not None:
             if self.current_function is FunctionType.INITIALIZER:
                 self.runtime.error(stmt.keyword, "Can't return a value from an initializer")
+            elif isinstance(stmt.value, (Call, Invoke)):
+                stmt.value.tail = True
             self.resolve(stmt.value)
 
     def visit_var(self, var):
-        self.declare(var.name)
+        self.declare(var.name, var)
         if var.initializer:
             self.resolve(var.initializer)
         self.define(var.name)
@@ -150,17 +325,31 @@ class Resolver(ExprVisitor, StmtVisitor):
         self.resolve(stmt.body)
 
     def visit_variable(self, expr):
-        if self.scopes and (self.scopes[-1].get(expr.name.lexeme, None) is False):
+        local = self.scopes[-1].locals.get(expr.name.symbol) if self.scopes else None
+        if local is not None and not local.defined:
             self.runtime.error(expr.name, "Can't read local variable in its own initializer")
-        self.resolve_local(expr, expr.name)
+        self.resolve_local(expr, expr.name.symbol)
 
     def visit_assign(self, expr):
         self.resolve(expr.value)
-        self.resolve_local(expr, expr.name)
+        self.resolve_local(expr, expr.name.symbol)
 
     def visit_binary(self, expr):
-        self.resolve(expr.left)
-        self.resolve(expr.right)
+        self.resolve_chain(expr)
+
+    def resolve_chain(self, expr):
+        """
+        Resolves a chain of binary and logical operators like `a + b + c`,
+        which nests to the left, walking down its left operands in a loop so
+        a long generated chain doesn't recurse once per operator.
+        """
+        rights = []
+        while type(expr) is Binary or type(expr) is Logical:
+            rights.append(expr.right)
+            expr = expr.left
+        self.resolve(expr)
+        for right in reversed(rights):
+            self.resolve(right)
 
     def visit_call(self, expr):
         self.resolve(expr.callee)
@@ -170,6 +359,11 @@ class Resolver(ExprVisitor, StmtVisitor):
     def visit_get(self, expr):
         self.resolve(expr.object_)
 
+    def visit_invoke(self, expr):
+        self.resolve(expr.object_)
+        for arg in expr.arguments:
+            self.resolve(arg)
+
     def visit_grouping(self, expr):
         self.resolve(expr.expression)
 
@@ -177,8 +371,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         return None
 
     def visit_logical(self, expr):
-        self.resolve(expr.left)
-        self.resolve(expr.right)
+        self.resolve_chain(expr)
 
     def visit_set(self, expr):
         self.resolve(expr.value)
@@ -189,14 +382,17 @@ class Resolver(ExprVisitor, StmtVisitor):
             self.runtime.error(expr.keyword, "Can't user 'super' outside of a class.")
         elif self.current_class != ClassType.SUBCLASS:
             self.runtime.error(expr.keyword, "Can't user 'super' in a class with no superclass.")
-        self.resolve_local(expr, expr.keyword)
+        self.resolve_local(expr, SUPER)
+        # The method is looked up on the superclass but bound to "this"
+        expr.this = This(expr.keyword)
+        self.resolve_local(expr.this, THIS)
 
     def visit_this(self, expr):
         if self.current_class is ClassType.NONE:
             self.runtime.error(expr.keyword, "Can't use 'this' outside of a class.")
             return None
 
-        self.resolve_local(expr, expr.keyword)
+        self.resolve_local(expr, THIS)
 
     def visit_unary(self, expr):
         self.resolve(expr.right)
@@ -1,4 +1,5 @@
 from src.lox_token import Token
+from src.symbol_table import symbols
 from src.token_type import TokenType as TT
 
 class Scanner():
@@ -10,6 +11,10 @@ class Scanner():
     }
     def __init__(self, runtime, source):
         self.runtime = runtime
+        # This engine indexes characters directly, so buffers (e.g. a memory-mapped
+        # file) are decoded up front
+        if not isinstance(source, str):
+            source = str(source, "utf-8")
         self.source = source
         self.tokens = []
         self.start = 0
@@ -17,12 +22,21 @@ class Scanner():
         self.line = 1
 
     def scan_tokens(self):
+        self.tokens = list(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self):
+        """
+        Yields tokens lazily as they are scanned, ending with EOF.
+        """
         while not self.at_end():
             self.start = self.current
             self.scan_token()
+            if self.tokens:
+                yield from self.tokens
+                self.tokens.clear()
 
-        self.tokens.append(Token(TT.EOF, "", None, self.line))
-        return self.tokens
+        yield Token(TT.EOF, "", None, self.line)
 
     def scan_token(self):
         c = self.advance()
@@ -114,11 +128,14 @@ class Scanner():
         while (self.peek()).isalnum():
             self.advance()
 
-        text = self.source[self.start:self.current]
+        # Identifiers repeat a lot, so every occurrence shares one interned lexeme
+        # and symbol id
+        symbol = symbols.intern(self.source[self.start:self.current])
+        text = symbols.name(symbol)
         token_type = Scanner.keywords.get(text)
         if token_type is None:
             token_type = TT.IDENTIFIER
-        return self.add_token(token_type)
+        self.tokens.append(Token(token_type, text, None, self.line, symbol))
 
     def advance(self):
         # Consumes the current character in the source file and returns it
@@ -0,0 +1,433 @@
+import pylox_ast.expr as Expr
+import pylox_ast.stmt as Stmt
+from src.completion import NIL
+from src.environment import CELL, LOCAL, UNDEFINED, UPVALUE, Cell
+from src.exceptions import RuntimeException
+from src.interpreter import Interpreter
+from src.lox_callable import LoxFunction, checked_call
+from src.lox_class import LoxClass, LoxInstance
+from src.parser import DeferredBody
+from src.token_type import TokenType as TT
+
+# How deep call-free code handed to the recursive `Interpreter` may nest
+MAX_NESTING = 100
+
+
+class StackInterpreter(Interpreter):
+    """
+    A tree-walking engine that keeps Lox calls off the Python stack.
+
+    The `Interpreter` runs a Lox call as a nest of Python calls, so a deeply
+    recursive Lox program runs into Python's recursion limit. Here the work
+    left to do is a stack of `(step, argument)` tasks on the heap, and values
+    being computed wait on a value stack. A call pushes its body's statements
+    as tasks instead of recursing, and a `return` drops whatever tasks its
+    call had left. Recursion is then limited only by `max_stack`, the number
+    of tasks and values the two stacks may hold, past which a call fails with
+    "Stack overflow.".
+
+    Statements and expressions without calls that nest no deeper than
+    `MAX_NESTING` are run by the `Interpreter` as they are, which keeps the
+    explicit stack for the paths that lead to calls and for long operator
+    chains.
+    """
+    def __init__(self, runtime):
+        super().__init__(runtime)
+        self.max_stack = runtime.max_stack
+        # The step that starts on each kind of node with calls in it
+        self.steps = {kind: getattr(self, "step_" + kind.__name__.lower())
+                      for kind in (Expr.Assign, Expr.Binary, Expr.Call, Expr.Get, Expr.Grouping,
+                                   Expr.Invoke, Expr.Logical, Expr.Set, Expr.Unary, Stmt.Block,
+                                   Stmt.Expression, Stmt.If, Stmt.Print, Stmt.Return, Stmt.Var,
+                                   Stmt.While)}
+        self.tasks = []
+        self.stack = []
+        # `(tasks, values, environment, function, receiver, frame)` of each
+        # running call: the heights of the stacks and the environment to go
+        # back to, what was called, and the frame it runs in
+        self.calls = []
+
+    def interpret(self, statements):
+        self.globals.reserve()
+        self.tasks, self.stack, self.calls = [], [], []
+        self.environment = self.globals
+        try:
+            self.schedule_block(statements)
+            self.run()
+        except RuntimeException as error:
+            self.runtime.runtime_error(error)
+
+    def run(self):
+        tasks = self.tasks
+        while tasks:
+            step, argument = tasks.pop()
+            step(argument)
+
+    def is_stepped(self, node):
+        """
+        Whether `node` has to run step by step, since it has a call in it,
+        outside any function it declares, or nests deeper than `MAX_NESTING`.
+        Worked out once per node and kept in its `stepped` field.
+        """
+        if type(node) not in self.steps:
+            return False
+        if node.stepped is None:
+            self.mark(node)
+        return node.stepped
+
+    def mark(self, root):
+        """
+        Fills in `stepped` for `root` and the nodes under it, children first,
+        with a loop instead of recursion so that deep trees can be marked.
+        """
+        steps = self.steps
+        heights = {}
+        pending = [(root, False)]
+        while pending:
+            node, visited = pending.pop()
+            children = [child for child in self.children(node) if type(child) in steps]
+            if not visited:
+                pending.append((node, True))
+                pending.extend((child, False) for child in children
+                               if child.stepped is None)
+                continue
+            # A child marked before its parent has an unknown height, which
+            # counts as too deep
+            height = 1 + max((heights.get(child, MAX_NESTING) for child in children),
+                             default=0)
+            heights[node] = height
+            node.stepped = (isinstance(node, (Expr.Call, Expr.Invoke)) or height > MAX_NESTING
+                            or any(child.stepped for child in children))
+
+    @staticmethod
+    def children(node):
+        for field in type(node).__slots__:
+            value = getattr(node, field)
+            if isinstance(value, list):
+                yield from value
+            elif isinstance(value, (Expr.Expr, Stmt.Stmt)):
+                yield value
+
+    # Scheduling
+
+    def schedule(self, expr):
+        """
+        Pushes the task that evaluates `expr` onto the value stack.
+        """
+        if self.is_stepped(expr):
+            self.tasks.append((self.steps[type(expr)], expr))
+        else:
+            self.tasks.append((self.evaluate_now, expr))
+
+    def schedule_statement(self, stmt):
+        if self.is_stepped(stmt):
+            self.tasks.append((self.steps[type(stmt)], stmt))
+        else:
+            self.tasks.append((self.execute_now, stmt))
+
+    def schedule_block(self, statements):
+        for statement in reversed(statements):
+            self.schedule_statement(statement)
+
+    def evaluate_now(self, expr):
+        self.stack.append(expr.accept(self))
+
+    def execute_now(self, stmt):
+        completion = stmt.accept(self)
+        if completion is not None:
+            self.finish_call(None if completion is NIL else completion)
+
+    def discard(self, _):
+        self.stack.pop()
+
+    def restore_environment(self, environment):
+        self.environment = environment
+
+    # Calls
+
+    def call(self, callee, arguments, receiver, expr):
+        """
+        Starts a call: a Lox function's body is pushed as tasks, and anything
+        else is called right away.
+        """
+        if type(callee) is LoxClass:
+            if len(arguments) != callee.init_arity:
+                raise RuntimeException(expr.paren,
+                        f"Expected {callee.init_arity} arguments but got {len(arguments)}.")
+            instance = LoxInstance(callee)
+            if callee.initializer is None:
+                self.stack.append(instance)
+            else:
+                self.enter(callee.initializer, arguments, instance, expr)
+        elif isinstance(callee, LoxFunction):
+            if len(arguments) != callee.param_count:
+                raise RuntimeException(expr.paren,
+                        f"Expected {callee.param_count} arguments but got {len(arguments)}.")
+            if expr.tail and self.calls:
+                # The returning call's frame is done with, so the callee
+                # takes its place instead of going on top
+                self.leave()
+            self.enter(callee, arguments, receiver, expr)
+        else:
+            self.stack.append(checked_call(self, callee, arguments, expr.paren))
+
+    def enter(self, function, arguments, receiver, expr):
+        tasks = self.tasks
+        if len(tasks) + len(self.stack) >= self.max_stack:
+            raise RuntimeException(expr.paren, "Stack overflow.")
+
+        declaration = function.declaration
+        if isinstance(declaration.body, DeferredBody):
+            self.runtime.compile_deferred(declaration)
+        if receiver is None:
+            receiver = function.receiver
+
+        free_frames = function.free_frames
+        if free_frames:
+            frame = free_frames.pop()
+            self.frames.reused += 1
+        else:
+            frame = self.frames.allocate(declaration.frame_size, function.upvalues)
+        values = frame.values
+        if receiver is None:
+            values[:len(arguments)] = arguments
+        else:
+            values[0] = receiver
+            values[1:len(arguments) + 1] = arguments
+        for slot in declaration.cells:
+            values[slot] = Cell(values[slot])
+
+        self.calls.append((len(tasks), len(self.stack), self.environment, function, receiver,
+                           frame))
+        self.environment = frame
+        tasks.append((self.finish_call, None))
+        self.schedule_block(declaration.body)
+
+    def leave(self):
+        """
+        Ends the running call, dropping the tasks and values it left. Returns
+        its function and receiver.
+        """
+        tasks, values, environment, function, receiver, frame = self.calls.pop()
+        del self.tasks[tasks:]
+        del self.stack[values:]
+        self.environment = environment
+        frame.values[:] = [None] * len(frame.values)
+        function.free_frames.append(frame)
+        return function, receiver
+
+    def finish_call(self, value):
+        function, receiver = self.leave()
+        self.stack.append(receiver if function.is_initializer else value)
+
+    # Statements with calls in them
+
+    def step_block(self, stmt):
+        if stmt.frame_size is not None:
+            # Only top-level blocks have a frame of their own
+            self.tasks.append((self.restore_environment, self.environment))
+            self.environment = self.frames.allocate(stmt.frame_size)
+        self.schedule_block(stmt.statements)
+
+    def step_expression(self, stmt):
+        self.tasks.append((self.discard, None))
+        self.schedule(stmt.expression)
+
+    def step_if(self, stmt):
+        self.tasks.append((self.choose_branch, stmt))
+        self.schedule(stmt.condition)
+
+    def choose_branch(self, stmt):
+        if self.is_truthy(self.stack.pop()):
+            self.schedule_statement(stmt.then_branch)
+        elif stmt.else_branch:
+            self.schedule_statement(stmt.else_branch)
+
+    def step_print(self, stmt):
+        self.tasks.append((self.print_value, None))
+        self.schedule(stmt.expression)
+
+    def print_value(self, _):
+        print(self.stringify(self.stack.pop()))
+
+    def step_return(self, stmt):
+        self.tasks.append((self.return_value, None))
+        self.schedule(stmt.value)
+
+    def return_value(self, _):
+        self.finish_call(self.stack.pop())
+
+    def step_var(self, stmt):
+        self.tasks.append((self.define_value, stmt))
+        self.schedule(stmt.initializer)
+
+    def define_value(self, stmt):
+        self.define(stmt, self.stack.pop())
+
+    def step_while(self, stmt):
+        self.tasks.append((self.loop, stmt))
+        self.schedule(stmt.condition)
+
+    def loop(self, stmt):
+        if self.is_truthy(self.stack.pop()):
+            self.tasks.append((self.step_while, stmt))
+            self.schedule_statement(stmt.body)
+
+    # Expressions with calls in them
+
+    def step_assign(self, expr):
+        self.tasks.append((self.assign_value, expr))
+        self.schedule(expr.value)
+
+    def assign_value(self, expr):
+        value = self.stack[-1]
+        access = expr.access
+        if access is LOCAL:
+            self.environment.values[expr.slot] = value
+        elif access is CELL:
+            self.environment.values[expr.slot].value = value
+        elif access is UPVALUE:
+            self.environment.upvalues[expr.slot].value = value
+        else:
+            values = self.globals.values
+            if values[expr.name.symbol] is UNDEFINED:
+                raise self.globals.undefined(expr.name)
+            values[expr.name.symbol] = value
+
+    def step_binary(self, expr):
+        self.tasks.append((self.apply_binary, expr))
+        self.schedule(expr.right)
+        self.schedule(expr.left)
+
+    def apply_binary(self, expr):
+        stack = self.stack
+        right = stack.pop()
+        left = stack.pop()
+        operator = expr.operator
+        match operator.type:
+            case TT.BANG_EQUAL:
+                result = not self.is_equal(left, right)
+            case TT.EQUAL_EQUAL:
+                result = self.is_equal(left, right)
+            case TT.PLUS:
+                match left, right:
+                    case (float(), float()) | (str(), str()):
+                        result = left + right
+                    case _:
+                        msg = "Operands must be two numbers or two string"
+                        raise RuntimeException(operator, msg)
+            case kind:
+                self.check_number_operands(operator, left, right)
+                match kind:
+                    case TT.GREATER: result = left > right
+                    case TT.GREATER_EQUAL: result = left >= right
+                    case TT.LESS: result = left < right
+                    case TT.LESS_EQUAL: result = left <= right
+                    case TT.MINUS: result = left - right
+                    case TT.STAR: result = left * right
+                    case TT.SLASH:
+                        self.check_zero_divisor(operator, right)
+                        result = left / right
+        stack.append(result)
+
+    def step_call(self, expr):
+        self.tasks.append((self.apply_call, expr))
+        for argument in reversed(expr.arguments):
+            self.schedule(argument)
+        self.schedule(expr.callee)
+
+    def apply_call(self, expr):
+        stack = self.stack
+        count = len(expr.arguments)
+        arguments = stack[len(stack) - count:]
+        del stack[len(stack) - count:]
+        self.call(stack.pop(), arguments, None, expr)
+
+    def step_get(self, expr):
+        self.tasks.append((self.get_property, expr))
+        self.schedule(expr.object_)
+
+    def get_property(self, expr):
+        lox_object = self.stack.pop()
+        if not isinstance(lox_object, LoxInstance):
+            raise RuntimeException(expr.name, "Only instances have properties.")
+        self.stack.append(lox_object.get(expr.name))
+
+    def step_grouping(self, expr):
+        self.schedule(expr.expression)
+
+    def step_invoke(self, expr):
+        self.tasks.append((self.find_method, expr))
+        self.schedule(expr.object_)
+
+    def find_method(self, expr):
+        """
+        Looks up an invoked method before its arguments are evaluated, like
+        `Interpreter.visit_invoke`. The callee goes on the value stack with
+        the instance, or None for a callable held in a field.
+        """
+        stack = self.stack
+        lox_object = stack.pop()
+        if not isinstance(lox_object, LoxInstance):
+            raise RuntimeException(expr.name, "Only instances have properties.")
+        symbol = expr.name.symbol
+        if symbol in lox_object.fields:
+            stack.append(lox_object.fields[symbol])
+            stack.append(None)
+        else:
+            method = lox_object.klass.find_method(symbol)
+            if method is None:
+                # Reports the undefined property
+                lox_object.get(expr.name)
+            stack.append(method)
+            stack.append(lox_object)
+
+        self.tasks.append((self.apply_invoke, expr))
+        for argument in reversed(expr.arguments):
+            self.schedule(argument)
+
+    def apply_invoke(self, expr):
+        stack = self.stack
+        count = len(expr.arguments)
+        arguments = stack[len(stack) - count:]
+        del stack[len(stack) - count:]
+        receiver = stack.pop()
+        self.call(stack.pop(), arguments, receiver, expr)
+
+    def step_logical(self, expr):
+        self.tasks.append((self.short_circuit, expr))
+        self.schedule(expr.left)
+
+    def short_circuit(self, expr):
+        left = self.stack[-1]
+        if (expr.operator.type == TT.OR) != self.is_truthy(left):
+            self.stack.pop()
+            self.schedule(expr.right)
+
+    def step_set(self, expr):
+        self.tasks.append((self.set_property, expr))
+        self.schedule(expr.value)
+        self.tasks.append((self.check_instance, expr))
+        self.schedule(expr.object_)
+
+    def check_instance(self, expr):
+        if not isinstance(self.stack[-1], LoxInstance):
+            raise RuntimeException(expr.name, "Only instances have fields.")
+
+    def set_property(self, expr):
+        value = self.stack.pop()
+        lox_object = self.stack.pop()
+        lox_object.set(expr.name, value)
+        self.stack.append(value)
+
+    def step_unary(self, expr):
+        self.tasks.append((self.apply_unary, expr))
+        self.schedule(expr.right)
+
+    def apply_unary(self, expr):
+        right = self.stack.pop()
+        if expr.operator.type == TT.MINUS:
+            self.check_number_operand(expr.operator, right)
+            self.stack.append(-right)
+        else:
+            self.stack.append(not self.is_truthy(right))
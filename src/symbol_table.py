@@ -0,0 +1,41 @@
+import sys
+
+
+class SymbolTable():
+    """
+    Assigns each distinct identifier a small integer id.
+
+    The scanners intern every identifier as they see it, so the resolver,
+    environments, instance fields and method tables can key on ints instead of
+    re-hashing and comparing lexeme strings. The table is shared by the whole
+    process since interpreter globals outlive a single `Lox.run`.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """
+        Returns the id for `name`, assigning the next free one if it's new.
+        """
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = len(self.names)
+            name = sys.intern(name)
+            self.names.append(name)
+            self.ids[name] = symbol
+        return symbol
+
+    def name(self, symbol):
+        return self.names[symbol]
+
+
+symbols = SymbolTable()
+
+# Names the runtime refers to directly
+THIS = symbols.intern("this")
+SUPER = symbols.intern("super")
+INIT = symbols.intern("init")
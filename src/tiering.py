@@ -0,0 +1,92 @@
+import sys
+import time
+
+
+class CallProfile():
+    """
+    How hot a tree-walked function is: its calls and the loop iterations run
+    in its body. Bound copies of a method share the profile of the function
+    they're bound from. `body` is the compiled body once `Tiering` promotes
+    the function, and False if it never will.
+    """
+    __slots__ = ("calls", "back_edges", "body")
+
+    def __init__(self):
+        self.calls = 0
+        self.back_edges = 0
+        self.body = None
+
+
+class Promotion():
+    """
+    A record of a function `Tiering` moved to the compiled tier, or failed to.
+    """
+    def __init__(self, declaration, profile, elapsed, error=None):
+        self.name = declaration.name.lexeme
+        self.line = declaration.name.line
+        self.calls = profile.calls
+        self.back_edges = profile.back_edges
+        # Seconds since the interpreter started
+        self.elapsed = elapsed
+        # Why compilation failed, for a function left to the tree-walker
+        self.error = error
+
+    def __str__(self):
+        what = "promoted" if self.error is None else f"kept ({self.error})"
+        return (f"[tier] {what} {self.name} (line {self.line}) after {self.calls} calls, "
+                f"{self.back_edges} back-edges, at {self.elapsed:.3f}s")
+
+
+class Tiering():
+    """
+    Moves hot functions of the tree-walking `Interpreter` to a faster tier.
+
+    Every function starts out tree-walked, which costs nothing up front. Once
+    its calls plus loop back-edges reach `threshold`, its next call compiles
+    the body with the `ClosureCompiler` and runs that from then on. The
+    compiled body uses the same frames, cells and globals as the tree-walker,
+    so the two tiers can call each other freely. If the body can't be
+    compiled, the function stays with the tree-walker for good.
+    """
+    def __init__(self, interpreter, threshold, trace=False):
+        self.interpreter = interpreter
+        # None turns promotion off
+        self.threshold = threshold
+        # Whether promotions are printed to stderr as they happen
+        self.trace = trace
+        self.promotions = []
+        self.started = time.perf_counter()
+        self._compiler = None
+
+    @property
+    def compiler(self):
+        if self._compiler is None:
+            # Imported here, since the closure compiler builds on the interpreter
+            from src.closure_compiler import ClosureCompiler
+            self._compiler = ClosureCompiler(self.interpreter.runtime)
+            # Compiled code shares the interpreter's state, and passes the
+            # interpreter to the functions it calls
+            self._compiler.globals = self.interpreter.globals
+            self._compiler.frames = self.interpreter.frames
+            self._compiler.interpreter = self.interpreter
+        return self._compiler
+
+    def promote(self, function):
+        """
+        Compiles the body of a hot `LoxFunction`. Returns the body, or False
+        if it has to stay tree-walked.
+        """
+        profile = function.profile
+        try:
+            profile.body = self.compiler.function_body(function.declaration)
+            error = None
+        except RecursionError:
+            profile.body = False
+            error = "too deeply nested to compile"
+
+        promotion = Promotion(function.declaration, profile,
+                              time.perf_counter() - self.started, error)
+        self.promotions.append(promotion)
+        if self.trace:
+            print(promotion, file=sys.stderr)
+        return profile.body
@@ -0,0 +1,95 @@
+from array import array
+
+from src.lox_token import Token
+from src.symbol_table import symbols
+from src.token_type import TokenType
+
+
+class TokenBuffer():
+    """
+    Compact, struct-of-arrays storage for a token stream.
+
+    Instead of one `Token` object per lexeme, the buffer keeps parallel arrays of
+    type codes, lexeme ids and line numbers. Lexemes live once each in a shared
+    table, and literals are stored sparsely since only numbers and strings have
+    one. `Token` objects are only materialized when an entry is read.
+    """
+    token_types = {token_type.value: token_type for token_type in TokenType}
+
+    def __init__(self, tokens=()):
+        self.types = array("B")
+        self.lexeme_ids = array("I")
+        self.lines = array("I")
+        self.lexemes = []
+        self.lexeme_index = {}
+        # Symbol id for each lexeme; only identifiers and keywords have one
+        self.lexeme_symbols = []
+        # Token index -> literal, for the tokens that have one
+        self.literals = {}
+        self.extend(tokens)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        lexeme_id = self.lexeme_ids[index]
+        return Token(self.token_types[self.types[index]],
+                     self.lexemes[lexeme_id],
+                     self.literals.get(index),
+                     self.lines[index],
+                     self.lexeme_symbols[lexeme_id])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getstate__(self):
+        # Symbol ids are specific to this process, so only whether a lexeme has
+        # one is pickled and unpickling re-interns it, as `Token` does
+        state = self.__dict__.copy()
+        state["lexeme_symbols"] = [symbol is not None for symbol in self.lexeme_symbols]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lexeme_symbols = [symbols.intern(lexeme) if has_symbol else None
+                               for lexeme, has_symbol in zip(self.lexemes, self.lexeme_symbols)]
+
+    def append(self, token):
+        lexeme_id = self.lexeme_index.get(token.lexeme)
+        if lexeme_id is None:
+            lexeme_id = len(self.lexemes)
+            self.lexemes.append(token.lexeme)
+            self.lexeme_symbols.append(token.symbol)
+            self.lexeme_index[token.lexeme] = lexeme_id
+
+        if token.literal is not None:
+            self.literals[len(self.types)] = token.literal
+        self.types.append(token.type.value)
+        self.lexeme_ids.append(lexeme_id)
+        self.lines.append(token.line)
+
+    def extend(self, tokens):
+        # `append` inlined with its lookups hoisted, since lazy parsing packs
+        # every token of a deferred body through here
+        lexeme_index = self.lexeme_index
+        lexemes = self.lexemes
+        lexeme_symbols = self.lexeme_symbols
+        literals = self.literals
+        types, lexeme_ids, lines = self.types, self.lexeme_ids, self.lines
+        for token in tokens:
+            lexeme = token.lexeme
+            lexeme_id = lexeme_index.get(lexeme)
+            if lexeme_id is None:
+                lexeme_id = lexeme_index[lexeme] = len(lexemes)
+                lexemes.append(lexeme)
+                lexeme_symbols.append(token.symbol)
+            if token.literal is not None:
+                literals[len(types)] = token.literal
+            types.append(token.type.value)
+            lexeme_ids.append(lexeme_id)
+            lines.append(token.line)
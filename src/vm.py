@@ -0,0 +1,511 @@
+from src.bytecode_compiler import BytecodeCompiler
+from src.chunk import OpCode
+from src.environment import UNDEFINED, Cell, GlobalEnvironment
+from src.exceptions import RuntimeException
+from src.interpreter import Interpreter
+from src.lox_callable import LoxCallable, ClockCallable
+from src.lox_class import LoxClass, LoxInstance
+from src.lox_token import Token
+from src.symbol_table import symbols
+
+
+# Reading an Enum member is slow enough to matter in the dispatch loop (see
+# `environment`), so the VM compares opcodes against plain ints
+CONSTANT = int(OpCode.CONSTANT)
+NIL = int(OpCode.NIL)
+TRUE = int(OpCode.TRUE)
+FALSE = int(OpCode.FALSE)
+POP = int(OpCode.POP)
+GET_LOCAL = int(OpCode.GET_LOCAL)
+SET_LOCAL = int(OpCode.SET_LOCAL)
+DEFINE_LOCAL = int(OpCode.DEFINE_LOCAL)
+GET_CELL = int(OpCode.GET_CELL)
+SET_CELL = int(OpCode.SET_CELL)
+DEFINE_CELL = int(OpCode.DEFINE_CELL)
+BOX = int(OpCode.BOX)
+GET_UPVALUE = int(OpCode.GET_UPVALUE)
+SET_UPVALUE = int(OpCode.SET_UPVALUE)
+GET_GLOBAL = int(OpCode.GET_GLOBAL)
+SET_GLOBAL = int(OpCode.SET_GLOBAL)
+DEFINE_GLOBAL = int(OpCode.DEFINE_GLOBAL)
+GET_PROPERTY = int(OpCode.GET_PROPERTY)
+CHECK_INSTANCE = int(OpCode.CHECK_INSTANCE)
+SET_PROPERTY = int(OpCode.SET_PROPERTY)
+GET_SUPER = int(OpCode.GET_SUPER)
+GET_METHOD = int(OpCode.GET_METHOD)
+EQUAL = int(OpCode.EQUAL)
+GREATER = int(OpCode.GREATER)
+GREATER_EQUAL = int(OpCode.GREATER_EQUAL)
+LESS = int(OpCode.LESS)
+LESS_EQUAL = int(OpCode.LESS_EQUAL)
+ADD = int(OpCode.ADD)
+SUBTRACT = int(OpCode.SUBTRACT)
+MULTIPLY = int(OpCode.MULTIPLY)
+DIVIDE = int(OpCode.DIVIDE)
+NOT = int(OpCode.NOT)
+NEGATE = int(OpCode.NEGATE)
+PRINT = int(OpCode.PRINT)
+JUMP = int(OpCode.JUMP)
+JUMP_IF_FALSE = int(OpCode.JUMP_IF_FALSE)
+JUMP_IF_TRUE = int(OpCode.JUMP_IF_TRUE)
+POP_JUMP_IF_FALSE = int(OpCode.POP_JUMP_IF_FALSE)
+CALL = int(OpCode.CALL)
+INVOKE = int(OpCode.INVOKE)
+CLOSURE = int(OpCode.CLOSURE)
+RETURN = int(OpCode.RETURN)
+CLASS = int(OpCode.CLASS)
+SUPER_CELL = int(OpCode.SUPER_CELL)
+METHOD = int(OpCode.METHOD)
+
+
+class VMClosure(LoxCallable):
+    """
+    A compiled function together with the cells it captured, and the
+    instance it's bound to if it's a method.
+    """
+    def __init__(self, function, upvalues, receiver=None):
+        self.function = function
+        self.upvalues = upvalues
+        self.receiver = receiver
+
+    def bind(self, instance):
+        return VMClosure(self.function, self.upvalues, instance)
+
+    def arity(self):
+        return self.function.arity
+
+    def __call__(self, interpreter, arguments, receiver=None):
+        closure = self if receiver is None else self.bind(receiver)
+        return interpreter.call(closure, arguments)
+
+    def __str__(self):
+        return str(self.function)
+
+
+class VM():
+    """
+    A stack-based virtual machine in the style of clox, running the bytecode
+    of `BytecodeCompiler`.
+
+    All calls share one value stack. A call's frame is a window of it: the
+    receiver or callee, then the arguments and the remaining locals, with
+    the operands of the running code on top. Calls between Lox functions are
+    handled inside the dispatch loop, so Lox recursion doesn't recurse in
+    Python. Classes, instances and cells are shared with the `Interpreter`.
+    """
+    # Deepest Lox call stack allowed, like clox's FRAMES_MAX
+    FRAMES_MAX = 1024
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.globals = GlobalEnvironment()
+        self.globals.define(symbols.intern("clock"), ClockCallable())
+        self.compiler = BytecodeCompiler(runtime)
+        self.stack = []
+
+    def interpret(self, statements):
+        self.globals.reserve()
+        try:
+            script = self.compiler.compile_script(statements)
+            self.call(VMClosure(script, ()), [])
+        except RuntimeException as error:
+            self.stack.clear()
+            self.runtime.runtime_error(error)
+
+    def call(self, closure, arguments):
+        """
+        Runs `closure` with `arguments` to completion and returns its result.
+        """
+        self.stack.append(closure)
+        self.stack.extend(arguments)
+        return self.run(closure, len(self.stack) - len(arguments) - 1)
+
+    @staticmethod
+    def error(chunk, offset, message):
+        """
+        Returns a runtime error for the instruction at `offset`, reported on
+        its line.
+        """
+        return RuntimeException(Token(None, "", None, chunk.line_at(offset)), message)
+
+    def undefined(self, chunk, offset, symbol):
+        name = Token(None, symbols.name(symbol), None, chunk.line_at(offset))
+        return self.globals.undefined(name)
+
+    def run(self, closure, bottom):
+        """
+        The dispatch loop. Runs the call of `closure` whose callee is at
+        `bottom` on the stack until it returns.
+        """
+        stack = self.stack
+        global_values = self.globals.values
+        is_equal = Interpreter.is_equal
+        stringify = Interpreter.stringify
+        FRAMES_MAX = self.FRAMES_MAX
+        # The callers' `(closure, ip, base, bottom)`
+        frames = []
+
+        function = closure.function
+        if function.chunk is None:
+            self.compiler.compile_body(function)
+        chunk = function.chunk
+        code = function.code
+        constants = chunk.constants
+        upvalues = closure.upvalues
+        if closure.receiver is None:
+            base = bottom + 1
+        else:
+            stack[bottom] = closure.receiver
+            base = bottom
+        stack.extend([None] * (base + function.frame_size - len(stack)))
+        ip = 0
+
+        while True:
+            op = code[ip]
+
+            # Ordered by how often each instruction runs on the benchmarks
+            if op == GET_LOCAL:
+                stack.append(stack[base + code[ip + 1]])
+                ip += 2
+
+            elif op == CONSTANT:
+                stack.append(constants[code[ip + 1]])
+                ip += 2
+
+            elif op == GET_GLOBAL:
+                value = global_values[code[ip + 1]]
+                if value is UNDEFINED:
+                    raise self.undefined(chunk, ip, code[ip + 1])
+                stack.append(value)
+                ip += 2
+
+            elif op == ADD:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is type(b) and (type(a) is float or type(a) is str):
+                    stack[-1] = a + b
+                else:
+                    raise RuntimeException(constants[code[ip + 1]],
+                                           "Operands must be two numbers or two string")
+                ip += 2
+
+            elif op == POP:
+                stack.pop()
+                ip += 1
+
+            elif op == GET_PROPERTY:
+                instance = stack[-1]
+                name = constants[code[ip + 1]]
+                if not isinstance(instance, LoxInstance):
+                    raise RuntimeException(name, "Only instances have properties.")
+                stack[-1] = instance.get(name)
+                ip += 2
+
+            elif op == RETURN:
+                result = stack.pop()
+                del stack[bottom:]
+                if not frames:
+                    return result
+                closure, ip, base, bottom = frames.pop()
+                chunk = closure.function.chunk
+                code = closure.function.code
+                constants = chunk.constants
+                upvalues = closure.upvalues
+                stack.append(result)
+
+            elif op == CALL or op == INVOKE:
+                argc = code[ip + 1]
+                callee_at = len(stack) - argc - 1
+                receiver = None
+                if op == INVOKE:
+                    # The receiver GET_METHOD left under the arguments
+                    receiver = stack.pop(callee_at)
+                    callee_at -= 1
+                callee = stack[callee_at]
+                if receiver is not None:
+                    # An unbound method, which is always a closure
+                    pass
+                elif type(callee) is VMClosure:
+                    receiver = callee.receiver
+                elif type(callee) is LoxClass:
+                    receiver = LoxInstance(callee)
+                    initializer = callee.initializer
+                    if initializer is None:
+                        if argc != 0:
+                            raise self.error(chunk, ip,
+                                             f"Expected 0 arguments but got {argc}.")
+                        stack[callee_at] = receiver
+                        ip += 2
+                        continue
+                    callee = initializer
+                elif isinstance(callee, LoxCallable):
+                    arguments = stack[callee_at + 1:]
+                    if argc != callee.arity():
+                        raise self.error(chunk, ip,
+                                         f"Expected {callee.arity()} arguments but got {argc}.")
+                    result = callee(self, arguments)
+                    del stack[callee_at:]
+                    stack.append(result)
+                    ip += 2
+                    continue
+                else:
+                    raise self.error(chunk, ip, "Can only call functions and classes.")
+
+                function = callee.function
+                if argc != function.arity:
+                    raise self.error(chunk, ip,
+                                     f"Expected {function.arity} arguments but got {argc}.")
+                if code[ip + 2] == RETURN:
+                    # A `return` of the call's value: the callee takes over
+                    # the returning function's frame instead of adding one
+                    stack[bottom:] = stack[callee_at:]
+                    callee_at = bottom
+                else:
+                    if len(frames) == FRAMES_MAX:
+                        raise self.error(chunk, ip, "Stack overflow.")
+                    frames.append((closure, ip + 2, base, bottom))
+
+                closure = callee
+                if function.chunk is None:
+                    self.compiler.compile_body(function)
+                chunk = function.chunk
+                code = function.code
+                constants = chunk.constants
+                upvalues = closure.upvalues
+                bottom = callee_at
+                if receiver is None:
+                    base = callee_at + 1
+                else:
+                    stack[callee_at] = receiver
+                    base = callee_at
+                stack.extend([None] * (base + function.frame_size - len(stack)))
+                ip = 0
+
+            elif op == GET_METHOD:
+                instance = stack[-1]
+                name = constants[code[ip + 1]]
+                if not isinstance(instance, LoxInstance):
+                    raise RuntimeException(name, "Only instances have properties.")
+                fields = instance.fields
+                if name.symbol in fields:
+                    stack[-1] = fields[name.symbol]
+                    stack.append(None)
+                else:
+                    method = instance.klass.method_table.get(name.symbol)
+                    if method is None:
+                        # Reports the undefined property
+                        instance.get(name)
+                    stack[-1] = method
+                    stack.append(instance)
+                ip += 2
+
+            elif op == LESS:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operands must be numbers.")
+                stack[-1] = a < b
+                ip += 2
+
+            elif op == POP_JUMP_IF_FALSE:
+                value = stack.pop()
+                if value is None or value is False:
+                    ip = code[ip + 1]
+                else:
+                    ip += 2
+
+            elif op == SET_LOCAL:
+                stack[base + code[ip + 1]] = stack[-1]
+                ip += 2
+
+            elif op == JUMP:
+                ip = code[ip + 1]
+
+            elif op == GET_UPVALUE:
+                stack.append(upvalues[code[ip + 1]].value)
+                ip += 2
+
+            elif op == SUBTRACT:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operands must be numbers.")
+                stack[-1] = a - b
+                ip += 2
+
+            elif op == CHECK_INSTANCE:
+                if not isinstance(stack[-1], LoxInstance):
+                    raise RuntimeException(constants[code[ip + 1]], "Only instances have fields.")
+                ip += 2
+
+            elif op == SET_PROPERTY:
+                value = stack.pop()
+                stack[-1].set(constants[code[ip + 1]], value)
+                stack[-1] = value
+                ip += 2
+
+            elif op == SET_GLOBAL:
+                symbol = code[ip + 1]
+                if global_values[symbol] is UNDEFINED:
+                    raise self.undefined(chunk, ip, symbol)
+                global_values[symbol] = stack[-1]
+                ip += 2
+
+            elif op == DEFINE_LOCAL:
+                stack[base + code[ip + 1]] = stack.pop()
+                ip += 2
+
+            elif op == MULTIPLY:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operands must be numbers.")
+                stack[-1] = a * b
+                ip += 2
+
+            elif op == SET_UPVALUE:
+                upvalues[code[ip + 1]].value = stack[-1]
+                ip += 2
+
+            elif op == GET_CELL:
+                stack.append(stack[base + code[ip + 1]].value)
+                ip += 2
+
+            elif op == SET_CELL:
+                stack[base + code[ip + 1]].value = stack[-1]
+                ip += 2
+
+            elif op == GET_SUPER:
+                superclass = stack.pop()
+                name = constants[code[ip + 1]]
+                method = superclass.find_method(name.symbol)
+                if method is None:
+                    raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
+                stack[-1] = method.bind(stack[-1])
+                ip += 2
+
+            elif op == DIVIDE:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operands must be numbers.")
+                if b == 0.0:
+                    raise RuntimeException(constants[code[ip + 1]], "Cannot divide by zero.")
+                stack[-1] = a / b
+                ip += 2
+
+            elif op == GREATER:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operands must be numbers.")
+                stack[-1] = a > b
+                ip += 2
+
+            elif op == GREATER_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operands must be numbers.")
+                stack[-1] = a >= b
+                ip += 2
+
+            elif op == LESS_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operands must be numbers.")
+                stack[-1] = a <= b
+                ip += 2
+
+            elif op == EQUAL:
+                b = stack.pop()
+                stack[-1] = is_equal(stack[-1], b)
+                ip += 1
+
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+                ip += 1
+
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise RuntimeException(constants[code[ip + 1]], "Operand must be a number.")
+                stack[-1] = -value
+                ip += 2
+
+            elif op == NIL:
+                stack.append(None)
+                ip += 1
+
+            elif op == TRUE:
+                stack.append(True)
+                ip += 1
+
+            elif op == FALSE:
+                stack.append(False)
+                ip += 1
+
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = code[ip + 1]
+                else:
+                    ip += 2
+
+            elif op == JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += 2
+                else:
+                    ip = code[ip + 1]
+
+            elif op == DEFINE_GLOBAL:
+                global_values[code[ip + 1]] = stack.pop()
+                ip += 2
+
+            elif op == DEFINE_CELL:
+                stack[base + code[ip + 1]] = Cell(stack.pop())
+                ip += 2
+
+            elif op == BOX:
+                slot = base + code[ip + 1]
+                stack[slot] = Cell(stack[slot])
+                ip += 2
+
+            elif op == PRINT:
+                print(stringify(stack.pop()))
+                ip += 1
+
+            elif op == CLOSURE:
+                function = constants[code[ip + 1]]
+                if function.upvalues:
+                    captured = [stack[base + index] if is_local else upvalues[index]
+                                for is_local, index in function.upvalues]
+                else:
+                    captured = ()
+                stack.append(VMClosure(function, captured))
+                ip += 2
+
+            elif op == CLASS:
+                name = constants[code[ip + 1]]
+                superclass = None
+                if code[ip + 2]:
+                    superclass = stack.pop()
+                    if not isinstance(superclass, LoxClass):
+                        raise self.error(chunk, ip, "Superclass must be a class")
+                stack.append(LoxClass(name.lexeme, superclass, {}))
+                ip += 3
+
+            elif op == SUPER_CELL:
+                stack[base + code[ip + 1]] = Cell(stack[-1].superclass)
+                ip += 2
+
+            elif op == METHOD:
+                method = stack.pop()
+                stack[-1].define_method(constants[code[ip + 1]].symbol, method)
+                ip += 2
+
+            else:
+                raise RuntimeError(f"Unknown opcode {op} at {ip}")
@@ -30,7 +30,225 @@ LOX_FUNCTIONS_EXPECTED_VALUES = [
      count(3);
      """,
      ['1', '2', '3']
-    )
-]
+    ),
 
+    ("""
+     fun makeCounter() {
+       var i = 0;
+       fun count() {
+         i = i + 1;
+         print i;
+       }
+       return count;
+     }
+     var counter = makeCounter();
+     counter();
+     counter();
+     """,
+     ['1', '2']
+    ),
 
+    ("""
+     var a = "global a";
+     var b = "global b";
+     {
+       var a = "outer a";
+       {
+         var a = "inner a";
+         b = "inner b";
+         print a;
+       }
+       a = "reassigned a";
+       print a;
+     }
+     print a;
+     print b;
+     """,
+     ['"inner a"', '"reassigned a"', '"global a"', '"inner b"']
+    ),
+
+    ("""
+     class Breakfast {
+       init(meat, bread) {
+         this.meat = meat;
+         this.bread = bread;
+       }
+       serve(who) {
+         print "Enjoy your " + this.meat + " and " + this.bread + ", " + who + ".";
+       }
+     }
+     var breakfast = Breakfast("bacon", "toast");
+     breakfast.serve("Dear Reader");
+     print breakfast;
+     print Breakfast;
+     breakfast.meat = "eggs";
+     var serve = breakfast.serve;
+     serve("you");
+     """,
+     ['"Enjoy your bacon and toast, Dear Reader."', 'Breakfast instance', 'Breakfast',
+      '"Enjoy your eggs and toast, you."']
+    ),
+
+    ("""
+     class A {
+       method() { print "A method"; }
+       name() { return "A"; }
+     }
+     class B < A {
+       method() { print "B method"; }
+       test() { super.method(); }
+     }
+     class C < B {
+       name() { return "C of " + super.name(); }
+     }
+     C().test();
+     C().method();
+     print C().name();
+     """,
+     ['"A method"', '"B method"', '"C of A"']
+    ),
+
+    ("""
+     class Node {
+       init(value) {
+         this.value = value;
+         this.next = nil;
+         return;
+       }
+     }
+     var head = Node(1);
+     head.next = Node(2);
+     print head.value + head.next.value;
+     print head.init(5) == head;
+     print head.value;
+     print head.next;
+     """,
+     ['3', 'true', '5', 'nil']
+    ),
+
+    ("""
+     fun fib(n) {
+       if (n <= 1) return n;
+       return fib(n - 2) + fib(n - 1);
+     }
+     for (var i = 0; i < 10; i = i + 1) {
+       print fib(i);
+     }
+     """,
+     ['0', '1', '1', '2', '3', '5', '8', '13', '21', '34']
+    ),
+
+    ("""
+     print nil or "yes";
+     print "hi" and 2;
+     print !nil;
+     print 1 == 1.0;
+     print nil == false;
+     print "a" + "b" != "ab";
+     print -3 / 2 * 4;
+     print clock() > 0;
+     """,
+     ['"yes"', '2', 'true', 'true', 'false', 'false', '-6', 'true']
+    ),
+
+    ("""
+     fun sum() {
+       var total = 0;
+       for (var i = 0; i < 3; i = i + 1) {
+         var square = i * i;
+         total = total + square;
+       }
+       return total;
+     }
+     fun capture() {
+       var first;
+       var second;
+       for (var i = 0; i < 2; i = i + 1) {
+         var j = i;
+         fun show() { print j; }
+         if (first == nil) first = show; else second = show;
+       }
+       first();
+       second();
+     }
+     print sum();
+     capture();
+     """,
+     ['5', '0', '1']
+    ),
+
+    ("""
+     class Counter {
+       init(step) { this.step = step; this.total = 0; }
+       add(n) { this.total = this.total + n * this.step; return this; }
+       get() { return this.total; }
+     }
+     class Doubler < Counter {
+       add(n) { return super.add(n * 2); }
+     }
+     fun triple(n) { return n * 3; }
+     var counter = Doubler(1);
+     print counter.add(1).add(2).get();
+     // A callable held in a field shadows the method and gets no receiver
+     counter.get = triple;
+     print counter.get(5);
+     var method = counter.add;
+     method(1);
+     print counter.total;
+     print counter.init(2) == counter;
+     """,
+     ['6', '15', '8', 'true']
+    ),
+
+    ("""
+     class Box {
+       init(value) { this.value = value; }
+       with(value) { return Box(value); }
+     }
+     fun make(n) { return Box(n); }
+     fun relay(f, n) { return f(n); }
+     fun adder(n) { fun add(m) { return n + m; } return add; }
+     print relay(make, 4).with(5).value;
+     print relay(adder(1), 2);
+     """,
+     ['5', '3']
+    ),
+
+    ("""
+     fun five() { return 5; }
+     fun ignore() { five(); }
+     fun branch(x) { if (x) five(); else return 2; }
+     fun nested() { { { return 3; } } print "unreachable"; }
+     fun loop() { var i = 0; while (true) { i = i + 1; if (i == 4) return i; } }
+     fun empty(x) { if (x) return; return nil; }
+     class Early { init(x) { if (x) return; this.late = true; } }
+     print ignore();
+     print branch(true);
+     print branch(false);
+     print nested();
+     print loop();
+     print empty(true) == empty(false);
+     print Early(true);
+     """,
+     ['nil', 'nil', '2', '3', '4', 'true', 'Early instance']
+    ),
+
+    ("""
+     var x = 1;
+     fun bump() { x = x + 1; return x; }
+     fun id(v) { return v; }
+     class Box { init() { this.v = 0; } self() { return this; } }
+     print bump() + x;
+     print x + bump();
+     var box = Box();
+     box.v = bump();
+     print box.self().v;
+     print -id(2) * id(3);
+     print !id(nil) and id("and");
+     print id(false) or id("or");
+     box.f = id;
+     print box.f(bump());
+     """,
+     ['4', '5', '4', '-6', '"and"', '"or"', '5']
+    ),
+]
@@ -0,0 +1,64 @@
+from src.lox import Lox
+from src.token_buffer import TokenBuffer
+
+UNUSED_BROKEN_FUNCTION = """
+fun unused() {
+  print "never called" +;
+}
+fun used() {
+  print "called";
+}
+used();
+"""
+
+
+def test_lazy_mode_skips_unused_function_bodies(capsys):
+    lox = Lox(lazy=True)
+    lox.run(UNUSED_BROKEN_FUNCTION)
+    assert not lox.had_error
+    assert capsys.readouterr().out.splitlines() == ['"called"']
+
+
+def test_strict_lazy_mode_reports_errors_in_unused_functions(capsys):
+    lox = Lox(lazy=True, strict=True)
+    lox.run(UNUSED_BROKEN_FUNCTION)
+    assert lox.had_error
+    assert capsys.readouterr().out.splitlines() == ["[line 3] Error at ';': Expect expression."]
+
+
+def test_lazy_mode_reports_errors_when_broken_function_is_called(capsys):
+    lox = Lox(lazy=True)
+    lox.run(UNUSED_BROKEN_FUNCTION + "unused();")
+    assert lox.had_error
+    assert lox.had_runtime_error
+    assert capsys.readouterr().out.splitlines() == [
+        '"called"',
+        "[line 3] Error at ';': Expect expression.",
+        "Could not compile function 'unused'.",
+        "[line 2]",
+    ]
+
+
+def test_lazy_mode_resolves_methods_in_their_class(capsys):
+    lox = Lox(lazy=True)
+    lox.run("""
+    class A { name() { return "A"; } }
+    class B < A {
+      init(suffix) { this.suffix = suffix; }
+      name() { return super.name() + this.suffix; }
+    }
+    print B("!").name();
+    """)
+    assert not lox.had_error and not lox.had_runtime_error
+    assert capsys.readouterr().out.splitlines() == ['"A!"']
+
+
+def test_deferred_bodies_keep_their_tokens_packed():
+    lox = Lox(lazy=True)
+    statements = lox.compile('fun f(a) {\n  print a + "x";\n}')
+    tokens = statements[0].body.tokens
+    assert isinstance(tokens, TokenBuffer)
+    assert [(t.type.name, t.lexeme, t.literal, t.line) for t in tokens] == [
+        ("PRINT", "print", None, 2), ("IDENTIFIER", "a", None, 2), ("PLUS", "+", None, 2),
+        ("STRING", '"x"', "x", 2), ("SEMICOLON", ";", None, 2), ("RIGHT_BRACE", "}", None, 3),
+        ("EOF", "", None, 3)]
@@ -1,17 +1,41 @@
 import json
 import os
 import pytest
+import subprocess
 import sys
+import warnings
 
+from src.bytecode_compiler import BytecodeCompiler
+from src.environment import Access
 from src.lox import Lox
+from src.symbol_table import symbols
 from test.lox_test_cases import LOX_FUNCTIONS_EXPECTED_VALUES
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Lox configurations every program must behave the same under
+LOX_OPTIONS = [
+    {},
+    {"scanner": "char", "parser": "recursive"},
+    {"lazy": True},
+    {"lazy": True, "strict": True},
+    {"hot_threshold": 1},
+    {"hot_threshold": 1, "lazy": True},
+    {"engine": "closure"},
+    {"engine": "closure", "lazy": True},
+    {"engine": "vm"},
+    {"engine": "vm", "lazy": True},
+    {"engine": "python"},
+    {"engine": "python", "lazy": True},
+    {"engine": "stack"},
+    {"engine": "stack", "lazy": True},
+]
 
+
+@pytest.mark.parametrize("options", LOX_OPTIONS, ids=str)
 @pytest.mark.parametrize("lox_program_expected", LOX_FUNCTIONS_EXPECTED_VALUES)
-def test_lox_program(capsys, lox_program_expected):
-    lox = Lox()
+def test_lox_program(capsys, lox_program_expected, options):
+    lox = Lox(**options)
 
     lox_program, expected_value = lox_program_expected
     lox.run(lox_program)
@@ -22,3 +46,331 @@ def test_lox_program(capsys, lox_program_expected):
     output = capsys.readouterr().out.splitlines()
     assert output == expected_value
 
+
+def test_resolution_is_stored_on_nodes():
+    lox = Lox()
+    block, = lox.compile("{ var a = 1; { var b = a; print b; } }")
+    var, inner = block.statements
+    read = inner.statements[0].initializer
+    # Blocks share the frame of the code around them
+    assert (block.frame_size, inner.frame_size) == (2, None)
+    assert (var.slot, inner.statements[0].slot) == (0, 1)
+    assert (read.access, read.slot) == (Access.LOCAL, 0)
+
+
+def test_closures_capture_only_referenced_variables():
+    lox = Lox()
+    source = """
+    fun make() {
+      var unused = "unused";
+      var kept = "kept";
+      {
+        var inner = "inner";
+        fun get() { fun nested() { return kept; } return inner; }
+        return get;
+      }
+    }
+    var get = make();
+    """
+    make, _ = lox.compile(source)
+    unused, kept, block = make.body
+    inner, get, _ = block.statements
+    nested = get.body[0]
+    assert (make.frame_size, unused.captured, kept.captured, inner.captured) == (4, False, True, True)
+    assert (get.upvalues, nested.upvalues) == (((True, 1), (True, 2)), ((False, 0),))
+
+    lox.run(source)
+    closure = lox.interpreter.globals.values[symbols.intern("get")]
+    assert [cell.value for cell in closure.upvalues] == ["kept", "inner"]
+
+
+def test_call_frames_are_recycled(capsys):
+    lox = Lox()
+    lox.run("""
+    fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+    fun make(x) { fun get() { return x; } return get; }
+    var first = make("first");
+    var second = make("second");
+    print fib(10);
+    print first() + second();
+    """)
+    assert capsys.readouterr().out.split() == ['55', '"firstsecond"']
+    # fib makes 177 calls 10 deep, the two calls to make share a frame, and
+    # each closure gets its own
+    frames = lox.interpreter.frames
+    assert (frames.allocated, frames.reused) == (10 + 1 + 2, 167 + 1)
+
+
+@pytest.mark.parametrize("options", LOX_OPTIONS, ids=str)
+def test_undefined_globals_fail_when_used(capsys, options):
+    lox = Lox(**options)
+    lox.run("""
+    fun early() { return later; }
+    var later = "defined";
+    print early();
+    print missing;
+    """)
+    assert capsys.readouterr().out.splitlines() == [
+        '"defined"', "Undefined variable 'missing'.", "[line 5]"]
+
+    lox.run("unassigned = 1;")
+    assert capsys.readouterr().out.splitlines() == [
+        "Undefined variable 'unassigned'.", "[line 1]"]
+
+    # Each interpreter has globals of its own
+    other = Lox(**options)
+    other.run("print later;")
+    assert capsys.readouterr().out.splitlines() == ["Undefined variable 'later'.", "[line 1]"]
+
+
+@pytest.mark.parametrize("options", LOX_OPTIONS, ids=str)
+def test_calls_check_callee_and_arity(capsys, options):
+    lox = Lox(**options)
+    lox.run("""
+    fun f2(a, b) { return a + b; }
+    class Point { init(x) { this.x = x; } }
+    class Empty {}
+    print f2(1, 2);
+    print Point(3).x;
+    print Empty();
+    """)
+    assert capsys.readouterr().out.splitlines() == ["3", "3", "Empty instance"]
+
+    for call, message in [
+            ("f2(1);", "Expected 2 arguments but got 1."),
+            ("Point();", "Expected 1 arguments but got 0."),
+            ("Empty(1);", "Expected 0 arguments but got 1."),
+            ("clock(1);", "Expected 0 arguments but got 1."),
+            ("Point(1).init(1, 2, 3, 4);", "Expected 1 arguments but got 4."),
+            ('"f2"();', "Can only call functions and classes.")]:
+        lox.run(call)
+        assert capsys.readouterr().out.splitlines() == [message, "[line 1]"]
+
+
+# Translated Python functions call each other directly, so only the other
+# engines run tail calls in constant stack space
+@pytest.mark.parametrize("options", [options for options in LOX_OPTIONS
+                                     if options.get("engine") != "python"], ids=str)
+def test_tail_calls_run_in_constant_stack(capsys, options):
+    lox = Lox(**options)
+    lox.run("""
+    fun count(n, total) { if (n == 0) return total; return count(n - 1, total + 1); }
+    fun even(n) { if (n == 0) return true; return odd(n - 1); }
+    fun odd(n) { if (n == 0) return false; return even(n - 1); }
+    class Countdown {
+      run(n) { if (n == 0) return "done"; return this.run(n - 1); }
+    }
+    print count(5000, 0);
+    print even(5001);
+    print Countdown().run(5000);
+    """)
+    assert capsys.readouterr().out.splitlines() == ["5000", "false", '"done"']
+    assert not lox.had_runtime_error
+
+
+def test_stack_engine_recurses_past_the_python_stack(capsys):
+    lox = Lox(engine="stack")
+    lox.run("""
+    fun sum(n) { if (n == 0) return 0; return n + sum(n - 1); }
+    print sum(20000);
+    """)
+    assert capsys.readouterr().out.splitlines() == ["200010000"]
+
+    # A small budget turns runaway recursion into a Lox error, and the engine
+    # can keep running code after it
+    lox = Lox(engine="stack", max_stack=1000)
+    lox.run("fun f() {\n  return 1 + f();\n}\nprint 1;\nf();")
+    assert lox.had_runtime_error
+    assert capsys.readouterr().out.splitlines() == ["1", "Stack overflow.", "[line 2]"]
+    lox.run("print 2;")
+    assert capsys.readouterr().out.splitlines() == ["2"]
+
+
+@pytest.mark.parametrize("lazy", [False, True], ids=["eager", "lazy"])
+def test_stack_engine_runs_long_operator_chains(capsys, lazy):
+    terms = 5000
+    lox = Lox(engine="stack", lazy=lazy)
+    lox.run(f"""
+    fun one() {{ return 1; }}
+    fun sum() {{ return {" + ".join(["1"] * terms)}; }}
+    print sum();
+    print {" + ".join(["one()"] * terms)};
+    print {" and ".join(["true"] * terms)} or false;
+    """)
+    assert not lox.had_error and not lox.had_runtime_error
+    assert capsys.readouterr().out.splitlines() == [str(terms), str(terms), "true"]
+
+
+@pytest.mark.parametrize("options", LOX_OPTIONS, ids=str)
+def test_deep_nesting_is_a_compile_error(capsys, options):
+    lox = Lox(**options)
+    lox.run("print " + "(" * 5000 + "1" + ")" * 5000 + ";")
+    assert lox.had_error
+    assert capsys.readouterr().out.splitlines() == [
+        "[line 1] Error: Program is nested too deeply."]
+
+
+def test_disassembler_lists_every_compiled_function():
+    listing = Lox().disassemble("fun add(a, b) {\n  return a + b;\n}\nprint add(1, 2);")
+    assert listing.splitlines() == [
+        "== <script> ==",
+        "0000    1 CLOSURE           0 '<fn add>'",
+        "0002    | DEFINE_GLOBAL     " + f"{symbols.intern('add')} 'add'",
+        "0004    4 GET_GLOBAL        " + f"{symbols.intern('add')} 'add'",
+        "0006    | CONSTANT          1 '1.0'",
+        "0008    | CONSTANT          2 '2.0'",
+        "0010    | CALL              2",
+        "0012    | PRINT",
+        "0013    | NIL",
+        "0014    | RETURN",
+        "",
+        "== <fn add> ==",
+        "0000    2 GET_LOCAL         0",
+        "0002    | GET_LOCAL         1",
+        "0004    | ADD               0 '+'",
+        "0006    | RETURN",
+        "0007    | NIL",
+        "0008    | RETURN",
+    ]
+
+
+@pytest.mark.parametrize("count", [1000, 2000])
+def test_constant_pool_shares_numbers_and_strings(count):
+    lox = Lox()
+    statements = lox.compile('var x = 0;\n' + 'x = x + 1; x = x + "1";\n' * count)
+    constants = BytecodeCompiler(lox).compile_script(statements).chunk.constants
+    # 0, 1 and "1" once each, and the token of every "+" to report errors on
+    assert [value for value in constants if isinstance(value, (float, str))] == [0.0, 1.0, "1"]
+    assert len(constants) == 3 + 2 * count
+
+
+@pytest.mark.parametrize("engine", ["ast", "closure"])
+def test_property_caches_count_hits_and_misses(capsys, engine):
+    lox = Lox(engine=engine)
+    program = lox.compile("""
+    class A { m() { return "A"; } }
+    class B < A { m() { return "B" + super.m(); } }
+    class C < B {}
+    fun show(o) { print o.m(); }
+    show(A()); show(B()); show(C()); show(C());
+    """)
+    lox.interpreter.interpret(program)
+    assert capsys.readouterr().out.splitlines() == ['"A"', '"BA"', '"BA"', '"BA"']
+
+    # One miss for each class seen at a site, then hits
+    invoke = program[3].body[0].expression
+    assert (invoke.cache.misses, invoke.cache.hits) == (3, 1)
+    super_ = program[1].methods[0].body[0].value.right.callee
+    assert (super_.cache.misses, super_.cache.hits) == (1, 2)
+
+
+def test_classes_flatten_inherited_methods():
+    lox = Lox()
+    lox.run("""
+    class A { init(x) {} m() {} n() {} }
+    class B < A { m() {} }
+    class C < B { init() {} }
+    """)
+    a, b, c = (lox.interpreter.globals.values[symbols.intern(name)] for name in "ABC")
+    m, n, init = (symbols.intern(name) for name in ("m", "n", "init"))
+    assert b.method_table == {init: a.methods[init], m: b.methods[m], n: a.methods[n]}
+    assert c.find_method(m) is b.methods[m]
+    assert (a.arity(), b.arity(), c.arity()) == (1, 1, 0)
+
+
+def test_hot_functions_are_promoted(capsys):
+    lox = Lox(hot_threshold=50)
+    lox.run("""
+    fun cold() { return 1; }
+    fun loop(n) { var i = 0; while (i < n) i = i + 1; return i; }
+    fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+    cold();
+    loop(100);
+    print loop(100);
+    print fib(15);
+    """)
+    assert capsys.readouterr().out.splitlines() == ["100", "610"]
+    promotions = lox.interpreter.tiering.promotions
+    # A long loop makes the next call compiled; recursion promotes mid-run
+    assert [(p.name, p.calls, p.back_edges, p.error) for p in promotions] == [
+        ("loop", 2, 100, None), ("fib", 50, 0, None)]
+    assert str(promotions[0]).startswith("[tier] promoted loop (line 3) after 2 calls")
+
+
+def test_tiering_can_be_turned_off():
+    lox = Lox(hot_threshold=None)
+    lox.run("fun f() {} var i = 0; while (i < 100) { f(); i = i + 1; }")
+    assert lox.interpreter.tiering.promotions == []
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_translated_module_runs_on_its_own(tmp_path, lazy):
+    source = Lox(lazy=lazy).translate(
+        "class A { init(n) { this.n = n; } }\n"
+        "fun count(a) { var i = 0; fun inc() { i = i + a.n; return i; } return inc; }\n"
+        "var c = count(A(2));\nc();\nprint c();\nprint nil + 1;")
+    module = tmp_path / "translated.py"
+    module.write_text(source)
+
+    result = subprocess.run([sys.executable, str(module)], capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": os.path.dirname(THIS_DIR)})
+    assert result.returncode == 70
+    assert result.stdout.splitlines() == ["4", "Operands must be two numbers or two string",
+                                          "[line 6]"]
+
+
+def test_translated_literals_compile_without_warnings(capsys):
+    lox = Lox(engine="python")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        lox.run("""
+        print !!"x";
+        print 0 and "z";
+        print nil or 1;
+        if ("s") print !nil;
+        while (nil) print 2;
+        """)
+    assert capsys.readouterr().out.splitlines() == ["true", '"z"', "1", "true"]
+
+
+NON_ASCII_NAMES = """
+var x² = 1;
+var ﬁx = "lig";
+var fix = "plain";
+print x²; print ﬁx; print fix;
+class A { ﬁx() { return 1; } fix() { return 2; } }
+print A().ﬁx(); print A().fix();
+fun ǵ(ﬁx, fix) { var ë = ﬁx; fun h() { return ë + fix; } return h(); }
+print ǵ("a", "b");
+"""
+
+
+@pytest.mark.parametrize("options", LOX_OPTIONS, ids=str)
+def test_non_ascii_identifiers_stay_distinct(capsys, options):
+    # "ﬁ" is a ligature that Python would fold into "fi" in an identifier
+    Lox(**options).run(NON_ASCII_NAMES)
+    assert capsys.readouterr().out.splitlines() == ["1", '"lig"', '"plain"', "1", "2", '"ab"']
+
+
+def test_translated_module_has_valid_names_for_non_ascii_identifiers(tmp_path):
+    module = tmp_path / "translated.py"
+    module.write_text(Lox().translate(NON_ASCII_NAMES), encoding="utf-8")
+
+    result = subprocess.run([sys.executable, str(module)], capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": os.path.dirname(THIS_DIR)})
+    assert result.returncode == 0
+    assert result.stdout.splitlines() == ["1", '"lig"', '"plain"', "1", "2", '"ab"']
+
+
+def test_translation_fails_on_compile_errors(capsys):
+    assert Lox(lazy=True).translate("fun f() { return 1 +; }") is None
+
+
+def test_vm_reports_runtime_errors_on_their_line(capsys):
+    lox = Lox(engine="vm")
+    lox.run("fun recurse() {\n  recurse();\n}\nprint 1;\nrecurse();")
+    assert lox.had_runtime_error
+    assert capsys.readouterr().out.splitlines() == ["1", "Stack overflow.", "[line 2]"]
+    # The stack is reset, so the VM can keep running code
+    lox.run("print 2;")
+    assert capsys.readouterr().out.splitlines() == ["2"]
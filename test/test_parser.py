@@ -0,0 +1,81 @@
+import glob
+import os
+import pytest
+
+import pylox_ast.expr as Expr
+import pylox_ast.stmt as Stmt
+
+from src.lox import Lox
+from src.parser import Parser
+from src.pratt_parser import PrattParser
+from src.regex_scanner import RegexScanner
+from src.lox_token import Token
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+LOX_FILES = sorted(glob.glob(os.path.join(THIS_DIR, "lox_test_files", "*.lox")))
+
+SNIPPETS = [
+    "a = b = c or d and e == f != g < h <= i > j >= k - l + m / n * -!o;",
+    "print -a.b(c, d)(e).f = !!g;",
+    "x.y.z = (1 + 2) * 3 - 4 / 5;",
+    "print ((((((1))))));",
+    "a + b = c;",
+    "(a) = 1; print 2;",
+    "-a = 3;",
+    "print super.method; print this.field;",
+    "print 1 +;",
+    "print (1;",
+    "f(1, 2,);",
+    "a.;",
+    "super;",
+    "class A < B { m() { return super.m() + this.x; } }",
+    "for (var i = 0; i < 10; i = i + 1) if (i > 2 and i < 5) print i; else print -i;",
+]
+
+
+def dump(node):
+    """
+    Renders a tree of AST nodes and tokens as nested tuples for comparison.
+    """
+    if isinstance(node, list):
+        return [dump(item) for item in node]
+    if isinstance(node, Token):
+        return (node.type, node.lexeme, node.literal, node.line)
+    if hasattr(node, "accept"):
+        fields = type(node).__slots__
+        return (type(node).__name__, {field: dump(getattr(node, field)) for field in fields})
+    return node
+
+
+def parse(parser_cls, source, capsys):
+    lox = Lox()
+    statements = parser_cls(lox, RegexScanner(lox, source).iter_tokens()).parse()
+    return dump(statements), capsys.readouterr().out
+
+
+@pytest.mark.parametrize("path", LOX_FILES, ids=os.path.basename)
+def test_pratt_parser_matches_recursive_parser_on_files(capsys, path):
+    with open(path, "r") as f:
+        source = f.read()
+    assert parse(PrattParser, source, capsys) == parse(Parser, source, capsys)
+
+
+@pytest.mark.parametrize("source", SNIPPETS)
+def test_pratt_parser_matches_recursive_parser_on_snippets(capsys, source):
+    assert parse(PrattParser, source, capsys) == parse(Parser, source, capsys)
+
+
+@pytest.mark.parametrize("module, base", [(Expr, Expr.Expr), (Stmt, Stmt.Stmt)])
+def test_dispatch_table_matches_accept(module, base):
+    class Recorder():
+        def __getattr__(self, name):
+            return lambda node: name
+
+    table = base.dispatch_table(Recorder())
+    node_classes = [cls for cls in vars(module).values()
+                    if isinstance(cls, type) and issubclass(cls, base) and cls is not base]
+    assert len(node_classes) == len(table)
+    for cls in node_classes:
+        node = cls(*[None] * len(cls.__slots__))
+        assert not hasattr(node, "__dict__")
+        assert table[cls.dispatch_index](node) == node.accept(Recorder())
@@ -0,0 +1,110 @@
+import os
+import pytest
+import subprocess
+import sys
+
+from src.lox import Lox
+from src.program_cache import ProgramCache
+
+PROGRAM = """
+class Counter {
+  init() { this.count = 0; }
+  increment() {
+    this.count = this.count + 1;
+    return this.count;
+  }
+}
+fun twice(f) {
+  f();
+  return f();
+}
+var counter = Counter();
+print twice(counter.increment);
+{
+  var local = "local";
+  print local;
+}
+"""
+
+
+def cache_entries(tmp_path):
+    return sorted(p for p in (tmp_path / "__loxcache__").iterdir())
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_run_file_reuses_cached_program(capsys, tmp_path, lazy):
+    script = tmp_path / "script.lox"
+    script.write_text(PROGRAM)
+
+    Lox(lazy=lazy).run_file(str(script))
+    first = capsys.readouterr().out
+    entries = cache_entries(tmp_path)
+    assert len(entries) == 1
+
+    Lox(lazy=lazy).run_file(str(script))
+    assert capsys.readouterr().out == first == '2\n"local"\n'
+    assert cache_entries(tmp_path) == entries
+
+
+def test_lazy_cache_entries_load_in_another_process(tmp_path):
+    script = tmp_path / "script.lox"
+    script.write_text('fun f() { var alpha = "Z"; print alpha; print beta; }\n'
+                      'var beta = f;\nf();')
+    # The reading process interns other names first, so its symbol ids differ
+    # from the ids of the process that wrote the entry
+    runs = ["", "from src.symbol_table import symbols; [symbols.intern(n) for n in 'zyx']; "]
+    outputs = []
+    for prefix in runs:
+        code = f"{prefix}from src.lox import Lox; Lox(lazy=True).run_file({str(script)!r})"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        outputs.append((result.returncode, result.stdout, result.stderr))
+    assert len(cache_entries(tmp_path)) == 1
+    assert outputs[0] == outputs[1] == (0, '"Z"\n<fn f>\n', "")
+
+
+def test_cache_hit_skips_compilation(capsys, tmp_path, monkeypatch):
+    script = tmp_path / "script.lox"
+    script.write_text(PROGRAM)
+    Lox().run_file(str(script))
+    capsys.readouterr()
+
+    monkeypatch.setattr(Lox, "scanners", {"regex": None})
+    Lox().run_file(str(script))
+    assert capsys.readouterr().out == '2\n"local"\n'
+
+
+def test_changed_source_and_corrupt_entries_miss(capsys, tmp_path):
+    script = tmp_path / "script.lox"
+    script.write_text("print 1;")
+    Lox().run_file(str(script))
+    [entry] = cache_entries(tmp_path)
+    entry.write_bytes(b"not a pickle")
+
+    Lox().run_file(str(script))
+    script.write_text("print 2;")
+    Lox().run_file(str(script))
+    assert capsys.readouterr().out == "1\n1\n2\n"
+    assert len(cache_entries(tmp_path)) == 2
+
+
+def test_no_cache_writes_nothing(capsys, tmp_path):
+    script = tmp_path / "script.lox"
+    script.write_text("print 1;")
+    Lox(cache=False).run_file(str(script))
+    assert not (tmp_path / "__loxcache__").exists()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    keys = [cache.key(f"print {n};", "") for n in range(3)]
+    for age, key in enumerate(keys):
+        cache.store(key, ["x" * 100])
+        os.utime(cache.path(key), (age, age))
+    # Room for exactly three entries
+    cache.max_size = os.path.getsize(cache.path(keys[0])) * 3
+
+    assert cache.load(keys[0]) is not None  # Refreshes the oldest entry
+    cache.store(cache.key("print 3;", ""), ["x" * 100])
+    assert cache.load(keys[1]) is None
+    assert cache.load(keys[0]) is not None
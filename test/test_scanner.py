@@ -0,0 +1,70 @@
+import glob
+import os
+import pytest
+
+from src.lox import Lox
+from src.regex_scanner import RegexScanner
+from src.scanner import Scanner
+from src.token_buffer import TokenBuffer
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+LOX_FILES = sorted(glob.glob(os.path.join(THIS_DIR, "lox_test_files", "*.lox")))
+
+SNIPPETS = [
+    "var a = 1.5 + 2.;\nprint a >= 3 != !true;",
+    "// comment only",
+    "a / b // trailing comment\n/ c",
+    '"multi\nline\nstring" 1',
+    '"unterminated\nstring',
+    "x = 1 @ 2 # 3 _y;",
+    "café = 1; naïve.field; 1é; é1.5; 1.٣; ٣٣ + x²;",
+    "print a b;\f\v",
+    "12.34.56 .5 5.",
+    "é = abc",
+    "é = 12",
+    "",
+]
+
+
+def scan(scanner_cls, source, capsys):
+    lox = Lox()
+    tokens = scanner_cls(lox, source).scan_tokens()
+    errors = capsys.readouterr().out
+    return [(t.type, t.lexeme, t.literal, t.line, t.symbol) for t in tokens], errors
+
+
+@pytest.mark.parametrize("path", LOX_FILES, ids=os.path.basename)
+def test_regex_scanner_matches_char_scanner_on_files(capsys, path):
+    with open(path, "r") as f:
+        source = f.read()
+    assert scan(RegexScanner, source, capsys) == scan(Scanner, source, capsys)
+
+
+@pytest.mark.parametrize("source", SNIPPETS)
+def test_regex_scanner_matches_char_scanner_on_snippets(capsys, source):
+    assert scan(RegexScanner, source, capsys) == scan(Scanner, source, capsys)
+
+
+@pytest.mark.parametrize("source", SNIPPETS + ['var s = "a\nlong\n\nstring";\nprint s; // "\n"x"'])
+def test_regex_scanner_buffer_chunks_match_text(capsys, monkeypatch, source):
+    expected = scan(RegexScanner, source, capsys)
+    # Tiny chunks force string literals and lines across chunk boundaries
+    monkeypatch.setattr(RegexScanner, "chunk_size", 3)
+    assert scan(RegexScanner, source.encode("utf-8"), capsys) == expected
+
+
+def test_run_file_streams_memory_mapped_source(capsys, tmp_path):
+    path = tmp_path / "script.lox"
+    path.write_text('var greeting = "héllo";\nprint greeting + " wörld";\n', encoding="utf-8")
+    Lox().run_file(str(path))
+    assert capsys.readouterr().out.splitlines() == ['"héllo wörld"']
+
+
+@pytest.mark.parametrize("path", LOX_FILES, ids=os.path.basename)
+def test_token_buffer_round_trips_tokens(capsys, path):
+    with open(path, "r") as f:
+        source = f.read()
+    tokens, _ = scan(RegexScanner, source, capsys)
+    buffer = TokenBuffer(RegexScanner(Lox(), source).iter_tokens())
+    assert len(buffer) == len(tokens)
+    assert [(t.type, t.lexeme, t.literal, t.line, t.symbol) for t in buffer] == tokens